@@ -0,0 +1,185 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from Enviroment import Enviroments as env
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cabecera: firma, versión, número de campos por fila y dimensión de cada vector
+CABECERA = struct.Struct("<4sHHII")
+FIRMA = b"EMBF"
+VERSION = 1
+
+
+class AlmacenEmbeddings:
+    """
+    Matriz de embeddings float32 en un archivo binario mapeado en memoria.
+
+    Cada empresa ocupa una fila con un vector de `dimension` floats por campo
+    (nombre, sector), así que la fila es su identificador. Los registros de
+    empresa guardan solo la referencia que devuelve guardar(). Leer un vector
+    no copia nada: se devuelve una vista sobre el mapa del archivo y el sistema
+    operativo carga solo las páginas que se tocan.
+
+    Las filas nuevas se agregan al final del archivo con fsync antes de que el
+    registro que las referencia se guarde; una fila a medio escribir por un
+    corte se descarta al abrir.
+    """
+
+    def __init__(self, ruta, dimension=300, campos=("nombre", "sector")):
+        """
+        Args:
+            ruta (str): Archivo de la matriz
+            dimension (int): Floats de cada vector (los más cortos se rellenan con ceros)
+            campos (tuple): Nombres de los vectores de cada fila, en orden
+        """
+        self.ruta = ruta
+        self.dimension = dimension
+        self.campos = tuple(campos)
+        self._largo_fila = len(self.campos) * dimension * 4
+        self._lock = threading.Lock()
+        self.escrituras = 0
+
+        if not os.path.exists(ruta) or os.path.getsize(ruta) == 0:
+            with open(ruta, "wb") as archivo:
+                archivo.write(CABECERA.pack(FIRMA, VERSION, len(self.campos), dimension, 0))
+                archivo.flush()
+                os.fsync(archivo.fileno())
+
+        self._archivo = open(ruta, "r+b")
+        firma, version, num_campos, dimension_archivo, _ = CABECERA.unpack(self._archivo.read(CABECERA.size))
+        if firma != FIRMA or version != VERSION:
+            raise ValueError(f"{ruta} no es un almacén de embeddings válido")
+        if (num_campos, dimension_archivo) != (len(self.campos), dimension):
+            raise ValueError(f"{ruta} tiene {num_campos} campos de {dimension_archivo} floats, "
+                             f"se esperaban {len(self.campos)} de {dimension}")
+
+        sobrante = (os.path.getsize(ruta) - CABECERA.size) % self._largo_fila
+        if sobrante:
+            logging.warning(f"Se descarta una fila incompleta al final de {ruta}")
+            self._archivo.truncate(os.path.getsize(ruta) - sobrante)
+        self._mapear()
+        logging.info(f"Almacén de embeddings: {ruta} ({self.filas} filas de {len(self.campos)}x{dimension})")
+
+    def _mapear(self):
+        """Mapea el archivo completo (requiere el lock salvo al iniciar)"""
+        # El mapa anterior sigue vivo mientras haya vistas suyas en uso
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self._floats = memoryview(self._mapa)[CABECERA.size:].cast("f")
+        self.filas = len(self._floats) * 4 // self._largo_fila
+
+    def _fila_binaria(self, vectores):
+        valores = array("f")
+        for campo in self.campos:
+            vector = list(vectores.get(campo) or [])
+            if len(vector) > self.dimension:
+                raise ValueError(f"El vector {campo} tiene {len(vector)} floats; el máximo es {self.dimension}")
+            valores.extend(vector)
+            valores.extend([0.0] * (self.dimension - len(vector)))
+        return valores.tobytes()
+
+    def guardar(self, vectores, referencia=None):
+        """
+        Escribe los vectores de una empresa
+
+        Args:
+            vectores (dict): Campo -> lista de floats
+            referencia (dict, optional): Referencia anterior de la empresa; su
+                fila se sobrescribe en lugar de agregar una nueva
+
+        Returns:
+            dict: Referencia para guardar en el registro de la empresa
+        """
+        datos = self._fila_binaria(vectores)
+        with self._lock:
+            fila = referencia.get("fila") if isinstance(referencia, dict) else None
+            if not isinstance(fila, int) or not 0 <= fila < self.filas:
+                fila = self.filas
+            self._archivo.seek(CABECERA.size + fila * self._largo_fila)
+            self._archivo.write(datos)
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            if fila >= self.filas:
+                self._mapear()
+            self.escrituras += 1
+        return {
+            "fila": fila,
+            "dimensiones": {campo: len(vectores.get(campo) or []) for campo in self.campos}
+        }
+
+    def vector(self, referencia, campo):
+        """
+        Vector de una empresa sin copiarlo
+
+        Args:
+            referencia (dict): Referencia guardada en el registro de la empresa
+            campo (str): Campo del vector ("nombre" o "sector")
+
+        Returns:
+            memoryview: Floats del vector (con su largo original), o None si no existe
+        """
+        fila = referencia.get("fila") if isinstance(referencia, dict) else None
+        if not isinstance(fila, int) or campo not in self.campos:
+            return None
+        with self._lock:
+            if not 0 <= fila < self.filas:
+                return None
+            inicio = (fila * len(self.campos) + self.campos.index(campo)) * self.dimension
+            largo = referencia.get("dimensiones", {}).get(campo, self.dimension)
+            return self._floats[inicio:inicio + largo]
+
+    def matriz(self):
+        """
+        Todas las filas como una matriz, sin copiarlas
+
+        Returns:
+            numpy.ndarray | memoryview: Matriz (filas, campos, dimension) si numpy
+                está instalado; si no, la vista plana de floats
+        """
+        with self._lock:
+            if np is None:
+                return self._floats
+            return np.frombuffer(self._mapa, dtype=np.float32, offset=CABECERA.size,
+                                 count=self.filas * len(self.campos) * self.dimension
+                                 ).reshape(self.filas, len(self.campos), self.dimension)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "ruta": self.ruta,
+                "filas": self.filas,
+                "dimension": self.dimension,
+                "bytes": CABECERA.size + self.filas * self._largo_fila,
+                "escrituras": self.escrituras
+            }
+
+    def cerrar(self):
+        with self._lock:
+            self._floats = None
+            self._archivo.close()
+
+
+def es_referencia(embeddings):
+    """True si el registro ya guarda una referencia y no los vectores en línea"""
+    return isinstance(embeddings, dict) and "fila" in embeddings
+
+
+def crear_almacen_embeddings():
+    """
+    Crea el almacén de embeddings configurado en Enviroments
+
+    Returns:
+        AlmacenEmbeddings: Almacén en el archivo configurado, o None si no se
+            pudo abrir (los embeddings quedan entonces en el registro)
+    """
+    try:
+        return AlmacenEmbeddings(env.RUTA_EMBEDDINGS, dimension=env.EMBEDDINGS_DIMENSION)
+    except (OSError, ValueError) as e:
+        logging.error(f"No se pudo abrir el almacén de embeddings: {str(e)}. Se guardarán en el registro.")
+        return None
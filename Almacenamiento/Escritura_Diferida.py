@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+from Enviroment import Enviroments as env
+
+
+class EscrituraDiferida:
+    """
+    Persistencia en segundo plano (write-behind) sobre un repositorio de empresas.
+
+    marcar() solo anota la empresa como pendiente y vuelve enseguida: quien
+    atiende al usuario no espera al disco. Un hilo de fondo junta lo pendiente
+    y lo escribe en un lote con repositorio.guardar_varias (una transacción en
+    SQLite, una reescritura atómica en JSON). El lote sale cuando pasan
+    `intervalo` segundos sin cambios nuevos, o a más tardar `max_espera`
+    segundos después del cambio más antiguo; si una empresa cambia varias
+    veces antes del lote, solo se escribe su última versión.
+
+    El retraso de durabilidad (cuánto lleva sin escribirse el cambio más
+    antiguo) se expone en metricas(). detener() escribe todo lo pendiente
+    antes de salir, y lo que se marque después se escribe en el momento.
+    """
+
+    def __init__(self, repositorio, intervalo=0.5, max_espera=5.0, espera_error=1.0):
+        """
+        Args:
+            repositorio: Repositorio con guardar_varias(dict)
+            intervalo (float): Segundos sin cambios antes de escribir el lote
+            max_espera (float): Máximo de segundos que un cambio espera a escribirse
+            espera_error (float): Segundos antes de reintentar un lote que falló
+        """
+        self.repositorio = repositorio
+        self.intervalo = intervalo
+        self.max_espera = max_espera
+        self.espera_error = espera_error
+
+        self._condicion = threading.Condition()
+        self._pendientes = {}
+        self._primer_cambio = None
+        self._ultimo_cambio = None
+        self._en_vuelo_desde = None
+        self._reintento = 0.0
+        self._forzar = False
+        self._detenido = False
+        self._hilo = None
+
+        self.marcadas = 0
+        self.coalescidas = 0
+        self.lotes = 0
+        self.escritas = 0
+        self.errores = 0
+        self.directas = 0
+        self.ultimo_retraso = 0.0
+        self.retraso_max = 0.0
+        self.ultimo_lote_ms = 0.0
+
+    def marcar(self, nombre, datos):
+        """
+        Anota una empresa para escribirla en el próximo lote
+
+        Args:
+            nombre (str): Nombre de la empresa
+            datos (dict): Datos completos de la empresa
+        """
+        with self._condicion:
+            if not self._detenido:
+                if nombre in self._pendientes:
+                    self.coalescidas += 1
+                self._pendientes[nombre] = datos
+                self.marcadas += 1
+                ahora = time.monotonic()
+                if self._primer_cambio is None:
+                    self._primer_cambio = ahora
+                self._ultimo_cambio = ahora
+                self._asegurar_hilo()
+                self._condicion.notify_all()
+                return
+            self.directas += 1
+
+        # Ya no hay hilo de fondo: se escribe en el momento
+        self.repositorio.guardar_varias({nombre: datos})
+
+    def _vencimiento(self):
+        """Instante en que debe salir el lote pendiente (requiere la condición)"""
+        if self._forzar or self._detenido:
+            return self._reintento
+        return max(min(self._ultimo_cambio + self.intervalo, self._primer_cambio + self.max_espera),
+                   self._reintento)
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while True:
+                    if not self._pendientes:
+                        self._forzar = False
+                        self._condicion.notify_all()
+                        if self._detenido:
+                            return
+                        self._condicion.wait()
+                        continue
+                    espera = self._vencimiento() - time.monotonic()
+                    if espera <= 0:
+                        break
+                    self._condicion.wait(espera)
+
+                lote = self._pendientes
+                primer_cambio = self._primer_cambio
+                self._pendientes = {}
+                self._primer_cambio = self._ultimo_cambio = None
+                self._en_vuelo_desde = primer_cambio
+
+            self._escribir(lote, primer_cambio)
+
+    def _escribir(self, lote, primer_cambio):
+        inicio = time.monotonic()
+        try:
+            self.repositorio.guardar_varias(lote)
+        except Exception as e:
+            logging.error(f"Error al escribir {len(lote)} empresas pendientes: {str(e)}", exc_info=True)
+            with self._condicion:
+                self.errores += 1
+                # Lo marcado mientras tanto es más reciente y tiene prioridad
+                for nombre, datos in lote.items():
+                    self._pendientes.setdefault(nombre, datos)
+                ahora = time.monotonic()
+                self._primer_cambio = min(primer_cambio, self._primer_cambio or primer_cambio)
+                self._ultimo_cambio = self._ultimo_cambio or ahora
+                self._reintento = ahora + self.espera_error
+                self._en_vuelo_desde = None
+            return
+
+        fin = time.monotonic()
+        with self._condicion:
+            self.lotes += 1
+            self.escritas += len(lote)
+            self.ultimo_retraso = fin - primer_cambio
+            self.retraso_max = max(self.retraso_max, self.ultimo_retraso)
+            self.ultimo_lote_ms = (fin - inicio) * 1000
+            self._en_vuelo_desde = None
+            self._condicion.notify_all()
+
+    def _asegurar_hilo(self):
+        """Arranca el hilo de fondo si no existe (requiere la condición)"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="escritura-diferida", daemon=True)
+            self._hilo.start()
+
+    def vaciar(self, timeout=None):
+        """
+        Escribe ya lo pendiente y espera a que quede en disco
+
+        Args:
+            timeout (float, optional): Máximo de segundos de espera
+
+        Returns:
+            bool: True si no quedó nada sin escribir
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._condicion:
+            self._forzar = True
+            self._condicion.notify_all()
+            while self._pendientes or self._en_vuelo_desde is not None:
+                if self._hilo is None or not self._hilo.is_alive():
+                    return False
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._condicion.wait(restante)
+            return True
+
+    def detener(self, timeout=10):
+        """Escribe todo lo pendiente y detiene el hilo de fondo"""
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+            hilo = self._hilo
+        if hilo is not None:
+            hilo.join(timeout)
+        with self._condicion:
+            if self._pendientes:
+                logging.error(f"Quedaron {len(self._pendientes)} empresas sin guardar al detener la escritura diferida")
+            else:
+                logging.info(f"Escritura diferida detenida: {self.escritas} empresas en {self.lotes} lotes")
+
+    def metricas(self):
+        with self._condicion:
+            desde = [t for t in (self._primer_cambio, self._en_vuelo_desde) if t is not None]
+            retraso = time.monotonic() - min(desde) if desde else 0.0
+            return {
+                "pendientes": len(self._pendientes),
+                "retraso_durabilidad_ms": round(retraso * 1000, 1),
+                "ultimo_retraso_ms": round(self.ultimo_retraso * 1000, 1),
+                "retraso_max_ms": round(self.retraso_max * 1000, 1),
+                "ultimo_lote_ms": round(self.ultimo_lote_ms, 2),
+                "marcadas": self.marcadas,
+                "coalescidas": self.coalescidas,
+                "lotes": self.lotes,
+                "escritas": self.escritas,
+                "errores": self.errores,
+                "directas": self.directas
+            }
+
+
+def crear_escritura_diferida(repositorio):
+    """
+    Crea la escritura diferida configurada en Enviroments
+
+    Args:
+        repositorio: Repositorio de empresas que recibe los lotes
+
+    Returns:
+        EscrituraDiferida: Escritura en segundo plano, o None si está desactivada
+    """
+    if not env.PERSISTENCIA_DIFERIDA:
+        return None
+    return EscrituraDiferida(
+        repositorio,
+        intervalo=env.PERSISTENCIA_INTERVALO,
+        max_espera=env.PERSISTENCIA_MAX_ESPERA
+    )
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from Enviroment import Enviroments as env
+
+
+class RepositorioEmpresasJSON:
+    """
+    Repositorio de empresas en un archivo JSON (el formato original).
+
+    Cada guardado reescribe el archivo completo, pero lo hace en un archivo
+    temporal que luego reemplaza al original de forma atómica: un corte a mitad
+    de escritura deja intacta la versión anterior.
+    """
+
+    def __init__(self, ruta):
+        """
+        Args:
+            ruta (str): Archivo JSON de empresas
+        """
+        self.ruta = ruta
+        self._empresas = {}
+        self._lock = threading.Lock()
+        self.escrituras = 0
+
+    def cargar(self):
+        """
+        Returns:
+            dict: Nombre de la empresa -> datos
+        """
+        with self._lock:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, "r", encoding="utf-8") as archivo:
+                    self._empresas = json.load(archivo)
+            return dict(self._empresas)
+
+    def guardar(self, nombre, datos):
+        """
+        Inserta o actualiza una empresa
+
+        Args:
+            nombre (str): Nombre de la empresa
+            datos (dict): Datos completos de la empresa
+        """
+        with self._lock:
+            self._empresas[nombre] = datos
+            self._escribir()
+
+    def guardar_varias(self, empresas):
+        """
+        Inserta o actualiza varias empresas con una sola reescritura
+
+        Args:
+            empresas (dict): Nombre de la empresa -> datos completos
+        """
+        with self._lock:
+            self._empresas.update(empresas)
+            self._escribir()
+
+    def eliminar(self, nombre):
+        """Elimina una empresa; devuelve True si existía"""
+        with self._lock:
+            if self._empresas.pop(nombre, None) is None:
+                return False
+            self._escribir()
+            return True
+
+    def _escribir(self):
+        carpeta = os.path.dirname(os.path.abspath(self.ruta))
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta, prefix=".empresas_", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+                json.dump(self._empresas, archivo, ensure_ascii=False, indent=4)
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            os.replace(temporal, self.ruta)
+        except Exception:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        self.escrituras += 1
+
+    def metricas(self):
+        with self._lock:
+            return {"backend": "json", "ruta": self.ruta, "empresas": len(self._empresas),
+                    "escrituras": self.escrituras}
+
+    def cerrar(self):
+        pass
+
+
+class RepositorioEmpresasSQLite:
+    """
+    Repositorio de empresas en SQLite (modo WAL), una fila por empresa.
+
+    Guardar una empresa escribe solo su fila en una transacción, así que el
+    costo no crece con el número de empresas y un corte a mitad de escritura no
+    deja datos a medias. La primera vez que se abre con una base vacía importa
+    las empresas del JSON original; la migración queda anotada y no se repite.
+    """
+
+    def __init__(self, ruta, ruta_json=None):
+        """
+        Args:
+            ruta (str): Archivo SQLite (":memory:" para no persistir)
+            ruta_json (str, optional): JSON original que se migra la primera vez
+        """
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self.escrituras = 0
+        self.migradas = 0
+
+        self._conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # Cada registro es un dato del usuario: se sincroniza en cada commit
+        self._conexion.execute("PRAGMA synchronous=FULL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS empresas ("
+            "nombre TEXT PRIMARY KEY, datos TEXT NOT NULL, actualizado REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL) WITHOUT ROWID"
+        )
+        if ruta_json:
+            self._migrar_json(ruta_json)
+
+    def _migrar_json(self, ruta_json):
+        """Importa el JSON original una sola vez, en una única transacción"""
+        with self._lock:
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                migrado = cursor.execute("SELECT valor FROM meta WHERE clave = 'migracion_json'").fetchone()
+                if migrado is not None or not os.path.exists(ruta_json):
+                    cursor.execute("COMMIT")
+                    return
+
+                with open(ruta_json, "r", encoding="utf-8") as archivo:
+                    empresas = json.load(archivo)
+                ahora = time.time()
+                cursor.executemany(
+                    "INSERT INTO empresas (nombre, datos, actualizado) VALUES (?, ?, ?) "
+                    "ON CONFLICT(nombre) DO NOTHING",
+                    [(nombre, json.dumps(datos, ensure_ascii=False), ahora) for nombre, datos in empresas.items()]
+                )
+                cursor.execute(
+                    "INSERT INTO meta (clave, valor) VALUES ('migracion_json', ?)",
+                    (json.dumps({"origen": os.path.abspath(ruta_json), "empresas": len(empresas), "fecha": ahora}),)
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            self.migradas = len(empresas)
+        logging.info(f"Migradas {len(empresas)} empresas de {ruta_json} a {self.ruta}")
+
+    def cargar(self):
+        """
+        Returns:
+            dict: Nombre de la empresa -> datos
+        """
+        with self._lock:
+            filas = self._conexion.execute("SELECT nombre, datos FROM empresas").fetchall()
+        return {nombre: json.loads(datos) for nombre, datos in filas}
+
+    def guardar(self, nombre, datos):
+        """
+        Inserta o actualiza una empresa
+
+        Args:
+            nombre (str): Nombre de la empresa
+            datos (dict): Datos completos de la empresa
+        """
+        serializado = json.dumps(datos, ensure_ascii=False)
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO empresas (nombre, datos, actualizado) VALUES (?, ?, ?) "
+                "ON CONFLICT(nombre) DO UPDATE SET datos = excluded.datos, actualizado = excluded.actualizado",
+                (nombre, serializado, time.time())
+            )
+            self.escrituras += 1
+
+    def guardar_varias(self, empresas):
+        """
+        Inserta o actualiza varias empresas en una sola transacción
+
+        Args:
+            empresas (dict): Nombre de la empresa -> datos completos
+        """
+        ahora = time.time()
+        filas = [(nombre, json.dumps(datos, ensure_ascii=False), ahora) for nombre, datos in empresas.items()]
+        with self._lock:
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(
+                    "INSERT INTO empresas (nombre, datos, actualizado) VALUES (?, ?, ?) "
+                    "ON CONFLICT(nombre) DO UPDATE SET datos = excluded.datos, actualizado = excluded.actualizado",
+                    filas
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            self.escrituras += 1
+
+    def eliminar(self, nombre):
+        """Elimina una empresa; devuelve True si existía"""
+        with self._lock:
+            cursor = self._conexion.execute("DELETE FROM empresas WHERE nombre = ?", (nombre,))
+            return cursor.rowcount == 1
+
+    def metricas(self):
+        with self._lock:
+            empresas = self._conexion.execute("SELECT COUNT(*) FROM empresas").fetchone()[0]
+            return {"backend": "sqlite", "ruta": self.ruta, "empresas": empresas,
+                    "escrituras": self.escrituras, "migradas": self.migradas}
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+def crear_repositorio_empresas():
+    """
+    Crea el repositorio de empresas configurado en Enviroments
+
+    Returns:
+        RepositorioEmpresasSQLite | RepositorioEmpresasJSON: Repositorio configurado
+    """
+    if env.BACKEND_EMPRESAS == "sqlite":
+        try:
+            return RepositorioEmpresasSQLite(env.RUTA_EMPRESAS_DB, ruta_json=env.RUTA_EMPRESAS_JSON)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logging.error(f"No se pudo abrir el repositorio de empresas SQLite: {str(e)}. Se usará el JSON.")
+
+    return RepositorioEmpresasJSON(env.RUTA_EMPRESAS_JSON)
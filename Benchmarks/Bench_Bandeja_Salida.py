@@ -0,0 +1,162 @@
+"""
+Benchmark de la bandeja de salida duradera contra el envío directo
+
+Envía N mensajes de texto a un servidor local que imita la Graph API y que
+responde 500 a una fracción de las peticiones y 429 (con Retry-After) a otra.
+Compara:
+- el envío directo, que pierde cada mensaje que falla;
+- la bandeja con intento inmediato (como responde el bot), que reintenta en
+  segundo plano lo que falla;
+- la bandeja en modo encolar, donde el hilo de fondo hace todos los envíos.
+
+Para cada caso mide el tiempo hasta entregar todo, los mensajes perdidos y
+duplicados y, en modo encolar, si se respetó el orden por destinatario.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Bandeja_Salida
+"""
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Benchmarks.Graph_Simulado import GraphSimulado
+from EnvioMensajes.Bandeja_Salida import BandejaSalida
+from EnvioMensajes.Envio import WhatsAppSender
+
+MENSAJES = 1000
+DESTINATARIOS = 100
+LATENCIA = 0.02
+TASA_500 = 0.10
+TASA_429 = 0.005
+RETRY_AFTER = 1
+HILOS = 32
+
+
+def mensajes():
+    """(destinatario, cuerpo) con un número de secuencia por destinatario"""
+    return [(f"5730000{i % DESTINATARIOS:05d}", f"Mensaje {i // DESTINATARIOS} #{i}") for i in range(MENSAJES)]
+
+
+def crear_bandeja(carpeta, nombre):
+    return BandejaSalida(
+        os.path.join(carpeta, nombre),
+        max_intentos=20,
+        espera_base=0.05,
+        espera_max=2,
+        workers=HILOS,
+        intervalo_sondeo=0.05
+    )
+
+
+def contar_entregas(graph):
+    """(entregados únicos, duplicados, orden por destinatario respetado)"""
+    cuerpos = [p["text"]["body"] for p in graph.payloads]
+    unicos = set(cuerpos)
+    ultimo = {}
+    en_orden = True
+    for payload in graph.payloads:
+        secuencia = int(payload["text"]["body"].split()[1])
+        if secuencia < ultimo.get(payload["to"], -1):
+            en_orden = False
+        ultimo[payload["to"]] = secuencia
+    return len(unicos), len(cuerpos) - len(unicos), en_orden
+
+
+def bench_directo(url, envios):
+    sender = WhatsAppSender()
+    sender.bandeja = None
+    sender.api_url = url
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        list(pool.map(lambda envio: sender.SendText(*envio), envios))
+    return time.perf_counter() - inicio
+
+
+def bench_inmediato(url, envios, bandeja):
+    sender = WhatsAppSender()
+    sender.bandeja = bandeja
+    sender.api_url = url
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        list(pool.map(lambda envio: sender.SendText(*envio), envios))
+    aceptados = time.perf_counter() - inicio
+    bandeja.esperar_vacia(timeout=120)
+    return aceptados, time.perf_counter() - inicio
+
+
+def bench_encolar(url, envios, bandeja):
+    sender = WhatsAppSender()
+    inicio = time.perf_counter()
+    for numero, cuerpo in envios:
+        bandeja.encolar(url, sender._payload_texto(numero, cuerpo))
+    aceptados = time.perf_counter() - inicio
+    bandeja.esperar_vacia(timeout=120)
+    return aceptados, time.perf_counter() - inicio
+
+
+def reportar(nombre, graph, duracion, aceptados=None, bandeja=None, orden=False):
+    entregados, duplicados, en_orden = contar_entregas(graph)
+    print(f"{nombre}")
+    if aceptados is not None:
+        print(f"  aceptados en       {aceptados:7.2f} s  {MENSAJES / aceptados:8.0f} msg/s")
+    print(f"  todo entregado en  {duracion:7.2f} s  {entregados / duracion:8.0f} msg/s")
+    print(f"  peticiones {graph.peticiones}, entregados {entregados}/{MENSAJES}, "
+          f"perdidos {MENSAJES - entregados}, duplicados {duplicados}")
+    if orden:
+        # Con varios hilos enviando al mismo destinatario el orden solo se garantiza al encolar
+        print(f"  orden por destinatario {'respetado' if en_orden else 'no respetado'}")
+    if bandeja is not None:
+        metricas = bandeja.metricas()
+        print(f"  reintentos {metricas['reintentos']}, 429 {metricas['limitados']}, "
+              f"entrega p50 {metricas['latencia_entrega']['p50_ms']:.0f} ms, "
+              f"p95 {metricas['latencia_entrega']['p95_ms']:.0f} ms")
+    print()
+
+
+def main():
+    # Los reintentos se registran con warning; aquí solo interesan los números
+    logging.getLogger().setLevel(logging.CRITICAL)
+    envios = mensajes()
+    print(f"{MENSAJES} mensajes a {DESTINATARIOS} destinatarios, latencia {LATENCIA * 1000:.0f} ms, "
+          f"{TASA_500:.0%} de 500 y {TASA_429:.1%} de 429 (Retry-After {RETRY_AFTER} s)\n")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        graph = GraphSimulado(LATENCIA, tasa_429=TASA_429, tasa_500=TASA_500, retry_after=RETRY_AFTER).iniciar()
+        try:
+            reportar(f"Envío directo ({HILOS} hilos)", graph, bench_directo(graph.url, envios))
+        finally:
+            graph.detener()
+
+        graph = GraphSimulado(LATENCIA, tasa_429=TASA_429, tasa_500=TASA_500, retry_after=RETRY_AFTER).iniciar()
+        bandeja = crear_bandeja(carpeta, "inmediato.db")
+        try:
+            aceptados, duracion = bench_inmediato(graph.url, envios, bandeja)
+            reportar(f"Bandeja, intento inmediato ({HILOS} hilos)", graph, duracion, aceptados, bandeja)
+
+            # Reenviar las mismas respuestas con las mismas claves no duplica nada
+            sender = WhatsAppSender()
+            for numero, cuerpo in envios[:100]:
+                bandeja.encolar(graph.url, sender._payload_texto(numero, cuerpo), clave=f"dedup-{cuerpo}")
+            repetidos = sum(
+                1 for numero, cuerpo in envios[:100]
+                if "duplicado" in bandeja.encolar(graph.url, sender._payload_texto(numero, cuerpo), clave=f"dedup-{cuerpo}")
+            )
+            print(f"Deduplicación: {repetidos}/100 reenvíos con la misma clave descartados\n")
+            bandeja.esperar_vacia(timeout=30)
+        finally:
+            bandeja.detener()
+            graph.detener()
+
+        graph = GraphSimulado(LATENCIA, tasa_429=TASA_429, tasa_500=TASA_500, retry_after=RETRY_AFTER).iniciar()
+        bandeja = crear_bandeja(carpeta, "encolar.db")
+        try:
+            aceptados, duracion = bench_encolar(graph.url, envios, bandeja)
+            reportar(f"Bandeja, encolar ({HILOS} envíos en vuelo)", graph, duracion, aceptados, bandeja, orden=True)
+        finally:
+            bandeja.detener()
+            graph.detener()
+
+
+if __name__ == "__main__":
+    main()
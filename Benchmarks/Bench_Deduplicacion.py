@@ -0,0 +1,111 @@
+"""
+Microbenchmark de la deduplicación de message_id
+
+Mide el costo por mensaje de ConjuntoExpirable con 1k a 1M IDs activos en
+régimen estable (cada inserción hace vencer un ID antiguo) y lo compara con la
+limpieza anterior, que recorría todo el diccionario de TTL en cada mensaje.
+También mide el registro compartido en SQLite: la verificación de un duplicado
+(vía caché local y vía el archivo compartido) y el reclamo de IDs nuevos.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Deduplicacion
+"""
+import os
+import tempfile
+import time
+from Procesamiento.Conjunto_Expirable import ConjuntoExpirable
+from Procesamiento.Idempotencia import IdempotenciaSQLite
+
+TAMANOS = [1000, 10000, 100000, 1000000]
+OPERACIONES = 20000
+# El recorrido completo se vuelve inviable con tamaños grandes
+MAX_TAMANO_ANTERIOR = 10000
+
+
+def bench_conjunto(activos):
+    """Costo medio por mensaje (µs) con `activos` IDs vigentes"""
+    ttl = float(activos)
+    conjunto = ConjuntoExpirable(ttl=ttl, max_elementos=activos * 2)
+    # Un ID por unidad de tiempo: en todo momento hay `activos` IDs vigentes
+    for i in range(activos):
+        conjunto.agregar_si_nuevo(f"wamid.{i}", ahora=float(i))
+
+    inicio = time.perf_counter()
+    for i in range(activos, activos + OPERACIONES):
+        conjunto.agregar_si_nuevo(f"wamid.{i}", ahora=float(i))
+    return (time.perf_counter() - inicio) / OPERACIONES * 1e6
+
+
+def bench_anterior(activos):
+    """Costo medio por mensaje (µs) de la limpieza con recorrido completo"""
+    processed_messages = {}
+    processed_messages_ttl = {}
+    for i in range(activos):
+        processed_messages[f"wamid.{i}"] = True
+        processed_messages_ttl[f"wamid.{i}"] = float(i + activos)
+
+    operaciones = min(OPERACIONES, 2000)
+    inicio = time.perf_counter()
+    for i in range(activos, activos + operaciones):
+        message_id = f"wamid.{i}"
+        if message_id in processed_messages:
+            continue
+        processed_messages[message_id] = True
+        processed_messages_ttl[message_id] = float(i + activos)
+        expirados = [m for m, exp in list(processed_messages_ttl.items()) if i > exp]
+        for m in expirados:
+            del processed_messages[m]
+            del processed_messages_ttl[m]
+    return (time.perf_counter() - inicio) / operaciones * 1e6
+
+
+def bench_sqlite(activos=100000, operaciones=5000):
+    """Costo (µs) de reclamar y de verificar duplicados en el registro SQLite"""
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "idempotencia.db")
+        proceso_a = IdempotenciaSQLite(ruta, ttl=3600)
+        # Otro "proceso" sobre el mismo archivo: no tiene los IDs en su caché local
+        proceso_b = IdempotenciaSQLite(ruta, ttl=3600)
+
+        # Precargar el archivo en lotes de 100, como llegan en los webhooks
+        ids = [f"wamid.{i}" for i in range(activos)]
+        for i in range(0, activos - operaciones, 100):
+            proceso_a.marcar_lote(ids[i:i + 100])
+
+        inicio = time.perf_counter()
+        for message_id in ids[activos - operaciones:]:
+            proceso_a.marcar_si_nuevo(message_id)
+        reclamo = (time.perf_counter() - inicio) / operaciones * 1e6
+
+        muestra = ids[:operaciones]
+        inicio = time.perf_counter()
+        for message_id in muestra:
+            assert not proceso_a.marcar_si_nuevo(message_id)
+        duplicado_local = (time.perf_counter() - inicio) / operaciones * 1e6
+
+        inicio = time.perf_counter()
+        for message_id in muestra:
+            assert not proceso_b.marcar_si_nuevo(message_id)
+        duplicado_compartido = (time.perf_counter() - inicio) / operaciones * 1e6
+
+        proceso_a.cerrar()
+        proceso_b.cerrar()
+    return reclamo, duplicado_local, duplicado_compartido
+
+
+def main():
+    print(f"{'IDs activos':>12} | {'ConjuntoExpirable':>18} | {'Recorrido anterior':>18}")
+    for activos in TAMANOS:
+        nuevo = bench_conjunto(activos)
+        anterior = f"{bench_anterior(activos):.2f} µs" if activos <= MAX_TAMANO_ANTERIOR else "-"
+        print(f"{activos:>12} | {nuevo:>15.2f} µs | {anterior:>18}")
+
+    reclamo, duplicado_local, duplicado_compartido = bench_sqlite()
+    print("\nRegistro SQLite (WAL) con 100k IDs:")
+    print(f"  Reclamo de ID nuevo:                {reclamo:.2f} µs")
+    print(f"  Duplicado detectado en caché local: {duplicado_local:.2f} µs")
+    print(f"  Duplicado detectado en el archivo:  {duplicado_compartido:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark de la difusión de plantillas
+
+Envía una plantilla con parámetros propios a N destinatarios contra un
+servidor local que imita la Graph API con un límite de mensajes por segundo.
+Compara el bucle en serie con SendTemplate (estimado con una muestra) contra
+DifusionPlantillas, que pasa por el planificador de envíos y la bandeja de
+salida. Después corta una difusión a la mitad y la reanuda desde su archivo de
+progreso para comprobar que nadie recibe la plantilla dos veces.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Difusion
+"""
+import collections
+import logging
+import os
+import tempfile
+import threading
+import time
+from Benchmarks.Graph_Simulado import GraphSimulado
+from EnvioMensajes.Bandeja_Salida import BandejaSalida
+from EnvioMensajes.Difusion import DifusionPlantillas, parametros_cuerpo
+from EnvioMensajes.Envio import WhatsAppSender
+from EnvioMensajes.Planificador_Envios import PlanificadorEnvios
+
+DESTINATARIOS = 5000
+LATENCIA = 0.05
+LIMITE_POR_SEGUNDO = 150
+CONCURRENCIA = 16
+
+
+def destinatarios(cantidad):
+    return [
+        {"numero": f"5731{i:08d}", "componentes": parametros_cuerpo(f"Empresa {i}", 50 + i % 50)}
+        for i in range(cantidad)
+    ]
+
+
+def crear_sender(graph, carpeta, nombre):
+    planificador = PlanificadorEnvios(tasa_numero=LIMITE_POR_SEGUNDO * 0.95, rafaga_numero=LIMITE_POR_SEGUNDO * 0.5)
+    sender = WhatsAppSender()
+    sender.api_url = graph.url
+    sender.planificador = planificador
+    sender.bandeja = BandejaSalida(os.path.join(carpeta, nombre), planificador=planificador)
+    return sender
+
+
+def bench_serie(graph, muestra=100):
+    sender = WhatsAppSender()
+    sender.api_url = graph.url
+    sender.bandeja = None
+    sender.planificador = None
+    inicio = time.perf_counter()
+    for destinatario in destinatarios(muestra):
+        sender.SendTemplate(destinatario["numero"], "cambio_puntuacion", components=destinatario["componentes"])
+    return muestra / (time.perf_counter() - inicio) * 60
+
+
+def main():
+    logging.getLogger().setLevel(logging.CRITICAL)
+    lista = destinatarios(DESTINATARIOS)
+    print(f"{DESTINATARIOS} destinatarios, latencia {LATENCIA * 1000:.0f} ms, "
+          f"límite de la Graph API simulada {LIMITE_POR_SEGUNDO} msg/s ({LIMITE_POR_SEGUNDO * 60} por minuto)\n")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        graph = GraphSimulado(LATENCIA, retry_after=1, limite_por_segundo=LIMITE_POR_SEGUNDO).iniciar()
+        try:
+            por_minuto = bench_serie(graph)
+            print(f"Bucle en serie (estimado):  {por_minuto:7.0f} por minuto, "
+                  f"{DESTINATARIOS / por_minuto:5.1f} min para todos\n")
+        finally:
+            graph.detener()
+
+        graph = GraphSimulado(LATENCIA, retry_after=1, limite_por_segundo=LIMITE_POR_SEGUNDO).iniciar()
+        sender = crear_sender(graph, carpeta, "completa.db")
+        try:
+            informe = DifusionPlantillas(sender, max_concurrencia=CONCURRENCIA).difundir("cambio_puntuacion", lista)
+            print(f"Difusión ({CONCURRENCIA} en vuelo):     {informe['por_minuto']:7.0f} por minuto, "
+                  f"{informe['duracion_s']:.1f} s para todos")
+            print(f"  {informe['totales']}, 429 recibidos: {graph.limitadas}\n")
+        finally:
+            sender.bandeja.detener()
+            graph.detener()
+
+        graph = GraphSimulado(LATENCIA, retry_after=1, limite_por_segundo=LIMITE_POR_SEGUNDO).iniciar()
+        sender = crear_sender(graph, carpeta, "reanudada.db")
+        progreso = os.path.join(carpeta, "progreso.jsonl")
+        try:
+            difusion = DifusionPlantillas(sender, max_concurrencia=CONCURRENCIA)
+            corte = threading.Timer(DESTINATARIOS / LIMITE_POR_SEGUNDO / 2, difusion.cancelar, args=("reanudada",))
+            corte.start()
+            primera = difusion.difundir("cambio_puntuacion", lista, archivo_progreso=progreso, id_difusion="reanudada")
+            segunda = difusion.difundir("cambio_puntuacion", lista, archivo_progreso=progreso)
+
+            recibidos = collections.Counter(payload["to"] for payload in graph.payloads)
+            print("Difusión cortada a la mitad y reanudada desde el archivo de progreso")
+            print(f"  primera pasada: {primera['totales']}")
+            print(f"  reanudación:    {segunda['totales']} ({segunda['reanudados']} saltados por el progreso)")
+            print(f"  destinatarios que recibieron la plantilla: {len(recibidos)}/{DESTINATARIOS}, "
+                  f"con más de una: {sum(1 for n in recibidos.values() if n > 1)}")
+        finally:
+            sender.bandeja.detener()
+            graph.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark del arranque con los embeddings dentro o fuera de los registros
+
+Llena N empresas con dos vectores de 300 floats (como los de spaCy) y mide, en
+un proceso nuevo por caso, el tiempo de carga al arrancar y la memoria
+residente (RSS) que añade:
+- JSON original con los vectores en línea;
+- SQLite con los vectores en línea (Repositorio_Empresas tal cual);
+- SQLite con solo la referencia y los vectores en Almacen_Embeddings.
+Después recorre el vector "nombre" de todas las empresas (producto punto con
+un vector de consulta) para comparar el acceso una vez cargado.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Embeddings
+"""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from Almacenamiento.Almacen_Embeddings import AlmacenEmbeddings
+from Almacenamiento.Repositorio_Empresas import RepositorioEmpresasJSON, RepositorioEmpresasSQLite
+
+TAMANOS = [1000, 5000, 20000]
+DIMENSION = 300
+CASOS = ["json", "sqlite", "sqlite+mmap"]
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB"""
+    try:
+        with open("/proc/self/status", "r") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc: el máximo histórico (KB en Linux, bytes en macOS)
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def empresa(i, embeddings):
+    return {
+        "nombre": f"empresa_{i}", "sector": "comercio", "valor_anual": 1000000 + i,
+        "ganancias": 100000, "empleados": 20, "activos": 500000, "cartera": 50000, "deudas": 80000,
+        "analisis_nlp": {"evaluacion": {"puntuacion": 70, "categoria": "Buena"}, "embeddings": embeddings}
+    }
+
+
+def preparar(carpeta, cantidad):
+    aleatorio = random.Random(cantidad)
+    vectores = [{campo: [aleatorio.uniform(-3, 3) for _ in range(DIMENSION)] for campo in ("nombre", "sector")}
+                for _ in range(cantidad)]
+
+    with open(os.path.join(carpeta, "empresas_data.json"), "w", encoding="utf-8") as archivo:
+        json.dump({f"empresa_{i}": empresa(i, v) for i, v in enumerate(vectores)}, archivo, ensure_ascii=False, indent=4)
+
+    repositorio = RepositorioEmpresasSQLite(os.path.join(carpeta, "en_linea.db"),
+                                            ruta_json=os.path.join(carpeta, "empresas_data.json"))
+    repositorio.cerrar()
+
+    almacen = AlmacenEmbeddings(os.path.join(carpeta, "embeddings.f32"), dimension=DIMENSION)
+    repositorio = RepositorioEmpresasSQLite(os.path.join(carpeta, "referencias.db"))
+    for i, v in enumerate(vectores):
+        repositorio.guardar(f"empresa_{i}", empresa(i, almacen.guardar(v)))
+    repositorio.cerrar()
+    almacen.cerrar()
+
+
+def medir(caso, carpeta):
+    """Corre en el proceso hijo: carga, mide y recorre los vectores"""
+    consulta = [0.01] * DIMENSION
+    rss_inicial = rss_mb()
+    inicio = time.perf_counter()
+    if caso == "json":
+        empresas = RepositorioEmpresasJSON(os.path.join(carpeta, "empresas_data.json")).cargar()
+    elif caso == "sqlite":
+        empresas = RepositorioEmpresasSQLite(os.path.join(carpeta, "en_linea.db")).cargar()
+    else:
+        empresas = RepositorioEmpresasSQLite(os.path.join(carpeta, "referencias.db")).cargar()
+        almacen = AlmacenEmbeddings(os.path.join(carpeta, "embeddings.f32"), dimension=DIMENSION)
+    carga = (time.perf_counter() - inicio) * 1000
+    rss_carga = rss_mb() - rss_inicial
+
+    inicio = time.perf_counter()
+    for datos in empresas.values():
+        embeddings = datos["analisis_nlp"]["embeddings"]
+        vector = embeddings["nombre"] if caso != "sqlite+mmap" else almacen.vector(embeddings, "nombre")
+        sum(a * b for a, b in zip(vector, consulta))
+    recorrido = (time.perf_counter() - inicio) * 1000
+    print(json.dumps({"carga_ms": carga, "rss_mb": rss_carga, "recorrido_ms": recorrido,
+                      "rss_final_mb": rss_mb() - rss_inicial}))
+
+
+def main():
+    print(f"{'empresas':>8}  {'caso':<12}  {'en disco':>9}  {'carga':>9}  {'RSS carga':>10}  "
+          f"{'recorrido':>10}  {'RSS final':>10}")
+    for cantidad in TAMANOS:
+        with tempfile.TemporaryDirectory() as carpeta:
+            preparar(carpeta, cantidad)
+            tamanos = {
+                "json": os.path.getsize(os.path.join(carpeta, "empresas_data.json")),
+                "sqlite": os.path.getsize(os.path.join(carpeta, "en_linea.db")),
+                "sqlite+mmap": os.path.getsize(os.path.join(carpeta, "referencias.db"))
+                + os.path.getsize(os.path.join(carpeta, "embeddings.f32"))
+            }
+            for caso in CASOS:
+                salida = subprocess.run(
+                    [sys.executable, "-m", "Benchmarks.Bench_Embeddings", "--medir", caso, carpeta],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                r = json.loads(salida.strip().splitlines()[-1])
+                print(f"{cantidad:8d}  {caso:<12}  {tamanos[caso] / 1e6:6.1f} MB  {r['carga_ms']:6.0f} ms  "
+                      f"{r['rss_mb']:7.1f} MB  {r['recorrido_ms']:7.0f} ms  {r['rss_final_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--medir":
+        medir(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,84 @@
+"""
+Benchmark de AsyncWhatsAppSender contra WhatsAppSender
+
+Envía N mensajes de texto a un servidor local que imita la Graph API y compara:
+el sender síncrono en serie, el síncrono con un pool de hilos y el asyncio
+en un solo event loop con cientos de envíos en vuelo.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Envio_Async
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Benchmarks.Graph_Simulado import GraphSimulado
+from EnvioMensajes.Envio import WhatsAppSender
+from EnvioMensajes.Envio_Async import AsyncWhatsAppSender
+from PeticionesRequests.Cliente_HTTP_Async import cliente_http_async
+
+MENSAJES = 1000
+LATENCIA = 0.05
+HILOS = 32
+EN_VUELO = 200
+
+
+def bench_sync_serie(url, mensajes):
+    sender = WhatsAppSender()
+    sender.api_url = url
+    inicio = time.perf_counter()
+    for i in range(mensajes):
+        sender.SendText("573000000000", f"Mensaje {i}")
+    return time.perf_counter() - inicio
+
+
+def bench_sync_hilos(url, mensajes):
+    sender = WhatsAppSender()
+    sender.api_url = url
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        list(pool.map(lambda i: sender.SendText("573000000000", f"Mensaje {i}"), range(mensajes)))
+    return time.perf_counter() - inicio
+
+
+async def _bench_async(url, mensajes):
+    sender = AsyncWhatsAppSender()
+    sender.api_url = url
+    limite = asyncio.Semaphore(EN_VUELO)
+
+    async def enviar(i):
+        async with limite:
+            return await sender.SendText("573000000000", f"Mensaje {i}")
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(enviar(i) for i in range(mensajes)))
+    duracion = time.perf_counter() - inicio
+    await cliente_http_async.cerrar()
+    errores = sum(1 for r in resultados if "error" in r)
+    return duracion, errores
+
+
+def main():
+    # El pool síncrono por defecto es menor que el número de hilos; sus avisos no interesan aquí
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    graph = GraphSimulado(latencia=LATENCIA).iniciar()
+    try:
+        print(f"{MENSAJES} mensajes, latencia simulada de la Graph API {LATENCIA * 1000:.0f} ms\n")
+
+        # El envío en serie es lento: se mide con una muestra y se extrapola
+        muestra = 100
+        serie = bench_sync_serie(graph.url, muestra) * MENSAJES / muestra
+        print(f"Sync en serie (estimado):       {serie:7.2f} s  {MENSAJES / serie:8.1f} msg/s")
+
+        hilos = bench_sync_hilos(graph.url, MENSAJES)
+        print(f"Sync con {HILOS} hilos:             {hilos:7.2f} s  {MENSAJES / hilos:8.1f} msg/s")
+
+        duracion, errores = asyncio.run(_bench_async(graph.url, MENSAJES))
+        print(f"Async ({EN_VUELO} en vuelo, 1 hilo):  {duracion:7.2f} s  {MENSAJES / duracion:8.1f} msg/s  ({errores} errores)")
+        print(f"\nConexiones async: {cliente_http_async.metricas()}")
+    finally:
+        graph.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark del guardado de empresas dentro o fuera de la respuesta al usuario
+
+Parte de un repositorio con N empresas (copias de una de empresas_data.json) y
+registra REGISTROS empresas más desde varios hilos, como harían los workers
+del webhook. Compara guardar en el momento (lo que esperaba el usuario antes
+de recibir su análisis) contra marcar la empresa en EscrituraDiferida, y
+cuenta las escrituras físicas y el retraso de durabilidad. Al final detiene
+la escritura diferida y recarga el repositorio para comprobar que no se
+perdió ningún registro.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Escritura_Diferida
+"""
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Almacenamiento.Escritura_Diferida import EscrituraDiferida
+from Almacenamiento.Repositorio_Empresas import RepositorioEmpresasJSON, RepositorioEmpresasSQLite
+
+EMPRESAS = 1000
+REGISTROS = 200
+HILOS = 8
+PAUSA = 0.01
+
+
+def empresas_de_prueba(cantidad):
+    with open("empresas_data.json", "r", encoding="utf-8") as archivo:
+        base = next(iter(json.load(archivo).values()))
+    return {f"empresa_{i}": dict(base, nombre=f"empresa_{i}") for i in range(cantidad)}
+
+
+def registrar(guardar, nueva):
+    """Latencias en ms de cada guardado hecho desde los hilos"""
+    def uno(i):
+        time.sleep(PAUSA)
+        inicio = time.perf_counter()
+        guardar(f"nueva_{i}", dict(nueva, nombre=f"nueva_{i}"))
+        return (time.perf_counter() - inicio) * 1000
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        return list(pool.map(uno, range(REGISTROS)))
+
+
+def percentil(valores, p):
+    return sorted(valores)[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    logging.getLogger().setLevel(logging.CRITICAL)
+    empresas = empresas_de_prueba(EMPRESAS)
+    nueva = next(iter(empresas.values()))
+    print(f"{EMPRESAS} empresas guardadas, {REGISTROS} registros desde {HILOS} hilos\n")
+    print(f"{'repositorio':<12}  {'modo':<9}  {'p50':>9}  {'p99':>9}  {'total':>8}  "
+          f"{'escrituras':>10}  {'retraso máx':>11}  {'guardadas':>9}")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for backend in ("json", "sqlite"):
+            for modo in ("en línea", "diferida"):
+                nombre = f"{backend}_{modo == 'diferida'}"
+                if backend == "json":
+                    ruta = os.path.join(carpeta, f"{nombre}.json")
+                    repositorio = RepositorioEmpresasJSON(ruta)
+                    abrir = lambda: RepositorioEmpresasJSON(ruta)
+                else:
+                    ruta = os.path.join(carpeta, f"{nombre}.db")
+                    repositorio = RepositorioEmpresasSQLite(ruta)
+                    abrir = lambda: RepositorioEmpresasSQLite(ruta)
+                repositorio.guardar_varias(empresas)
+                repositorio.escrituras = 0
+
+                inicio = time.perf_counter()
+                if modo == "diferida":
+                    escritura = EscrituraDiferida(repositorio)
+                    latencias = registrar(escritura.marcar, nueva)
+                    escritura.detener()
+                    retraso = f"{escritura.retraso_max * 1000:8.0f} ms"
+                else:
+                    latencias = registrar(repositorio.guardar, nueva)
+                    retraso = f"{'0':>8} ms"
+                total = time.perf_counter() - inicio
+                repositorio.cerrar()
+
+                recargado = abrir()
+                guardadas_repositorio = recargado.cargar()
+                recargado.cerrar()
+                guardadas = sum(1 for i in range(REGISTROS) if f"nueva_{i}" in guardadas_repositorio)
+                print(f"{backend:<12}  {modo:<9}  {statistics.median(latencias):6.2f} ms  "
+                      f"{percentil(latencias, 0.99):6.2f} ms  {total:6.2f} s  {repositorio.escrituras:10d}  "
+                      f"{retraso}  {guardadas:5d}/{REGISTROS}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de la transcripción por lotes contra una petición por audio
+
+Llegan audios a un ritmo constante (llegadas de Poisson) y se transcriben
+contra un servicio STT simulado que atiende de una petición en una. Para cada
+ventana de agrupación se mide el rendimiento (audios/s) y la latencia por
+audio, desde que llega hasta que su llamador tiene el texto.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Lotes_STT
+"""
+import contextlib
+import io
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Benchmarks.STT_Simulado import STTSimulado
+from Enviroment import Enviroments as env
+from PeticionesRequests import Pich_To_Text
+from PeticionesRequests.Lotes_STT import AgrupadorTranscripciones
+from Procesamiento.Metricas import percentil
+
+AUDIOS = 300
+LLEGADAS_POR_SEGUNDO = 40
+MAX_LOTE = 16
+VENTANAS = [0.005, 0.02, 0.05, 0.1, 0.2]
+COSTO_FIJO = 0.05
+COSTO_POR_AUDIO = 0.005
+
+
+def medir(transcribir, audios, ritmo):
+    """Lanza los audios con llegadas de Poisson y devuelve (duración, latencias)"""
+    latencias = []
+    lock = threading.Lock()
+    audio = b"OggS" + bytes(16 * 1024)
+
+    def llamar(llegada):
+        transcribir(audio)
+        with lock:
+            latencias.append(time.perf_counter() - llegada)
+
+    azar = random.Random(7)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        siguiente = inicio
+        for _ in range(audios):
+            siguiente += azar.expovariate(ritmo)
+            espera = siguiente - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            pool.submit(llamar, time.perf_counter())
+    return time.perf_counter() - inicio, latencias
+
+
+def imprimir(nombre, duracion, latencias, extra=""):
+    latencias = sorted(latencias)
+    print(f"{nombre:<22} {len(latencias) / duracion:8.1f} audios/s   "
+          f"p50 {percentil(latencias, 50) * 1000:7.0f} ms   p95 {percentil(latencias, 95) * 1000:7.0f} ms  {extra}")
+
+
+def main():
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    stt = STTSimulado(costo_fijo=COSTO_FIJO, costo_por_audio=COSTO_POR_AUDIO).iniciar()
+    env.URL_VOZ_TEXTO = stt.url
+    try:
+        print(f"{AUDIOS} audios a {LLEGADAS_POR_SEGUNDO}/s; STT: {COSTO_FIJO * 1000:.0f} ms por petición "
+              f"+ {COSTO_POR_AUDIO * 1000:.0f} ms por audio, una petición a la vez\n")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # _transcribir_bytes imprime cada envío; aquí solo interesa el resultado
+            duracion, latencias = medir(Pich_To_Text._transcribir_bytes, AUDIOS, LLEGADAS_POR_SEGUNDO)
+        imprimir("Una petición por audio", duracion, latencias)
+
+        for ventana in VENTANAS:
+            agrupador = AgrupadorTranscripciones(
+                stt.url_lote, Pich_To_Text._transcribir_bytes, ventana=ventana, max_lote=MAX_LOTE
+            )
+            with contextlib.redirect_stdout(io.StringIO()):
+                duracion, latencias = medir(agrupador.transcribir, AUDIOS, LLEGADAS_POR_SEGUNDO)
+            metricas = agrupador.metricas()
+            agrupador.cerrar()
+            imprimir(f"Lotes, ventana {ventana * 1000:.0f} ms", duracion, latencias,
+                     f"(lote medio {metricas['tamano_medio_lote']})")
+    finally:
+        stt.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark del planificador de envíos contra el envío en ráfaga
+
+Un servidor local imita la Graph API con un límite de mensajes por segundo
+(los que pasan del límite reciben 429). Al mismo tiempo que sale una campaña
+de plantillas, llegan respuestas interactivas, cada una precedida de su
+indicador de escritura. Sin planificador todo sale en ráfaga y parte recibe
+429. Con planificador los envíos se reparten al ritmo permitido y las
+respuestas pasan delante de la campaña.
+
+Para cada tipo de envío se informan los entregados, los rechazados con 429 y
+la espera en la cola del planificador, junto con el ritmo logrado.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Planificador_Envios
+"""
+import logging
+import threading
+import time
+from Benchmarks.Graph_Simulado import GraphSimulado
+from EnvioMensajes.Envio import WhatsAppSender
+from EnvioMensajes.Planificador_Envios import PlanificadorEnvios
+
+LIMITE_POR_SEGUNDO = 80
+LATENCIA = 0.02
+PLANTILLAS = 400
+RESPUESTAS = 300
+DURACION_RESPUESTAS = 3.0
+USUARIOS = 100
+
+
+def carga():
+    """(instante, tipo, función de envío) de cada envío del escenario"""
+    envios = [(0.0, "masivo", lambda s, i=i: s.SendTemplate(f"5731{i:08d}", "promocion"))
+              for i in range(PLANTILLAS)]
+    for i in range(RESPUESTAS):
+        instante = i * DURACION_RESPUESTAS / RESPUESTAS
+        numero = f"5730{i % USUARIOS:08d}"
+        envios.append((instante, "escritura", lambda s, i=i: s.SendWriting(None, f"wamid.{i}")))
+        envios.append((instante, "respuesta", lambda s, n=numero, i=i: s.SendText(n, f"Respuesta {i}")))
+    return sorted(envios, key=lambda envio: envio[0])
+
+
+def ejecutar(graph, planificador):
+    sender = WhatsAppSender()
+    sender.api_url = graph.url
+    sender.bandeja = None  # Solo el planificador: sin reintentos, un 429 es un envío perdido
+    sender.planificador = planificador
+
+    resultados = {"masivo": [0, 0], "escritura": [0, 0], "respuesta": [0, 0]}
+    lock = threading.Lock()
+
+    def enviar(tipo, funcion):
+        respuesta = funcion(sender)
+        with lock:
+            resultados[tipo][0 if "error" not in respuesta else 1] += 1
+
+    hilos = []
+    inicio = time.perf_counter()
+    for instante, tipo, funcion in carga():
+        espera = instante - (time.perf_counter() - inicio)
+        if espera > 0:
+            time.sleep(espera)
+        hilo = threading.Thread(target=enviar, args=(tipo, funcion))
+        hilo.start()
+        hilos.append(hilo)
+    for hilo in hilos:
+        hilo.join()
+    return time.perf_counter() - inicio, resultados
+
+
+def reportar(nombre, duracion, resultados, graph, planificador=None):
+    entregados = sum(ok for ok, _ in resultados.values())
+    print(f"{nombre}: {duracion:.2f} s, {graph.peticiones} peticiones, {graph.limitadas} con 429, "
+          f"ritmo logrado {entregados / duracion:.1f} msg/s")
+    esperas = planificador.metricas()["espera_en_cola"] if planificador else {}
+    for tipo, (ok, fallidos) in resultados.items():
+        linea = f"  {tipo:<10} entregados {ok:4d}  perdidos {fallidos:4d}"
+        if tipo in esperas:
+            linea += (f"  espera p50 {esperas[tipo]['p50_ms']:7.0f} ms  "
+                      f"p95 {esperas[tipo]['p95_ms']:7.0f} ms  máx {esperas[tipo]['max_ms']:7.0f} ms")
+        print(linea)
+    print()
+
+
+def main():
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+    print(f"Graph API simulada con límite de {LIMITE_POR_SEGUNDO} msg/s; campaña de {PLANTILLAS} plantillas "
+          f"y {RESPUESTAS} respuestas (+ indicador de escritura) en {DURACION_RESPUESTAS:.0f} s\n")
+
+    graph = GraphSimulado(LATENCIA, retry_after=1, limite_por_segundo=LIMITE_POR_SEGUNDO).iniciar()
+    try:
+        duracion, resultados = ejecutar(graph, None)
+        reportar("Sin planificador", duracion, resultados, graph)
+    finally:
+        graph.detener()
+
+    # Un poco por debajo del límite del servidor para absorber el desfase de relojes
+    planificador = PlanificadorEnvios(tasa_numero=LIMITE_POR_SEGUNDO * 0.95, rafaga_numero=LIMITE_POR_SEGUNDO * 0.5)
+    graph = GraphSimulado(LATENCIA, retry_after=1, limite_por_segundo=LIMITE_POR_SEGUNDO).iniciar()
+    try:
+        duracion, resultados = ejecutar(graph, planificador)
+        reportar("Con planificador", duracion, resultados, graph, planificador)
+        metricas = planificador.metricas()
+        print(f"Turnos concedidos: {metricas['concedidos']}, frenados por destinatario: "
+              f"{metricas['frenados_por_destinatario']}")
+    finally:
+        graph.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark del guardado de empresas: JSON completo contra SQLite por fila
+
+Parte de una empresa real de empresas_data.json (con sus embeddings) y llena
+cada repositorio con N copias. Mide cuánto tarda registrar una empresa más con:
+- la reescritura original de todo el archivo con indent=4;
+- RepositorioEmpresasJSON (reescritura completa, atómica y con fsync);
+- RepositorioEmpresasSQLite (una fila por empresa, commit sincronizado).
+También mide la carga completa al arrancar.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_Repositorio_Empresas
+"""
+import json
+import os
+import tempfile
+import time
+from Almacenamiento.Repositorio_Empresas import RepositorioEmpresasJSON, RepositorioEmpresasSQLite
+
+TAMANOS = [100, 1000, 5000]
+REGISTROS = 5
+
+
+def empresas_de_prueba(cantidad):
+    with open("empresas_data.json", "r", encoding="utf-8") as archivo:
+        base = next(iter(json.load(archivo).values()))
+    return {f"empresa_{i}": dict(base, nombre=f"empresa_{i}") for i in range(cantidad)}
+
+
+def medir(registrar):
+    """Milisegundos medios por registro"""
+    inicio = time.perf_counter()
+    for i in range(REGISTROS):
+        registrar(i)
+    return (time.perf_counter() - inicio) / REGISTROS * 1000
+
+
+def main():
+    print(f"{'empresas':>8}  {'JSON original':>14}  {'JSON atómico':>13}  {'SQLite':>8}  "
+          f"{'tamaño JSON':>11}  {'carga JSON':>10}  {'carga SQLite':>12}")
+    for cantidad in TAMANOS:
+        empresas = empresas_de_prueba(cantidad)
+        nueva = dict(next(iter(empresas.values())))
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta_json = os.path.join(carpeta, "empresas_data.json")
+            with open(ruta_json, "w", encoding="utf-8") as archivo:
+                json.dump(empresas, archivo, ensure_ascii=False, indent=4)
+            tamano = os.path.getsize(ruta_json)
+
+            def original(i):
+                empresas[f"nueva_{i}"] = nueva
+                with open(ruta_json, "w", encoding="utf-8") as archivo:
+                    json.dump(empresas, archivo, ensure_ascii=False, indent=4)
+
+            ms_original = medir(original)
+
+            repositorio_json = RepositorioEmpresasJSON(ruta_json)
+            inicio = time.perf_counter()
+            repositorio_json.cargar()
+            carga_json = (time.perf_counter() - inicio) * 1000
+            ms_json = medir(lambda i: repositorio_json.guardar(f"atomica_{i}", nueva))
+
+            # El primer arranque migra el JSON; la carga se mide en uno posterior
+            RepositorioEmpresasSQLite(os.path.join(carpeta, "empresas.db"), ruta_json=ruta_json).cerrar()
+            repositorio_sqlite = RepositorioEmpresasSQLite(os.path.join(carpeta, "empresas.db"), ruta_json=ruta_json)
+            inicio = time.perf_counter()
+            repositorio_sqlite.cargar()
+            carga_sqlite = (time.perf_counter() - inicio) * 1000
+            ms_sqlite = medir(lambda i: repositorio_sqlite.guardar(f"sqlite_{i}", nueva))
+            repositorio_sqlite.cerrar()
+
+        print(f"{cantidad:8d}  {ms_original:11.1f} ms  {ms_json:10.1f} ms  {ms_sqlite:5.2f} ms  "
+              f"{tamano / 1e6:8.1f} MB  {carga_json:7.0f} ms  {carga_sqlite:9.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
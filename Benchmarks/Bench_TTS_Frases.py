@@ -0,0 +1,82 @@
+"""
+Benchmark de la síntesis por frases contra la síntesis del texto completo
+
+Sintetiza un resumen de análisis largo contra un servicio TTS simulado cuyo
+costo crece con el largo del texto, y mide el tiempo hasta tener la nota de
+voz con distintos grados de paralelismo. Comprueba además que el MP3
+concatenado tenga todas las tramas de audio.
+
+Uso (desde la raíz del proyecto):
+    python -m Benchmarks.Bench_TTS_Frases
+"""
+import time
+from functools import partial
+from Benchmarks.TTS_Simulado import TTSSimulado, CABECERA_TRAMA, LARGO_TRAMA
+from Enviroment import Enviroments as env
+from PeticionesRequests.Sintesis_Frases import SintetizadorFrases
+from PeticionesRequests.Text_To_Speech import texto_a_voz
+
+TEXTO = (
+    "Análisis de Comercial Andina. La empresa pertenece al sector comercio y reporta ventas anuales "
+    "de cuatro mil millones de pesos con ganancias de trescientos millones. Su margen de ganancia es "
+    "del siete punto cinco por ciento, por debajo del promedio del sector. La liquidez es adecuada, "
+    "con un indicador de uno punto ocho. El endeudamiento es moderado y no compromete la operación. "
+    "La productividad por empleado es alta comparada con empresas similares. Recomendaciones: revisar "
+    "la estructura de costos para mejorar el margen, negociar mejores condiciones con proveedores, "
+    "y evaluar la apertura de canales digitales. También conviene mantener la liquidez actual y "
+    "controlar el crecimiento de la deuda. En resumen, la salud financiera es buena con una "
+    "puntuación de setenta y dos sobre cien."
+)
+REPETICIONES = 3
+
+
+def tramas(mp3):
+    """Cuenta las tramas de audio (sin Xing) de un MP3 generado por el simulador"""
+    cuenta, i = 0, 0
+    while True:
+        i = mp3.find(CABECERA_TRAMA, i)
+        if i < 0:
+            return cuenta
+        if b"Xing" not in mp3[i:i + 64]:
+            cuenta += 1
+        i += LARGO_TRAMA
+
+
+def medir(sintetizar):
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        audio = sintetizar(TEXTO)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), audio
+
+
+def main():
+    tts = TTSSimulado().iniciar()
+    env.URL_TEXTO_VOZ = tts.url
+    sin_cache = partial(texto_a_voz, usar_cache=False)
+    try:
+        print(f"Texto de {len(TEXTO)} caracteres; TTS: {tts.costo_fijo * 1000:.0f} ms por petición "
+              f"+ {tts.costo_por_caracter * 1000:.0f} ms por carácter\n")
+
+        directo, audio = medir(sin_cache)
+        print(f"Texto completo:          {directo * 1000:7.0f} ms   {tramas(audio)} tramas")
+
+        for hilos in (1, 2, 4, 8):
+            sintetizador = SintetizadorFrases(sintetizar=sin_cache, max_workers=hilos)
+            duracion, audio = medir(sintetizador.sintetizar)
+            print(f"Por frases, {hilos} hilos:    {duracion * 1000:7.0f} ms   {tramas(audio)} tramas  "
+                  f"(x{directo / duracion:.1f})")
+
+        sintetizador = SintetizadorFrases(sintetizar=texto_a_voz, max_workers=4)
+        sintetizador.sintetizar(TEXTO)
+        peticiones = tts.peticiones
+        duracion, _ = medir(sintetizador.sintetizar)
+        print(f"Por frases, con caché:   {duracion * 1000:7.0f} ms   "
+              f"({tts.peticiones - peticiones} peticiones al TTS)")
+    finally:
+        tts.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Servidor local que imita el endpoint /messages de la Graph API de WhatsApp
+
+Se usa en los benchmarks para medir los envíos sin tocar la API real. Cada
+petición espera una latencia fija y responde como la Graph API; opcionalmente
+responde 429 o 500 a una fracción de las peticiones, o 429 a las que pasen de
+un límite de mensajes por segundo.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GraphSimulado:
+    """Servidor HTTP en un hilo de fondo que responde como la Graph API"""
+
+    def __init__(self, latencia=0.05, tasa_429=0.0, tasa_500=0.0, retry_after=None, limite_por_segundo=None):
+        """
+        Args:
+            latencia (float): Segundos que tarda cada respuesta
+            tasa_429 (float): Fracción de peticiones que reciben 429
+            tasa_500 (float): Fracción de peticiones que reciben 500
+            retry_after (int, optional): Valor del encabezado Retry-After en los 429
+            limite_por_segundo (float, optional): Mensajes por segundo admitidos;
+                los que pasen del límite (con una ráfaga de un segundo) reciben 429
+        """
+        self.latencia = latencia
+        self.tasa_429 = tasa_429
+        self.tasa_500 = tasa_500
+        self.retry_after = retry_after
+        self.limite_por_segundo = limite_por_segundo
+        self._tokens = limite_por_segundo or 0
+        self._ultimo = time.monotonic()
+        self.peticiones = 0
+        self.aceptadas = 0
+        self.limitadas = 0
+        self.payloads = []
+        self._lock = threading.Lock()
+
+        simulado = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                cuerpo = self.rfile.read(largo)
+                time.sleep(simulado.latencia)
+                estado, respuesta, encabezados = simulado._responder(cuerpo)
+                datos = json.dumps(respuesta).encode("utf-8")
+                self.send_response(estado)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                for nombre, valor in encabezados.items():
+                    self.send_header(nombre, valor)
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        class Servidor(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self._servidor = Servidor(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self._servidor.server_port}/v22.0/123/messages"
+
+    def _responder(self, cuerpo):
+        with self._lock:
+            self.peticiones += 1
+            if self.limite_por_segundo:
+                ahora = time.monotonic()
+                self._tokens = min(self.limite_por_segundo,
+                                   self._tokens + (ahora - self._ultimo) * self.limite_por_segundo)
+                self._ultimo = ahora
+                if self._tokens < 1:
+                    self.limitadas += 1
+                    encabezados = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+                    return 429, {"error": {"code": 130429, "message": "Rate limit hit"}}, encabezados
+                self._tokens -= 1
+
+            azar = random.random()
+            if azar < self.tasa_429:
+                encabezados = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+                return 429, {"error": {"code": 130429, "message": "Rate limit hit"}}, encabezados
+            if azar < self.tasa_429 + self.tasa_500:
+                return 500, {"error": {"code": 1, "message": "Error interno simulado"}}, {}
+
+            self.aceptadas += 1
+            try:
+                payload = json.loads(cuerpo or b"{}")
+            except ValueError:
+                payload = {}
+            self.payloads.append(payload)
+
+        return 200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+        }, {}
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -0,0 +1,75 @@
+"""
+Servidor local que imita el servicio de transcripción (STT)
+
+Expone el endpoint individual (un archivo en "audio_file") y el endpoint por
+lotes (varios archivos en "audio_files"). Las peticiones se atienden de una en
+una, como un modelo en una sola GPU: cada una tarda un costo fijo más un costo
+por audio, así que agrupar audios reparte el costo fijo entre todos.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class STTSimulado:
+    """Servidor HTTP en un hilo de fondo que responde como el servicio STT"""
+
+    def __init__(self, costo_fijo=0.05, costo_por_audio=0.005):
+        """
+        Args:
+            costo_fijo (float): Segundos que cuesta cada petición, con uno o varios audios
+            costo_por_audio (float): Segundos adicionales por cada audio de la petición
+        """
+        self.costo_fijo = costo_fijo
+        self.costo_por_audio = costo_por_audio
+        self.peticiones = 0
+        self.audios = 0
+        self._modelo = threading.Lock()
+
+        simulado = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                cuerpo = self.rfile.read(largo)
+                if self.path.endswith("/batch"):
+                    cantidad = cuerpo.count(b'name="audio_files"')
+                    respuesta = {"transcriptions": [f"transcripcion {i}" for i in range(cantidad)]}
+                else:
+                    cantidad = 1
+                    respuesta = {"transcription": "transcripcion"}
+
+                with simulado._modelo:
+                    simulado.peticiones += 1
+                    simulado.audios += cantidad
+                    time.sleep(simulado.costo_fijo + simulado.costo_por_audio * cantidad)
+
+                datos = json.dumps(respuesta).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        class Servidor(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self._servidor = Servidor(("127.0.0.1", 0), Manejador)
+        base = f"http://127.0.0.1:{self._servidor.server_port}/api/transcribe"
+        self.url = base
+        self.url_lote = f"{base}/batch"
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
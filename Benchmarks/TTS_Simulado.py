@@ -0,0 +1,77 @@
+"""
+Servidor local que imita el servicio de texto a voz (TTS)
+
+Cada petición tarda un costo fijo más un costo por carácter y devuelve un MP3
+válido: etiqueta ID3v2, trama Xing y una trama de audio por cada 10
+caracteres. Atiende varias peticiones a la vez.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Trama MPEG-1 Layer III, 128 kbps, 44100 Hz, sin relleno: 417 bytes
+CABECERA_TRAMA = bytes([0xFF, 0xFB, 0x90, 0x00])
+LARGO_TRAMA = 417
+CARACTERES_POR_TRAMA = 10
+
+
+def generar_mp3(texto):
+    """MP3 sintético con una trama de audio por cada CARACTERES_POR_TRAMA caracteres"""
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10)
+    xing = CABECERA_TRAMA + bytes(32) + b"Xing" + bytes(LARGO_TRAMA - 40)
+    tramas = len(texto) // CARACTERES_POR_TRAMA + 1
+    audio = (CABECERA_TRAMA + bytes(LARGO_TRAMA - 4)) * tramas
+    return id3 + xing + audio
+
+
+class TTSSimulado:
+    """Servidor HTTP en un hilo de fondo que responde como el servicio TTS"""
+
+    def __init__(self, costo_fijo=0.1, costo_por_caracter=0.002):
+        """
+        Args:
+            costo_fijo (float): Segundos que cuesta cada petición
+            costo_por_caracter (float): Segundos adicionales por carácter del texto
+        """
+        self.costo_fijo = costo_fijo
+        self.costo_por_caracter = costo_por_caracter
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+        simulado = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                texto = json.loads(self.rfile.read(largo) or b"{}").get("text", "")
+                with simulado._lock:
+                    simulado.peticiones += 1
+                time.sleep(simulado.costo_fijo + simulado.costo_por_caracter * len(texto))
+
+                datos = generar_mp3(texto)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        class Servidor(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self._servidor = Servidor(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self._servidor.server_port}/text-to-speech"
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
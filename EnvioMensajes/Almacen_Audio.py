@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from Enviroment import Enviroments as env
+
+# Nombres de los archivos que gestiona el almacén (prefijo + hash del
+# contenido); el resto de la carpeta (audios antiguos con nombre uuid, avisos
+# de voz pre-renderizados, manifiestos) no se toca nunca
+PATRON_GESTIONADO = re.compile(r"^(audio|voice)_[0-9a-f]{32}\.mp3$")
+
+
+def carpeta_audio_webhook():
+    """
+    Localiza la carpeta static/audio del webhook
+
+    Returns:
+        str: Ruta de la carpeta (se crea si no existe)
+    """
+    # Detectar automáticamente la ruta correcta del proyecto
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Comprobar si estamos dentro de una subcarpeta
+    # y encontrar la carpeta principal
+    parent_dir = os.path.dirname(current_dir)
+
+    # Buscar la carpeta WebHook en varias posibles ubicaciones
+    webhook_dir = None
+    possible_paths = [
+        os.path.join(parent_dir, 'WebHook'),  # Si estamos en el mismo nivel que WebHook
+        os.path.join(os.path.dirname(parent_dir), 'WebHook'),  # Si estamos un nivel más profundo
+        parent_dir,  # Si ya estamos en la carpeta principal
+        current_dir  # Si todo falla, usar la carpeta actual
+    ]
+
+    for path in possible_paths:
+        if os.path.exists(path) and os.path.isdir(path):
+            webhook_dir = path
+            break
+
+    if not webhook_dir:
+        webhook_dir = current_dir
+
+    # La carpeta static debe estar dentro de la carpeta principal
+    audio_dir = os.path.join(webhook_dir, 'static', 'audio')
+    os.makedirs(audio_dir, exist_ok=True)
+    return audio_dir
+
+
+class AlmacenAudio:
+    """
+    Almacén de los audios que se publican para que WhatsApp los descargue.
+
+    Los archivos se nombran por el hash de su contenido, así el mismo audio se
+    escribe una sola vez. Un archivo caduca poco después de que WhatsApp lo
+    descargue o, si nunca se descarga, al pasar su TTL; además hay una cuota de
+    bytes que se hace cumplir desalojando los más antiguos. Un hilo de barrido
+    en segundo plano aplica las tres reglas.
+    """
+
+    def __init__(self, carpeta, ttl=24 * 3600, ttl_descargado=600,
+                 max_bytes=1024 * 1024 * 1024, intervalo_barrido=300):
+        """
+        Args:
+            carpeta (str): Carpeta pública de los audios
+            ttl (float): Segundos que se conserva un audio que nadie descargó
+            ttl_descargado (float): Segundos que se conserva tras la primera descarga
+                (margen para reintentos de WhatsApp)
+            max_bytes (int): Cuota de bytes de la carpeta
+            intervalo_barrido (float): Segundos entre barridos
+        """
+        self.carpeta = carpeta
+        self.ttl = ttl
+        self.ttl_descargado = ttl_descargado
+        self.max_bytes = max_bytes
+        self.intervalo_barrido = intervalo_barrido
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+        # nombre -> [tamaño, escrito (epoch), descargado (epoch o None)], del más antiguo al más nuevo
+        self._indice = OrderedDict()
+        self._bytes = 0
+
+        # Métricas
+        self.escritos = 0
+        self.deduplicados = 0
+        self.descargas = 0
+        self.expirados_ttl = 0
+        self.expirados_descargados = 0
+        self.evicciones_cuota = 0
+        self.barridos = 0
+        self._inicio = time.monotonic()
+
+        self._cargar_indice()
+
+    def _cargar_indice(self):
+        """Indexa los audios que ya había en la carpeta, del más antiguo al más nuevo"""
+        archivos = []
+        for nombre in os.listdir(self.carpeta):
+            if not PATRON_GESTIONADO.match(nombre):
+                continue
+            try:
+                estado = os.stat(os.path.join(self.carpeta, nombre))
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, nombre, estado.st_size))
+
+        for mtime, nombre, tamano in sorted(archivos):
+            self._indice[nombre] = [tamano, mtime, None]
+            self._bytes += tamano
+        if archivos:
+            logging.info(f"Almacén de audio: {len(archivos)} archivos existentes ({self._bytes} bytes)")
+
+    def guardar(self, audio_bytes, prefijo):
+        """
+        Publica un audio, reutilizando el archivo si el contenido ya existe
+
+        Args:
+            audio_bytes (bytes): Los bytes del audio
+            prefijo (str): Prefijo del nombre del archivo ("audio" o "voice")
+
+        Returns:
+            str: Nombre del archivo dentro de la carpeta
+        """
+        nombre = f"{prefijo}_{hashlib.sha256(audio_bytes).hexdigest()[:32]}.mp3"
+        ruta = os.path.join(self.carpeta, nombre)
+        ahora = time.time()
+
+        with self._lock:
+            entrada = self._indice.get(nombre)
+            if entrada is not None and os.path.exists(ruta):
+                # Mismo contenido: se renueva el plazo para el nuevo envío
+                entrada[1] = ahora
+                entrada[2] = None
+                self._indice.move_to_end(nombre)
+                self.deduplicados += 1
+                logging.info(f"Audio ya publicado, se reutiliza: {ruta}")
+                return nombre
+
+        # Guardar el archivo de forma atómica para no servir un archivo a medias
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(audio_bytes)
+
+        # Publicar e indexar bajo el lock: un barrido no puede borrar el archivo
+        # entre que aparece en la carpeta y entra en el índice
+        with self._lock:
+            os.replace(temporal, ruta)
+            if nombre in self._indice:
+                self._bytes -= self._indice.pop(nombre)[0]
+            self._indice[nombre] = [len(audio_bytes), ahora, None]
+            self._bytes += len(audio_bytes)
+            self.escritos += 1
+            sobre_cuota = self._bytes > self.max_bytes
+
+        if sobre_cuota:
+            self.barrer()
+        return nombre
+
+    def marcar_descargado(self, nombre):
+        """
+        Registra que WhatsApp descargó un audio; caducará tras ttl_descargado
+
+        Args:
+            nombre (str): Nombre del archivo dentro de la carpeta
+        """
+        with self._lock:
+            entrada = self._indice.get(nombre)
+            if entrada is not None and entrada[2] is None:
+                entrada[2] = time.time()
+                self.descargas += 1
+
+    def barrer(self, ahora=None):
+        """
+        Elimina los audios caducados y desaloja los más antiguos si se supera la cuota
+
+        Args:
+            ahora (float, optional): Epoch de referencia (por defecto el actual)
+
+        Returns:
+            int: Archivos eliminados
+        """
+        ahora = time.time() if ahora is None else ahora
+        eliminar = []
+        with self._lock:
+            for nombre, (tamano, escrito, descargado) in list(self._indice.items()):
+                if descargado is not None and ahora - descargado >= self.ttl_descargado:
+                    self.expirados_descargados += 1
+                elif ahora - escrito >= self.ttl:
+                    self.expirados_ttl += 1
+                else:
+                    continue
+                del self._indice[nombre]
+                self._bytes -= tamano
+                eliminar.append(nombre)
+
+            while self._bytes > self.max_bytes and self._indice:
+                nombre, (tamano, _, _) = self._indice.popitem(last=False)
+                self._bytes -= tamano
+                self.evicciones_cuota += 1
+                eliminar.append(nombre)
+            self.barridos += 1
+
+            # Se borra sin soltar el lock: un guardar() del mismo contenido
+            # podría volver a publicar el archivo justo antes de borrarlo
+            for nombre in eliminar:
+                try:
+                    os.remove(os.path.join(self.carpeta, nombre))
+                except OSError:
+                    pass
+        if eliminar:
+            logging.info(f"Almacén de audio: {len(eliminar)} archivos eliminados")
+        return len(eliminar)
+
+    def _bucle_barrido(self):
+        while not self._detener.wait(self.intervalo_barrido):
+            try:
+                self.barrer()
+            except Exception as e:
+                logging.error(f"Error en el barrido del almacén de audio: {str(e)}", exc_info=True)
+
+    def iniciar(self):
+        """Arranca el hilo de barrido en segundo plano"""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._bucle_barrido, name="barrido-audio", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de barrido"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    def metricas(self):
+        with self._lock:
+            eliminados = self.expirados_ttl + self.expirados_descargados + self.evicciones_cuota
+            minutos = (time.monotonic() - self._inicio) / 60
+            return {
+                "archivos": len(self._indice),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "escritos": self.escritos,
+                "deduplicados": self.deduplicados,
+                "descargas": self.descargas,
+                "expirados_ttl": self.expirados_ttl,
+                "expirados_descargados": self.expirados_descargados,
+                "evicciones_cuota": self.evicciones_cuota,
+                "eliminados_por_minuto": round(eliminados / minutos, 3) if minutos else 0.0,
+                "barridos": self.barridos
+            }
+
+
+# Almacén único para todos los senders del proceso
+almacen_audio = AlmacenAudio(
+    carpeta_audio_webhook(),
+    ttl=env.AUDIO_TTL,
+    ttl_descargado=env.AUDIO_TTL_DESCARGADO,
+    max_bytes=env.AUDIO_MAX_BYTES,
+    intervalo_barrido=env.AUDIO_INTERVALO_BARRIDO
+)
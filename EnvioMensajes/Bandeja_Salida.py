@@ -0,0 +1,547 @@
+import email.utils
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from Enviroment import Enviroments as env
+from EnvioMensajes.Planificador_Envios import planificador_envios, prioridad_de, destinatario_de
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from Procesamiento.Metricas import VentanaLatencias
+
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+FALLIDO = "fallido"
+
+# Códigos de error de la Graph API que indican límite de envío de la cuenta o
+# del número (llegan con 429 o con 400): se pausa toda la bandeja
+CODIGOS_LIMITE = {4, 80007, 130429}
+# Límite por par emisor-destinatario y errores transitorios de la plataforma
+CODIGOS_REINTENTABLES = {1, 2, 131000, 131016, 131056}
+
+
+def espera_reintento(intentos, base, maximo):
+    """
+    Espera antes del siguiente intento: exponencial con jitter completo
+
+    Args:
+        intentos (int): Intentos fallidos hasta ahora (1 tras el primero)
+        base (float): Segundos de espera tras el primer fallo
+        maximo (float): Tope de la espera en segundos
+
+    Returns:
+        float: Segundos de espera, al azar entre 0 y el tope exponencial
+    """
+    return random.uniform(0, min(maximo, base * 2 ** (intentos - 1)))
+
+
+def leer_retry_after(valor):
+    """
+    Interpreta el encabezado Retry-After (segundos o fecha HTTP)
+
+    Args:
+        valor (str): Valor del encabezado
+
+    Returns:
+        float: Segundos a esperar, o None si no hay un valor válido
+    """
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = email.utils.parsedate_to_datetime(valor)
+        return max(0.0, fecha.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def codigo_error_graph(response):
+    """Código de error de la Graph API en el cuerpo de la respuesta, si lo hay"""
+    try:
+        error = response.json().get("error")
+        return error.get("code") if isinstance(error, dict) else None
+    except (ValueError, AttributeError):
+        return None
+
+
+class BandejaSalida:
+    """
+    Bandeja de salida persistente para los envíos a la Graph API (SQLite, modo WAL).
+
+    Cada payload se guarda antes de enviarse y se marca como enviado solo
+    cuando la API responde 200, así que una caída de la API o del proceso no
+    pierde respuestas. Los errores transitorios (conexión, 5xx, límites) se
+    reintentan desde un hilo de fondo con espera exponencial y jitter; un 429
+    o un código de límite pausa toda la bandeja el tiempo que indique
+    Retry-After. Los errores definitivos (otros 4xx) no se reintentan.
+
+    Cada envío lleva una clave de cliente: un payload con la misma clave que
+    otro ya aceptado se descarta. Los envíos a un mismo destinatario salen en
+    orden: mientras tenga uno esperando reintento, los nuevos se encolan detrás.
+    """
+
+    def __init__(self, ruta, max_intentos=8, espera_base=1.0, espera_max=300,
+                 max_antiguedad=24 * 3600, retencion=24 * 3600, workers=4,
+                 plazo_envio=60, intervalo_sondeo=1.0, planificador=None):
+        """
+        Args:
+            ruta (str): Archivo SQLite (":memory:" para no persistir)
+            max_intentos (int): Intentos antes de dar un envío por fallido
+            espera_base (float): Segundos de espera tras el primer fallo
+            espera_max (float): Tope de la espera entre intentos
+            max_antiguedad (float): Segundos tras los que un envío pendiente se descarta
+                (fuera de la ventana de 24 h de WhatsApp ya no se puede entregar)
+            retencion (float): Segundos que se recuerdan los envíos terminados (deduplicación)
+            workers (int): Reintentos en vuelo a la vez
+            plazo_envio (float): Segundos tras los que un envío en curso se da por
+                abandonado (proceso caído) y se vuelve a intentar
+            intervalo_sondeo (float): Segundos entre revisiones de envíos vencidos
+            planificador (PlanificadorEnvios, optional): Limitador de ritmo por el
+                que pasa cada intento
+        """
+        self.ruta = ruta
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.max_antiguedad = max_antiguedad
+        self.retencion = retencion
+        self.workers = workers
+        self.plazo_envio = plazo_envio
+        self.intervalo_sondeo = intervalo_sondeo
+        self.planificador = planificador
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {env.ACCESS_TOKEN_WHATSAPP}"
+        }
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pool = None
+        self._en_vuelo = 0
+        # Filas con un intento en curso en este proceso: no se reclaman aunque
+        # venza su plazo mientras esperan turno en el planificador
+        self._intentando = set()
+        self._pausa_hasta = 0.0
+        self._ultima_purga = 0.0
+
+        # Métricas
+        self._latencia_entrega = VentanaLatencias()
+        self.aceptados = 0
+        self.duplicados = 0
+        self.enviados = 0
+        self.enviados_al_primer_intento = 0
+        self.reintentos = 0
+        self.limitados = 0
+        self.fallidos = 0
+        self.caducados = 0
+
+        self._conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS salida ("
+            "id INTEGER PRIMARY KEY, clave TEXT NOT NULL UNIQUE, destinatario TEXT NOT NULL, "
+            "url TEXT NOT NULL, payload TEXT NOT NULL, estado TEXT NOT NULL, "
+            "intentos INTEGER NOT NULL DEFAULT 0, proximo REAL NOT NULL, creado REAL NOT NULL, "
+            "actualizado REAL NOT NULL, ultimo_error TEXT)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_salida_estado ON salida (estado, proximo)")
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_salida_destinatario ON salida (destinatario, estado)")
+        pendientes = self._conexion.execute(
+            "SELECT COUNT(*) FROM salida WHERE estado IN (?, ?)", (PENDIENTE, ENVIANDO)
+        ).fetchone()[0]
+        logging.info(f"Bandeja de salida en SQLite: {ruta} ({pendientes} envíos pendientes)")
+
+    def _clave(self, payload, clave):
+        """
+        Clave de deduplicación de un envío
+
+        Sin clave explícita, las respuestas a un mensaje (con context) usan el
+        hash del payload: reprocesar ese mensaje no duplica la respuesta. El
+        resto recibe una clave única.
+        """
+        if clave:
+            return clave
+        if payload.get("context"):
+            return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return uuid.uuid4().hex
+
+    def _insertar(self, url, payload, clave, enviar_ya):
+        """
+        Guarda un envío nuevo
+
+        Returns:
+            tuple: (id de la fila o None si la clave ya existía, True si se
+                reservó para enviarlo ya en este hilo)
+        """
+        ahora = time.time()
+        destinatario = str(payload.get("to") or "")
+        with self._lock:
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if enviar_ya:
+                    # Detrás de un envío del mismo destinatario que espera reintento
+                    enviar_ya = time.monotonic() >= self._pausa_hasta and cursor.execute(
+                        "SELECT 1 FROM salida WHERE destinatario = ? AND estado = ? LIMIT 1",
+                        (destinatario, PENDIENTE)
+                    ).fetchone() is None
+                cursor.execute(
+                    "INSERT INTO salida (clave, destinatario, url, payload, estado, proximo, creado, actualizado) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(clave) DO NOTHING",
+                    (clave, destinatario, url, json.dumps(payload), ENVIANDO if enviar_ya else PENDIENTE,
+                     ahora + self.plazo_envio if enviar_ya else ahora, ahora, ahora)
+                )
+                fila = cursor.lastrowid if cursor.rowcount == 1 else None
+                cursor.execute("COMMIT")
+                if fila is not None and enviar_ya:
+                    self._intentando.add(fila)
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            if fila is None:
+                self.duplicados += 1
+            else:
+                self.aceptados += 1
+        return fila, enviar_ya
+
+    def enviar(self, url, payload, clave=None):
+        """
+        Guarda el envío y lo intenta de inmediato en este hilo
+
+        Args:
+            url (str): Endpoint de mensajes de la Graph API
+            payload (dict): Cuerpo del mensaje
+            clave (str, optional): Clave de deduplicación del cliente
+
+        Returns:
+            dict: Respuesta de la API si se entregó; {"encolado": True, ...} si
+                quedó para reintento; {"duplicado": True, ...} si la clave ya
+                estaba; {"error": ...} si el error es definitivo
+        """
+        clave = self._clave(payload, clave)
+        fila, enviar_ya = self._insertar(url, payload, clave, enviar_ya=True)
+        if fila is None:
+            logging.info(f"Envío duplicado descartado: {clave}")
+            return {"duplicado": True, "clave": clave}
+        if not enviar_ya:
+            self._asegurar_hilo()
+            self._despertar.set()
+            return {"encolado": True, "clave": clave}
+        return self._intentar(fila, url, payload, clave, 0, time.time())
+
+    def encolar(self, url, payload, clave=None):
+        """
+        Guarda el envío para que lo entregue el hilo de fondo
+
+        Args:
+            url (str): Endpoint de mensajes de la Graph API
+            payload (dict): Cuerpo del mensaje
+            clave (str, optional): Clave de deduplicación del cliente
+
+        Returns:
+            dict: {"encolado": True, "clave": ...} o {"duplicado": True, "clave": ...}
+        """
+        clave = self._clave(payload, clave)
+        fila, _ = self._insertar(url, payload, clave, enviar_ya=False)
+        if fila is None:
+            return {"duplicado": True, "clave": clave}
+        self._asegurar_hilo()
+        self._despertar.set()
+        return {"encolado": True, "clave": clave}
+
+    def _intentar(self, fila, url, payload, clave, intentos, creado):
+        """Hace un intento de envío y actualiza el estado de la fila"""
+        try:
+            return self._intento(fila, url, payload, clave, intentos + 1, creado)
+        finally:
+            with self._lock:
+                self._intentando.discard(fila)
+
+    def _renovar_plazo(self, fila):
+        """Renueva el plazo de un envío en curso (otro proceso no lo reclama)"""
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE salida SET proximo = ?, actualizado = ? WHERE id = ? AND estado = ?",
+                (ahora + self.plazo_envio, ahora, fila, ENVIANDO)
+            )
+
+    def _intento(self, fila, url, payload, clave, intentos, creado):
+        if self.planificador is not None:
+            # El turno puede tardar más que plazo_envio (pausa por Retry-After)
+            self.planificador.turno(url, destinatario_de(payload), prioridad_de(payload))
+            self._renovar_plazo(fila)
+        try:
+            response = cliente_http.post(url, headers=self.headers, data=json.dumps(payload))
+        except requests.exceptions.RequestException as e:
+            return self._reprogramar(fila, clave, intentos, f"Error de conexión: {str(e)}", None, None)
+
+        if response.status_code == 200:
+            self._terminar(fila, ENVIADO, intentos, None)
+            self._latencia_entrega.registrar(max(0.0, time.time() - creado))
+            with self._lock:
+                self.enviados += 1
+                if intentos == 1:
+                    self.enviados_al_primer_intento += 1
+            try:
+                return response.json()
+            except ValueError:
+                return {"clave": clave}
+
+        error = f"Error {response.status_code} al enviar mensaje: {response.text[:500]}"
+        codigo = codigo_error_graph(response)
+        retry_after = leer_retry_after(response.headers.get("Retry-After"))
+
+        if response.status_code == 429 or codigo in CODIGOS_LIMITE:
+            espera = retry_after if retry_after is not None else espera_reintento(
+                intentos, self.espera_base, self.espera_max)
+            with self._lock:
+                self.limitados += 1
+                self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + espera)
+            if self.planificador is not None:
+                self.planificador.pausar(url, espera)
+            logging.warning(f"Límite de envío de la Graph API: se pausa la bandeja {espera:.1f} s")
+            return self._reprogramar(fila, clave, intentos, error, response.status_code, espera)
+
+        if response.status_code >= 500 or response.status_code == 408 or codigo in CODIGOS_REINTENTABLES:
+            return self._reprogramar(fila, clave, intentos, error, response.status_code, retry_after)
+
+        logging.error(error)
+        self._terminar(fila, FALLIDO, intentos, error)
+        with self._lock:
+            self.fallidos += 1
+        return {"error": error, "status_code": response.status_code}
+
+    def _reprogramar(self, fila, clave, intentos, error, status_code, espera):
+        """Deja la fila pendiente para otro intento, o fallida si se agotaron"""
+        if intentos >= self.max_intentos:
+            logging.error(f"Envío {clave} descartado tras {intentos} intentos: {error}")
+            self._terminar(fila, FALLIDO, intentos, error)
+            with self._lock:
+                self.fallidos += 1
+            return {"error": error, "status_code": status_code}
+
+        if espera is None:
+            espera = espera_reintento(intentos, self.espera_base, self.espera_max)
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE salida SET estado = ?, intentos = ?, proximo = ?, actualizado = ?, ultimo_error = ? "
+                "WHERE id = ?",
+                (PENDIENTE, intentos, ahora + espera, ahora, error, fila)
+            )
+            self.reintentos += 1
+        logging.warning(f"Envío {clave} reprogramado en {espera:.1f} s (intento {intentos}): {error}")
+        self._asegurar_hilo()
+        return {"encolado": True, "clave": clave, "status_code": status_code,
+                "intentos": intentos, "reintento_en": round(espera, 3)}
+
+    def _terminar(self, fila, estado, intentos, error):
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE salida SET estado = ?, intentos = ?, actualizado = ?, ultimo_error = ? WHERE id = ?",
+                (estado, intentos, time.time(), error, fila)
+            )
+
+    def _reclamar(self, limite):
+        """
+        Reserva los envíos vencidos, como mucho uno por destinatario (el más
+        antiguo) para no desordenar sus mensajes
+
+        Returns:
+            list: Filas (id, url, payload, clave, intentos, creado)
+        """
+        ahora = time.time()
+        with self._lock:
+            if time.monotonic() < self._pausa_hasta:
+                return []
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                filas = cursor.execute(
+                    "SELECT id, url, payload, clave, intentos, creado FROM salida AS s "
+                    "WHERE estado IN (?, ?) AND proximo <= ? AND id = ("
+                    "SELECT MIN(id) FROM salida WHERE destinatario = s.destinatario AND estado IN (?, ?)) "
+                    "ORDER BY proximo LIMIT ?",
+                    (PENDIENTE, ENVIANDO, ahora, PENDIENTE, ENVIANDO, limite)
+                ).fetchall()
+                filas = [fila for fila in filas if fila[0] not in self._intentando]
+                cursor.executemany(
+                    "UPDATE salida SET estado = ?, proximo = ? WHERE id = ?",
+                    [(ENVIANDO, ahora + self.plazo_envio, fila[0]) for fila in filas]
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            self._intentando.update(fila[0] for fila in filas)
+        return filas
+
+    def _procesar(self, fila):
+        id_fila, url, payload, clave, intentos, creado = fila
+        try:
+            if time.time() - creado > self.max_antiguedad:
+                logging.error(f"Envío {clave} caducado sin entregar tras {intentos} intentos")
+                self._terminar(id_fila, FALLIDO, intentos, "Caducado")
+                with self._lock:
+                    self.caducados += 1
+                return
+            self._intentar(id_fila, url, json.loads(payload), clave, intentos, creado)
+        except Exception as e:
+            logging.error(f"Error al reintentar el envío {clave}: {str(e)}", exc_info=True)
+        finally:
+            with self._lock:
+                self._en_vuelo -= 1
+                self._intentando.discard(id_fila)
+            self._despertar.set()
+
+    def _purgar(self):
+        """Olvida los envíos terminados que ya salieron de la ventana de retención"""
+        ahora = time.time()
+        if ahora - self._ultima_purga < 60:
+            return
+        self._ultima_purga = ahora
+        with self._lock:
+            cursor = self._conexion.execute(
+                "DELETE FROM salida WHERE estado IN (?, ?) AND actualizado <= ?",
+                (ENVIADO, FALLIDO, ahora - self.retencion)
+            )
+        if cursor.rowcount:
+            logging.info(f"Bandeja de salida: {cursor.rowcount} envíos terminados olvidados")
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self._purgar()
+                with self._lock:
+                    libres = self.workers - self._en_vuelo
+                filas = self._reclamar(libres) if libres > 0 else []
+                for fila in filas:
+                    with self._lock:
+                        self._en_vuelo += 1
+                    self._pool.submit(self._procesar, fila)
+                if filas:
+                    continue
+            except Exception as e:
+                logging.error(f"Error en la bandeja de salida: {str(e)}", exc_info=True)
+
+            with self._lock:
+                pausa = self._pausa_hasta - time.monotonic()
+            self._despertar.wait(min(self.intervalo_sondeo, pausa) if pausa > 0 else self.intervalo_sondeo)
+            self._despertar.clear()
+
+    def _asegurar_hilo(self):
+        with self._lock:
+            if self._hilo is not None or self._detener.is_set():
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="salida")
+            self._hilo = threading.Thread(target=self._bucle, name="bandeja-salida", daemon=True)
+            self._hilo.start()
+
+    def iniciar(self):
+        """Arranca el hilo de reintentos (retoma lo que quedó de una ejecución anterior)"""
+        self._asegurar_hilo()
+        self._despertar.set()
+
+    def detener(self):
+        """Detiene el hilo de reintentos; lo pendiente queda guardado para el próximo arranque"""
+        self._detener.set()
+        self._despertar.set()
+        hilo = self._hilo
+        if hilo is not None:
+            hilo.join(timeout=5)
+            self._pool.shutdown(wait=True)
+
+    def pendientes(self):
+        """
+        Returns:
+            int: Envíos aceptados que aún no se entregaron ni se descartaron
+        """
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT COUNT(*) FROM salida WHERE estado IN (?, ?)", (PENDIENTE, ENVIANDO)
+            ).fetchone()[0]
+
+    def esperar_vacia(self, timeout=None):
+        """
+        Espera a que no queden envíos pendientes
+
+        Args:
+            timeout (float, optional): Segundos máximos de espera
+
+        Returns:
+            bool: True si la bandeja quedó vacía
+        """
+        limite = time.monotonic() + timeout if timeout is not None else None
+        while self.pendientes():
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def metricas(self):
+        with self._lock:
+            estados = dict(self._conexion.execute(
+                "SELECT estado, COUNT(*) FROM salida GROUP BY estado"
+            ).fetchall())
+            mas_antiguo = self._conexion.execute(
+                "SELECT MIN(creado) FROM salida WHERE estado IN (?, ?)", (PENDIENTE, ENVIANDO)
+            ).fetchone()[0]
+            pausa = self._pausa_hasta - time.monotonic()
+            return {
+                "ruta": self.ruta,
+                "pendientes": estados.get(PENDIENTE, 0) + estados.get(ENVIANDO, 0),
+                "antiguedad_pendiente_s": round(time.time() - mas_antiguo, 1) if mas_antiguo else 0.0,
+                "aceptados": self.aceptados,
+                "duplicados": self.duplicados,
+                "enviados": self.enviados,
+                "enviados_al_primer_intento": self.enviados_al_primer_intento,
+                "reintentos": self.reintentos,
+                "limitados": self.limitados,
+                "fallidos": self.fallidos,
+                "caducados": self.caducados,
+                "pausa_restante_s": round(pausa, 1) if pausa > 0 else 0.0,
+                "latencia_entrega": self._latencia_entrega.resumen()
+            }
+
+
+def crear_bandeja_salida():
+    """
+    Crea la bandeja de salida configurada en Enviroments
+
+    Returns:
+        BandejaSalida: Bandeja en el archivo configurado (en memoria si no se
+            puede abrir), o None si los envíos duraderos están desactivados
+    """
+    if not env.SALIDA_DURADERA:
+        return None
+
+    opciones = dict(
+        max_intentos=env.SALIDA_MAX_INTENTOS,
+        espera_base=env.SALIDA_ESPERA_BASE,
+        espera_max=env.SALIDA_ESPERA_MAX,
+        max_antiguedad=env.SALIDA_MAX_ANTIGUEDAD,
+        retencion=env.SALIDA_RETENCION,
+        workers=env.SALIDA_WORKERS,
+        planificador=planificador_envios
+    )
+    try:
+        return BandejaSalida(env.RUTA_SALIDA, **opciones)
+    except sqlite3.Error as e:
+        logging.error(f"No se pudo abrir la bandeja de salida: {str(e)}. Se usará memoria.")
+        return BandejaSalida(":memory:", **opciones)
+
+
+# Bandeja única para todos los senders del proceso
+bandeja_salida = crear_bandeja_salida()
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ENTREGADO = "entregado"
+ENCOLADO = "encolado"
+DUPLICADO = "duplicado"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+# Estados que no se vuelven a enviar al reanudar una difusión
+ESTADOS_TERMINADOS = {ENTREGADO, ENCOLADO, DUPLICADO}
+
+
+def parametros_cuerpo(*valores):
+    """
+    Componentes de plantilla con los parámetros de texto del cuerpo
+
+    Args:
+        *valores: Valores de {{1}}, {{2}}, ... en el orden de la plantilla
+
+    Returns:
+        list: Componentes para SendTemplate
+    """
+    return [{
+        "type": "body",
+        "parameters": [{"type": "text", "text": str(valor)} for valor in valores]
+    }]
+
+
+def _normalizar_destinatario(destinatario, componentes):
+    """(numero, componentes) a partir de un número o de un dict {"numero", "componentes"}"""
+    if isinstance(destinatario, dict):
+        return str(destinatario["numero"]), destinatario.get("componentes", componentes)
+    return str(destinatario), componentes
+
+
+class DifusionPlantillas:
+    """
+    Envío de una plantilla a muchos destinatarios con concurrencia acotada.
+
+    Los envíos salen por un pool de hilos del tamaño de max_concurrencia y
+    pasan por el sender, así que respetan el planificador de envíos (prioridad
+    masiva y límites por número y destinatario) y la bandeja de salida. Cada
+    envío lleva la clave "difusion:<id>:<numero>": reanudar la misma difusión
+    nunca envía dos veces la plantilla a nadie. Al reintentar un error la clave
+    lleva además el número de reintento (":r1", ":r2"...), porque la bandeja de
+    salida recuerda la clave del envío fallido y lo descartaría como duplicado.
+
+    El progreso se anota en un archivo JSONL (una línea por destinatario
+    terminado). Si la difusión se corta, volver a llamar a difundir con el
+    mismo archivo salta a los destinatarios ya atendidos.
+
+    Varias difusiones pueden correr a la vez en la misma instancia; cada una
+    se cancela por su id con cancelar(id_difusion).
+    """
+
+    def __init__(self, sender, max_concurrencia=16):
+        """
+        Args:
+            sender (WhatsAppSender): Sender usado para los envíos
+            max_concurrencia (int): Envíos en vuelo a la vez
+        """
+        self.sender = sender
+        self.max_concurrencia = max_concurrencia
+        self._lock = threading.Lock()
+        # id de la difusión en curso -> evento de cancelación
+        self._cancelaciones = {}
+
+    def _leer_progreso(self, archivo_progreso):
+        """
+        Lee un archivo de progreso
+
+        Returns:
+            tuple: (id de la difusión o None, dict numero -> último resultado)
+        """
+        id_difusion = None
+        resultados = {}
+        if not archivo_progreso or not os.path.exists(archivo_progreso):
+            return id_difusion, resultados
+
+        with open(archivo_progreso, "r", encoding="utf-8") as archivo:
+            for linea in archivo:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    # Última línea a medio escribir si el proceso se cortó
+                    continue
+                if "id_difusion" in registro:
+                    id_difusion = registro["id_difusion"]
+                elif "numero" in registro:
+                    resultados[registro["numero"]] = registro
+        return id_difusion, resultados
+
+    def difundir(self, plantilla, destinatarios, idioma="es", componentes=None,
+                 archivo_progreso=None, id_difusion=None, reintentar_errores=False):
+        """
+        Envía una plantilla a una lista de destinatarios
+
+        Args:
+            plantilla (str): Nombre de la plantilla aprobada
+            destinatarios (list): Números, o dicts {"numero", "componentes"} con
+                componentes propios de cada destinatario
+            idioma (str): Código del idioma de la plantilla
+            componentes (list, optional): Componentes para quien no trae los suyos
+            archivo_progreso (str, optional): Archivo JSONL de progreso para reanudar
+            id_difusion (str, optional): Identificador de la difusión; por defecto
+                el del archivo de progreso o uno nuevo
+            reintentar_errores (bool): Al reanudar, volver a intentar los que fallaron
+
+        Returns:
+            dict: Informe con los totales por estado, la duración, el ritmo y un
+                resultado por destinatario
+
+        Raises:
+            RuntimeError: Si ya hay una difusión en curso con el mismo id
+        """
+        id_guardado, previos = self._leer_progreso(archivo_progreso)
+        id_difusion = id_difusion or id_guardado or uuid.uuid4().hex
+        cancelada = threading.Event()
+        with self._lock:
+            if id_difusion in self._cancelaciones:
+                raise RuntimeError(f"La difusión {id_difusion} ya está en curso")
+            self._cancelaciones[id_difusion] = cancelada
+        try:
+            return self._difundir(plantilla, destinatarios, idioma, componentes, archivo_progreso,
+                                  id_difusion, id_guardado, previos, reintentar_errores, cancelada)
+        finally:
+            with self._lock:
+                self._cancelaciones.pop(id_difusion, None)
+
+    def _difundir(self, plantilla, destinatarios, idioma, componentes, archivo_progreso,
+                  id_difusion, id_guardado, previos, reintentar_errores, cancelada):
+        terminados = ESTADOS_TERMINADOS | (set() if reintentar_errores else {ERROR})
+
+        resultados = {}
+        pendientes = []
+        for destinatario in destinatarios:
+            numero, componentes_numero = _normalizar_destinatario(destinatario, componentes)
+            previo = previos.get(numero)
+            if previo is not None and previo.get("estado") in terminados:
+                resultados[numero] = dict(previo, reanudado=True)
+            elif numero not in resultados:
+                resultados[numero] = None
+                reintento = previo.get("reintento", 0) + 1 if previo is not None and previo.get("estado") == ERROR else 0
+                pendientes.append((numero, componentes_numero, reintento))
+
+        lock = threading.Lock()
+        archivo = None
+        if archivo_progreso:
+            archivo = open(archivo_progreso, "a", encoding="utf-8")
+            if id_guardado is None:
+                archivo.write(json.dumps({"id_difusion": id_difusion, "plantilla": plantilla}) + "\n")
+                archivo.flush()
+
+        def enviar(numero, componentes_numero, reintento):
+            if cancelada.is_set():
+                # No se anota en el progreso: al reanudar se enviará
+                with lock:
+                    resultados[numero] = {"numero": numero, "estado": CANCELADO}
+                return
+            clave = f"difusion:{id_difusion}:{numero}" + (f":r{reintento}" if reintento else "")
+            try:
+                respuesta = self.sender.SendTemplate(
+                    numero, plantilla, idioma, componentes_numero, clave_envio=clave
+                )
+            except Exception as e:
+                logging.error(f"Error al difundir a {numero}: {str(e)}", exc_info=True)
+                respuesta = {"error": str(e)}
+
+            if "error" in respuesta:
+                registro = {"numero": numero, "estado": ERROR, "error": respuesta["error"],
+                            "status_code": respuesta.get("status_code")}
+            elif respuesta.get("duplicado"):
+                registro = {"numero": numero, "estado": DUPLICADO}
+            elif respuesta.get("encolado"):
+                registro = {"numero": numero, "estado": ENCOLADO}
+            else:
+                mensajes = respuesta.get("messages") or [{}]
+                registro = {"numero": numero, "estado": ENTREGADO, "id_mensaje": mensajes[0].get("id")}
+            if reintento:
+                registro["reintento"] = reintento
+
+            with lock:
+                resultados[numero] = registro
+                if archivo is not None:
+                    archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                    archivo.flush()
+
+        logging.info(f"Difusión {id_difusion} de la plantilla {plantilla}: {len(pendientes)} envíos "
+                     f"({len(resultados) - len(pendientes)} ya atendidos)")
+        inicio = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrencia, thread_name_prefix="difusion") as pool:
+                list(pool.map(lambda envio: enviar(*envio), pendientes))
+        finally:
+            if archivo is not None:
+                archivo.close()
+        duracion = time.monotonic() - inicio
+
+        totales = {estado: 0 for estado in (ENTREGADO, ENCOLADO, DUPLICADO, ERROR, CANCELADO)}
+        reanudados = 0
+        for registro in resultados.values():
+            totales[registro["estado"]] += 1
+            reanudados += 1 if registro.get("reanudado") else 0
+        enviados = len(pendientes) - totales[CANCELADO]
+        informe = {
+            "id_difusion": id_difusion,
+            "plantilla": plantilla,
+            "destinatarios": len(resultados),
+            "totales": totales,
+            "reanudados": reanudados,
+            "duracion_s": round(duracion, 2),
+            "por_minuto": round(enviados / duracion * 60, 1) if duracion > 0 else 0.0,
+            "resultados": resultados
+        }
+        logging.info(f"Difusión {id_difusion} terminada en {duracion:.1f} s: {totales}")
+        return informe
+
+    def cancelar(self, id_difusion):
+        """
+        Detiene una difusión en curso; los envíos ya empezados terminan
+
+        Args:
+            id_difusion (str): Id de la difusión (el del informe o el archivo de progreso)
+
+        Returns:
+            bool: True si la difusión estaba en curso
+        """
+        with self._lock:
+            cancelada = self._cancelaciones.get(id_difusion)
+        if cancelada is None:
+            return False
+        cancelada.set()
+        return True
+
+    def en_curso(self):
+        """Ids de las difusiones que están corriendo"""
+        with self._lock:
+            return list(self._cancelaciones)
+
@@ -1,9 +1,11 @@
 import requests
 import json
 import logging
-import os
-import uuid
 from Enviroment import Enviroments as env
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from EnvioMensajes.Almacen_Audio import almacen_audio
+from EnvioMensajes.Bandeja_Salida import bandeja_salida, leer_retry_after
+from EnvioMensajes.Planificador_Envios import planificador_envios, prioridad_de, destinatario_de
 
 class WhatsAppSender:
     """
@@ -24,6 +26,12 @@ class WhatsAppSender:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.token}"
         }
+        
+        # Bandeja de salida duradera (None si está desactivada en Enviroments)
+        self.bandeja = bandeja_salida
+        
+        # Límites de ritmo y prioridades de envío (None si está desactivado)
+        self.planificador = planificador_envios
     
     def SendText(self, num, body, message_id=None):
         """
@@ -37,22 +45,7 @@ class WhatsAppSender:
         Returns:
             dict: Respuesta de la API de WhatsApp
         """
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": num,
-            "type": "text",
-            "text": {
-                "body": body
-            }
-        }
-        
-        if message_id is not None:
-            payload["context"] = {
-                "message_id": message_id
-            }
-        
-        return self._send_request(payload)
+        return self._send_request(self._payload_texto(num, body, message_id))
     
     def SendAudio(self, num, audio_bytes, message_id=None):
         """
@@ -64,70 +57,8 @@ class WhatsAppSender:
             message_id (str, optional): ID del mensaje al que se responde
         """
         try:
-            # Detectar automáticamente la ruta correcta del proyecto
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            
-            # Comprobar si estamos dentro de una subcarpeta
-            # y encontrar la carpeta principal
-            parent_dir = os.path.dirname(current_dir)
-            
-            # Buscar la carpeta WebHook en varias posibles ubicaciones
-            webhook_dir = None
-            possible_paths = [
-                os.path.join(parent_dir, 'WebHook'),  # Si estamos en el mismo nivel que WebHook
-                os.path.join(os.path.dirname(parent_dir), 'WebHook'),  # Si estamos un nivel más profundo
-                parent_dir,  # Si ya estamos en la carpeta principal
-                current_dir  # Si todo falla, usar la carpeta actual
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path) and os.path.isdir(path):
-                    webhook_dir = path
-                    break
-            
-            if not webhook_dir:
-                webhook_dir = current_dir
-                
-            # La carpeta static debe estar dentro de la carpeta principal
-            audio_dir = os.path.join(webhook_dir, 'static', 'audio')
-            os.makedirs(audio_dir, exist_ok=True)
-            
-            # Generar nombre único para el archivo
-            filename = f"audio_{uuid.uuid4()}.mp3"
-            filepath = os.path.join(audio_dir, filename)
-            
-            # Guardar el archivo
-            with open(filepath, 'wb') as f:
-                f.write(audio_bytes)
-            
-            # Log para depuración
-            logging.info(f"Audio guardado en: {filepath}")
-            
-            # Construir URL para la API de WhatsApp
-            audio_url = f"{env.URL_CLOUDFLARE}/static/audio/{filename}"
-            
-            # Log para depuración
-            logging.info(f"URL para WhatsApp: {audio_url}")
-            
-            # Preparar payload
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": num,
-                "type": "audio",
-                "audio": {
-                    "link": audio_url
-                }
-            }
-            
-            # Añadir contexto si hay message_id
-            if message_id is not None:
-                payload["context"] = {
-                    "message_id": message_id
-                }
-            
-            # Enviar la petición
-            return self._send_request(payload)
+            audio_url = self._guardar_audio(audio_bytes, "audio")
+            return self._send_request(self._payload_audio(num, audio_url, message_id))
             
         except Exception as e:
             logging.error(f"Error al enviar audio: {str(e)}", exc_info=True)
@@ -143,69 +74,24 @@ class WhatsAppSender:
             message_id (str, optional): ID del mensaje al que se responde
         """
         try:
-            # Detectar automáticamente la ruta correcta del proyecto
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            parent_dir = os.path.dirname(current_dir)
-            
-            # Buscar la carpeta principal en varias posibles ubicaciones
-            webhook_dir = None
-            possible_paths = [
-                os.path.join(parent_dir, 'WebHook'),
-                os.path.join(os.path.dirname(parent_dir), 'WebHook'),
-                parent_dir,
-                current_dir
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path) and os.path.isdir(path):
-                    webhook_dir = path
-                    break
-            
-            if not webhook_dir:
-                webhook_dir = current_dir
-                
-            # La carpeta static debe estar dentro de la carpeta principal
-            audio_dir = os.path.join(webhook_dir, 'static', 'audio')
-            os.makedirs(audio_dir, exist_ok=True)
-            
-            # Generar nombre único para el archivo
-            filename = f"voice_{uuid.uuid4()}.mp3"
-            filepath = os.path.join(audio_dir, filename)
-            
-            # Guardar el archivo
-            with open(filepath, 'wb') as f:
-                f.write(audio_bytes)
-            
-            logging.info(f"Nota de voz guardada en: {filepath}")
-            
-            # Construir URL para la API de WhatsApp
-            audio_url = f"{env.URL_CLOUDFLARE}/static/audio/{filename}"
-            logging.info(f"URL para WhatsApp: {audio_url}")
-            
-            # Preparar payload para una nota de voz
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": num,
-                "type": "audio",  # WhatsApp usa el mismo tipo "audio" tanto para audios como para notas de voz
-                "audio": {
-                    "link": audio_url
-                }
-            }
-            
-            # Añadir contexto si hay message_id
-            if message_id is not None:
-                payload["context"] = {
-                    "message_id": message_id
-                }
-            
-            # Enviar la petición
-            return self._send_request(payload)
+            audio_url = self._guardar_audio(audio_bytes, "voice")
+            return self._send_request(self._payload_audio(num, audio_url, message_id))
             
         except Exception as e:
             logging.error(f"Error al enviar nota de voz: {str(e)}", exc_info=True)
             return {"error": f"Error al enviar nota de voz: {str(e)}"}
 
+    def SendVoiceNoteUrl(self, num, audio_url, message_id=None):
+        """
+        Envía como nota de voz un audio ya publicado, sin guardar nada
+        
+        Args:
+            num (str): Número de teléfono del destinatario
+            audio_url (str): URL pública del audio
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        return self._send_request(self._payload_audio(num, audio_url, message_id))
+
     def SendImage(self, num, image_url, caption=None, message_id=None):
         """
         Envía una imagen a un número de WhatsApp
@@ -216,25 +102,7 @@ class WhatsAppSender:
             caption (str, optional): Descripción de la imagen
             message_id (str, optional): ID del mensaje al que se responde
         """
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": num,
-            "type": "image",
-            "image": {
-                "link": image_url
-            }
-        }
-        
-        if caption:
-            payload["image"]["caption"] = caption
-            
-        if message_id is not None:
-            payload["context"] = {
-                "message_id": message_id
-            }
-        
-        return self._send_request(payload)
+        return self._send_request(self._payload_imagen(num, image_url, caption, message_id))
         
     def SendWriting(self, num, message_id=None):
         """
@@ -247,29 +115,8 @@ class WhatsAppSender:
         Returns:
             dict: Respuesta de la API de WhatsApp
         """
-        # Si no hay message_id, envía un mensaje con tres puntos como alternativa
-        if message_id is None:
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": num,
-                "type": "text",
-                "text": {
-                    "body": "..."
-                }
-            }
-        else:
-            # Implementación oficial del indicador de escritura
-            payload = {
-                "messaging_product": "whatsapp",
-                "status": "read",
-                "message_id": message_id,
-                "typing_indicator": {
-                    "type": "text"
-                }
-            }
-        
-        return self._send_request(payload)
+        # El indicador no sirve pasado el momento: no se guarda ni se reintenta
+        return self._send_request(self._payload_escritura(num, message_id), duradero=False)
                 
     def SendDocument(self, num, document_url, filename=None, caption=None, message_id=None):
         """
@@ -282,6 +129,135 @@ class WhatsAppSender:
             caption (str, optional): Descripción del documento
             message_id (str, optional): ID del mensaje al que se responde
         """
+        return self._send_request(self._payload_documento(num, document_url, filename, caption, message_id))
+    
+    def SendTemplate(self, num, template_name, language="es", components=None, message_id=None, clave_envio=None):
+        """
+        Envía un mensaje con plantilla a un número de WhatsApp
+        
+        Args:
+            num (str): Número de teléfono del destinatario
+            template_name (str): Nombre de la plantilla
+            language (str): Código del idioma (por defecto "es")
+            components (list, optional): Componentes para personalizar la plantilla
+            message_id (str, optional): ID del mensaje al que se responde
+            clave_envio (str, optional): Clave de deduplicación en la bandeja de salida
+        """
+        return self._send_request(self._payload_plantilla(num, template_name, language, components, message_id),
+                                  clave=clave_envio)
+    
+    def carpeta_audio(self):
+        """
+        Carpeta static/audio del webhook, desde donde WhatsApp descarga los audios
+        
+        Returns:
+            str: Ruta de la carpeta
+        """
+        return almacen_audio.carpeta
+    
+    def url_audio(self, filename):
+        """
+        URL pública de un archivo de la carpeta static/audio
+        
+        Args:
+            filename (str): Nombre del archivo dentro de la carpeta
+            
+        Returns:
+            str: URL que WhatsApp usará para descargar el audio
+        """
+        return f"{env.URL_AUDIO_PUBLICA}/static/audio/{filename}"
+    
+    def _guardar_audio(self, audio_bytes, prefijo):
+        """
+        Guarda el audio en la carpeta static del webhook para que WhatsApp lo descargue
+        
+        Args:
+            audio_bytes (bytes): Los bytes del audio
+            prefijo (str): Prefijo del nombre del archivo ("audio" o "voice")
+            
+        Returns:
+            str: URL pública del archivo
+        """
+        # El almacén nombra el archivo por su contenido y se encarga de borrarlo
+        filename = almacen_audio.guardar(audio_bytes, prefijo)
+        
+        # Construir URL para la API de WhatsApp
+        audio_url = self.url_audio(filename)
+        logging.info(f"URL para WhatsApp: {audio_url}")
+        return audio_url
+    
+    def _con_contexto(self, payload, message_id):
+        """Añade el contexto de respuesta si hay message_id"""
+        if message_id is not None:
+            payload["context"] = {
+                "message_id": message_id
+            }
+        return payload
+    
+    def _payload_texto(self, num, body, message_id=None):
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": num,
+            "type": "text",
+            "text": {
+                "body": body
+            }
+        }
+        return self._con_contexto(payload, message_id)
+    
+    def _payload_audio(self, num, audio_url, message_id=None):
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": num,
+            "type": "audio",  # WhatsApp usa el mismo tipo "audio" tanto para audios como para notas de voz
+            "audio": {
+                "link": audio_url
+            }
+        }
+        return self._con_contexto(payload, message_id)
+    
+    def _payload_imagen(self, num, image_url, caption=None, message_id=None):
+        payload = {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": num,
+            "type": "image",
+            "image": {
+                "link": image_url
+            }
+        }
+        
+        if caption:
+            payload["image"]["caption"] = caption
+            
+        return self._con_contexto(payload, message_id)
+    
+    def _payload_escritura(self, num, message_id=None):
+        # Si no hay message_id, envía un mensaje con tres puntos como alternativa
+        if message_id is None:
+            return {
+                "messaging_product": "whatsapp",
+                "recipient_type": "individual",
+                "to": num,
+                "type": "text",
+                "text": {
+                    "body": "..."
+                }
+            }
+        
+        # Implementación oficial del indicador de escritura
+        return {
+            "messaging_product": "whatsapp",
+            "status": "read",
+            "message_id": message_id,
+            "typing_indicator": {
+                "type": "text"
+            }
+        }
+    
+    def _payload_documento(self, num, document_url, filename=None, caption=None, message_id=None):
         payload = {
             "messaging_product": "whatsapp",
             "recipient_type": "individual",
@@ -296,24 +272,10 @@ class WhatsAppSender:
             payload["document"]["filename"] = filename
         if caption:
             payload["document"]["caption"] = caption
-        if message_id is not None:
-            payload["context"] = {
-                "message_id": message_id
-            }
         
-        return self._send_request(payload)
+        return self._con_contexto(payload, message_id)
     
-    def SendTemplate(self, num, template_name, language="es", components=None, message_id=None):
-        """
-        Envía un mensaje con plantilla a un número de WhatsApp
-        
-        Args:
-            num (str): Número de teléfono del destinatario
-            template_name (str): Nombre de la plantilla
-            language (str): Código del idioma (por defecto "es")
-            components (list, optional): Componentes para personalizar la plantilla
-            message_id (str, optional): ID del mensaje al que se responde
-        """
+    def _payload_plantilla(self, num, template_name, language="es", components=None, message_id=None):
         payload = {
             "messaging_product": "whatsapp",
             "recipient_type": "individual",
@@ -329,26 +291,35 @@ class WhatsAppSender:
         
         if components:
             payload["template"]["components"] = components
-        if message_id is not None:
-            payload["context"] = {
-                "message_id": message_id
-            }
             
-        return self._send_request(payload)
+        return self._con_contexto(payload, message_id)
     
-    def _send_request(self, payload):
+    def _send_request(self, payload, duradero=True, clave=None):
         """
         Realiza la petición a la API de WhatsApp
         
         Args:
             payload (dict): Datos a enviar en la petición
+            duradero (bool): Pasar por la bandeja de salida, que guarda el envío
+                y lo reintenta si la API falla
+            clave (str, optional): Clave de deduplicación en la bandeja de salida
             
         Returns:
-            dict: Respuesta de la API o diccionario con el error
+            dict: Respuesta de la API, {"encolado": True, ...} si quedó para
+                reintento, o diccionario con el error
         """
+        if duradero and self.bandeja is not None:
+            try:
+                return self.bandeja.enviar(self.api_url, payload, clave)
+            except Exception as e:
+                # Sin bandeja (disco lleno, base bloqueada) se envía directamente
+                logging.error(f"Error en la bandeja de salida, se envía sin guardar: {str(e)}", exc_info=True)
+        
         try:
+            if self.planificador is not None:
+                self.planificador.turno(self.api_url, destinatario_de(payload), prioridad_de(payload))
             logging.debug(f"Enviando petición a WhatsApp API: {json.dumps(payload)[:100]}...")
-            response = requests.post(
+            response = cliente_http.post(
                 self.api_url,
                 headers=self.headers,
                 data=json.dumps(payload)
@@ -361,6 +332,8 @@ class WhatsAppSender:
             else:
                 error_msg = f"Error {response.status_code} al enviar mensaje: {response.text}"
                 logging.error(error_msg)
+                if response.status_code == 429 and self.planificador is not None:
+                    self.planificador.pausar(self.api_url, leer_retry_after(response.headers.get("Retry-After")) or 1.0)
                 return {"error": error_msg, "status_code": response.status_code}
                 
         except requests.exceptions.RequestException as e:
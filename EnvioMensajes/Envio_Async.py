@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+from EnvioMensajes.Envio import WhatsAppSender
+from EnvioMensajes.Bandeja_Salida import leer_retry_after
+from EnvioMensajes.Planificador_Envios import prioridad_de, destinatario_de
+from PeticionesRequests.Cliente_HTTP_Async import cliente_http_async, aiohttp
+
+
+class AsyncWhatsAppSender(WhatsAppSender):
+    """
+    Versión asyncio de WhatsAppSender.
+
+    Expone los mismos métodos con los mismos argumentos, payloads y respuestas,
+    pero como corrutinas: un solo event loop puede mantener cientos de envíos
+    a la Graph API en vuelo sin un hilo por petición.
+    """
+
+    def __init__(self):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp no está instalado; instálalo para usar AsyncWhatsAppSender")
+        super().__init__()
+
+    async def SendText(self, num, body, message_id=None):
+        """
+        Envía un mensaje de texto a un número de WhatsApp
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            body (str): Texto del mensaje
+            message_id (str, optional): ID del mensaje al que se responde
+
+        Returns:
+            dict: Respuesta de la API de WhatsApp
+        """
+        return await self._send_request(self._payload_texto(num, body, message_id))
+
+    async def SendAudio(self, num, audio_bytes, message_id=None):
+        """
+        Envía un mensaje de audio a un número de WhatsApp usando bytes directamente
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            audio_bytes (bytes): Los bytes del audio a enviar
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        try:
+            # Escribir el archivo fuera del event loop
+            audio_url = await asyncio.to_thread(self._guardar_audio, audio_bytes, "audio")
+            return await self._send_request(self._payload_audio(num, audio_url, message_id))
+
+        except Exception as e:
+            logging.error(f"Error al enviar audio: {str(e)}", exc_info=True)
+            return {"error": f"Error al enviar audio: {str(e)}"}
+
+    async def SendVoiceNote(self, num, audio_bytes, message_id=None):
+        """
+        Envía un mensaje de audio como nota de voz a un número de WhatsApp
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            audio_bytes (bytes): Los bytes del audio a enviar
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        try:
+            audio_url = await asyncio.to_thread(self._guardar_audio, audio_bytes, "voice")
+            return await self._send_request(self._payload_audio(num, audio_url, message_id))
+
+        except Exception as e:
+            logging.error(f"Error al enviar nota de voz: {str(e)}", exc_info=True)
+            return {"error": f"Error al enviar nota de voz: {str(e)}"}
+
+    async def SendVoiceNoteUrl(self, num, audio_url, message_id=None):
+        """
+        Envía como nota de voz un audio ya publicado, sin guardar nada
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            audio_url (str): URL pública del audio
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        return await self._send_request(self._payload_audio(num, audio_url, message_id))
+
+    async def SendImage(self, num, image_url, caption=None, message_id=None):
+        """
+        Envía una imagen a un número de WhatsApp
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            image_url (str): URL de la imagen a enviar
+            caption (str, optional): Descripción de la imagen
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        return await self._send_request(self._payload_imagen(num, image_url, caption, message_id))
+
+    async def SendWriting(self, num, message_id=None):
+        """
+        Muestra el indicador de escritura al usuario
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            message_id (str, opcional): ID del mensaje recibido al que estás respondiendo
+
+        Returns:
+            dict: Respuesta de la API de WhatsApp
+        """
+        return await self._send_request(self._payload_escritura(num, message_id), duradero=False)
+
+    async def SendDocument(self, num, document_url, filename=None, caption=None, message_id=None):
+        """
+        Envía un documento a un número de WhatsApp
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            document_url (str): URL del documento a enviar
+            filename (str, optional): Nombre del archivo
+            caption (str, optional): Descripción del documento
+            message_id (str, optional): ID del mensaje al que se responde
+        """
+        return await self._send_request(self._payload_documento(num, document_url, filename, caption, message_id))
+
+    async def SendTemplate(self, num, template_name, language="es", components=None, message_id=None,
+                           clave_envio=None):
+        """
+        Envía un mensaje con plantilla a un número de WhatsApp
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            template_name (str): Nombre de la plantilla
+            language (str): Código del idioma (por defecto "es")
+            components (list, optional): Componentes para personalizar la plantilla
+            message_id (str, optional): ID del mensaje al que se responde
+            clave_envio (str, optional): Clave de deduplicación en la bandeja de salida
+        """
+        return await self._send_request(self._payload_plantilla(num, template_name, language, components, message_id),
+                                        clave=clave_envio)
+
+    async def _send_request(self, payload, duradero=True, clave=None):
+        """
+        Realiza la petición a la API de WhatsApp
+
+        El primer intento se hace en el event loop; si falla por un error
+        transitorio (conexión, 429, 5xx) el envío pasa a la bandeja de salida,
+        que lo reintenta en segundo plano.
+
+        Args:
+            payload (dict): Datos a enviar en la petición
+            duradero (bool): Pasar los fallos transitorios a la bandeja de salida
+            clave (str, optional): Clave de deduplicación en la bandeja de salida
+
+        Returns:
+            dict: Respuesta de la API, {"encolado": True, ...} si quedó para
+                reintento, o diccionario con el error
+        """
+        try:
+            if self.planificador is not None:
+                await self.planificador.turno_async(self.api_url, destinatario_de(payload), prioridad_de(payload))
+            logging.debug(f"Enviando petición a WhatsApp API: {json.dumps(payload)[:100]}...")
+            sesion = cliente_http_async.sesion()
+            async with sesion.post(self.api_url, headers=self.headers, data=json.dumps(payload)) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    logging.debug(f"Respuesta de WhatsApp API: {result}")
+                    return result
+
+                error_msg = f"Error {response.status} al enviar mensaje: {await response.text()}"
+                if response.status == 429 and self.planificador is not None:
+                    self.planificador.pausar(self.api_url, leer_retry_after(response.headers.get("Retry-After")) or 1.0)
+                if duradero and (response.status == 429 or response.status >= 500):
+                    return await self._a_bandeja(payload, error_msg, clave)
+                logging.error(error_msg)
+                return {"error": error_msg, "status_code": response.status}
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_msg = f"Error de conexión al enviar mensaje: {str(e)}"
+            if duradero:
+                return await self._a_bandeja(payload, error_msg, clave)
+            logging.error(error_msg, exc_info=True)
+            return {"error": error_msg}
+        except Exception as e:
+            error_msg = f"Error inesperado al enviar mensaje: {str(e)}"
+            logging.error(error_msg, exc_info=True)
+            return {"error": error_msg}
+
+    async def _a_bandeja(self, payload, error_msg, clave=None):
+        """Deja un envío fallido en la bandeja de salida para que se reintente"""
+        if self.bandeja is None:
+            logging.error(error_msg)
+            return {"error": error_msg}
+        logging.warning(f"{error_msg}. Se reintentará desde la bandeja de salida")
+        try:
+            return await asyncio.to_thread(self.bandeja.encolar, self.api_url, payload, clave)
+        except Exception as e:
+            logging.error(f"Error en la bandeja de salida: {str(e)}", exc_info=True)
+            return {"error": error_msg}
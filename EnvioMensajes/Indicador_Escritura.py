@@ -0,0 +1,93 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IndicadorEscritura:
+    """
+    Envía el indicador de escritura/lectura en segundo plano.
+
+    El envío se delega a un pool pequeño de hilos y nunca se espera su
+    resultado, así la primera respuesta real no paga el viaje de ida y vuelta a
+    la Graph API. Los fallos solo se cuentan.
+    """
+
+    def __init__(self, sender, max_workers=2, max_pendientes=100):
+        """
+        Args:
+            sender (WhatsAppSender): Sender usado para enviar el indicador
+            max_workers (int): Hilos dedicados a los indicadores
+            max_pendientes (int): Indicadores en espera a partir de los cuales se descartan
+        """
+        self.sender = sender
+        self.max_pendientes = max_pendientes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="indicador-escritura")
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.pendientes = 0
+        self.enviados = 0
+        self.fallidos = 0
+        self.descartados = 0
+
+    def enviar(self, num, message_id):
+        """
+        Programa el indicador de escritura sin bloquear al llamador
+
+        Args:
+            num (str): Número de teléfono del destinatario
+            message_id (str): ID del mensaje recibido; sin él no se envía nada
+                (el "..." de SendWriting llegaría al usuario como un mensaje real)
+        """
+        with self._lock:
+            if message_id is None or self.pendientes >= self.max_pendientes:
+                # Sin message_id no hay indicador oficial, y si hay demasiados en
+                # espera ya no tiene sentido mostrarlos
+                self.descartados += 1
+                return
+            self.pendientes += 1
+
+        try:
+            futuro = self._pool.submit(self._enviar, num, message_id)
+        except RuntimeError:
+            # El pool ya se cerró (apagado del servidor)
+            with self._lock:
+                self.pendientes -= 1
+                self.descartados += 1
+            return
+        futuro.add_done_callback(self._cancelado)
+
+    def _cancelado(self, futuro):
+        """Descuenta los indicadores que cerrar() canceló antes de enviarse"""
+        if futuro.cancelled():
+            with self._lock:
+                self.pendientes -= 1
+                self.descartados += 1
+
+    def _enviar(self, num, message_id):
+        try:
+            respuesta = self.sender.SendWriting(num, message_id)
+            fallido = not isinstance(respuesta, dict) or "error" in respuesta
+        except Exception as e:
+            logging.debug(f"Error al enviar indicador de escritura: {str(e)}")
+            fallido = True
+
+        with self._lock:
+            self.pendientes -= 1
+            if fallido:
+                self.fallidos += 1
+            else:
+                self.enviados += 1
+
+    def cerrar(self):
+        """Deja de aceptar indicadores sin esperar a los pendientes"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "pendientes": self.pendientes,
+                "enviados": self.enviados,
+                "fallidos": self.fallidos,
+                "descartados": self.descartados
+            }
@@ -0,0 +1,337 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from Enviroment import Enviroments as env
+from Procesamiento.Metricas import VentanaLatencias
+
+# Prioridades de envío: menor número sale antes
+PRIORIDAD_RESPUESTA = 0
+PRIORIDAD_ESCRITURA = 1
+PRIORIDAD_MASIVO = 2
+NOMBRES_PRIORIDAD = {
+    PRIORIDAD_RESPUESTA: "respuesta",
+    PRIORIDAD_ESCRITURA: "escritura",
+    PRIORIDAD_MASIVO: "masivo"
+}
+
+
+def prioridad_de(payload):
+    """
+    Prioridad de un payload de la Graph API
+
+    Args:
+        payload (dict): Cuerpo del envío
+
+    Returns:
+        int: PRIORIDAD_ESCRITURA para indicadores y confirmaciones de lectura,
+            PRIORIDAD_MASIVO para plantillas y PRIORIDAD_RESPUESTA para el resto
+    """
+    if "status" in payload:
+        return PRIORIDAD_ESCRITURA
+    if payload.get("type") == "template":
+        return PRIORIDAD_MASIVO
+    return PRIORIDAD_RESPUESTA
+
+
+def destinatario_de(payload):
+    """Destinatario de un payload, o None si no es un mensaje (indicador de escritura)"""
+    return payload.get("to")
+
+
+class CuboTokens:
+    """
+    Cubo de tokens: admite ráfagas de hasta capacidad envíos y, en promedio,
+    tasa envíos por segundo. No es thread-safe; lo protege el planificador.
+    """
+
+    def __init__(self, tasa, capacidad):
+        """
+        Args:
+            tasa (float): Tokens que se recargan por segundo
+            capacidad (float): Tokens máximos acumulados (tamaño de la ráfaga)
+        """
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self, ahora):
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def espera(self, ahora):
+        """Segundos hasta que haya un token (0 si ya lo hay)"""
+        self._recargar(ahora)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.tasa
+
+    def consumir(self, ahora):
+        self._recargar(ahora)
+        self.tokens -= 1
+
+    def pausar(self, segundos, ahora):
+        """Vacía el cubo para que el próximo token llegue dentro de segundos"""
+        self._recargar(ahora)
+        self.tokens = min(self.tokens, 1 - segundos * self.tasa)
+
+    def lleno(self, ahora):
+        self._recargar(ahora)
+        return self.tokens >= self.capacidad
+
+
+class PlanificadorEnvios:
+    """
+    Planificador de los envíos a la Graph API con límites de ritmo y prioridades.
+
+    Cada envío pide turno y espera hasta obtenerlo; nunca se descarta. Hay un
+    cubo de tokens por número de WhatsApp Business (la URL de envío incluye su
+    ID) con el ritmo de la cuenta, y otro por par número-destinatario con el
+    límite por usuario de WhatsApp. El límite por destinatario solo se aplica a
+    los envíos masivos: una respuesta a un usuario que escribe mucho no debe
+    dormir el carril que la envía durante segundos.
+
+    Cuando hay cola, un hilo reparte los tokens por prioridad: primero las
+    respuestas, luego los indicadores de escritura y por último los envíos
+    masivos o de plantilla. Cada prioridad es un heap ordenado por (instante en
+    que el envío puede salir, llegada), así elegir el siguiente no recorre la
+    cola. Un envío masivo frenado por su destinatario vuelve a su heap con el
+    instante en que habrá token y no bloquea a los de otros destinatarios.
+    """
+
+    def __init__(self, tasa_numero=80, rafaga_numero=80, tasa_destinatario=1 / 6,
+                 rafaga_destinatario=45, max_destinatarios=10000):
+        """
+        Args:
+            tasa_numero (float): Envíos por segundo de cada número de WhatsApp Business
+            rafaga_numero (float): Envíos seguidos que admite un número sin esperar
+            tasa_destinatario (float): Envíos por segundo a un mismo destinatario
+            rafaga_destinatario (float): Envíos seguidos a un mismo destinatario
+            max_destinatarios (int): Cubos de destinatario antes de olvidar los llenos
+        """
+        self.tasa_numero = tasa_numero
+        self.rafaga_numero = rafaga_numero
+        self.tasa_destinatario = tasa_destinatario
+        self.rafaga_destinatario = rafaga_destinatario
+        self.max_destinatarios = max_destinatarios
+        self._condicion = threading.Condition()
+        # Un heap por prioridad: (listo, secuencia, remitente, destinatario, despertar, llegada, frenado)
+        self._colas = {prioridad: [] for prioridad in NOMBRES_PRIORIDAD}
+        self._en_cola = 0
+        self._secuencia = itertools.count()
+        self._numeros = {}
+        self._destinatarios = {}
+        self._hilo = None
+
+        # Métricas
+        self._esperas = {prioridad: VentanaLatencias() for prioridad in NOMBRES_PRIORIDAD}
+        self._concedidos = {prioridad: 0 for prioridad in NOMBRES_PRIORIDAD}
+        self._ultimo_minuto = deque()  # Instantes de los turnos concedidos en el último minuto
+        self._inicio = time.monotonic()
+        self.frenados_por_destinatario = 0
+        self.pausas = 0
+
+    def _cubo_numero(self, remitente):
+        cubo = self._numeros.get(remitente)
+        if cubo is None:
+            cubo = self._numeros[remitente] = CuboTokens(self.tasa_numero, self.rafaga_numero)
+        return cubo
+
+    def _cubo_destinatario(self, remitente, destinatario, ahora):
+        clave = (remitente, destinatario)
+        cubo = self._destinatarios.get(clave)
+        if cubo is None:
+            if len(self._destinatarios) >= self.max_destinatarios:
+                # Un cubo lleno se comporta igual que uno nuevo: se puede olvidar
+                for vieja in [c for c, v in self._destinatarios.items() if v.lleno(ahora)]:
+                    del self._destinatarios[vieja]
+            cubo = self._destinatarios[clave] = CuboTokens(self.tasa_destinatario, self.rafaga_destinatario)
+        return cubo
+
+    def _solicitar(self, remitente, destinatario, prioridad, despertar):
+        """
+        Pone un envío en la cola; si no hay cola y hay tokens, lo concede ya
+
+        Returns:
+            bool: True si el turno se concedió sin esperar
+        """
+        with self._condicion:
+            ahora = time.monotonic()
+            if not self._en_cola and self._cubo_numero(remitente).espera(ahora) == 0 and (
+                    not self._limita_destinatario(prioridad, destinatario)
+                    or self._cubo_destinatario(remitente, destinatario, ahora).espera(ahora) == 0):
+                self._conceder(prioridad, remitente, destinatario, ahora, ahora)
+                return True
+
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="planificador-envios", daemon=True)
+                self._hilo.start()
+            heapq.heappush(self._colas[prioridad], (ahora, next(self._secuencia), remitente, destinatario,
+                                                    despertar, ahora, False))
+            self._en_cola += 1
+            self._condicion.notify()
+            return False
+
+    @staticmethod
+    def _limita_destinatario(prioridad, destinatario):
+        """El límite por destinatario solo frena los envíos masivos"""
+        return destinatario is not None and prioridad == PRIORIDAD_MASIVO
+
+    def turno(self, remitente, destinatario=None, prioridad=PRIORIDAD_RESPUESTA):
+        """
+        Bloquea hasta que el envío puede salir sin pasar los límites
+
+        Args:
+            remitente (str): Identificador del número emisor (la URL de envío)
+            destinatario (str, optional): Número del destinatario; None si no es un mensaje.
+                Solo cuenta para el límite por destinatario en PRIORIDAD_MASIVO
+            prioridad (int): PRIORIDAD_RESPUESTA, PRIORIDAD_ESCRITURA o PRIORIDAD_MASIVO
+
+        Returns:
+            float: Segundos que esperó en la cola
+        """
+        inicio = time.monotonic()
+        evento = threading.Event()
+        if not self._solicitar(remitente, destinatario, prioridad, evento.set):
+            evento.wait()
+        return time.monotonic() - inicio
+
+    async def turno_async(self, remitente, destinatario=None, prioridad=PRIORIDAD_RESPUESTA):
+        """Versión asyncio de turno: espera sin bloquear el event loop"""
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+
+        def despertar():
+            loop.call_soon_threadsafe(lambda: futuro.done() or futuro.set_result(None))
+
+        if not self._solicitar(remitente, destinatario, prioridad, despertar):
+            await futuro
+        return time.monotonic() - inicio
+
+    def pausar(self, remitente, segundos):
+        """
+        Frena todos los envíos de un número (la Graph API respondió 429)
+
+        Args:
+            remitente (str): Identificador del número emisor (la URL de envío)
+            segundos (float): Segundos hasta el próximo envío
+        """
+        with self._condicion:
+            self._cubo_numero(remitente).pausar(segundos, time.monotonic())
+            self.pausas += 1
+        logging.warning(f"Planificador de envíos: pausa de {segundos:.1f} s por límite de la Graph API")
+
+    def _elegir(self, ahora):
+        """
+        Busca, por orden de prioridad, el primer envío que puede salir
+
+        Solo mira la cima de cada heap. Un envío masivo frenado por su
+        destinatario se reprograma en su heap para cuando tenga token; si el
+        número de la cima no tiene tokens, esa prioridad espera a que lleguen.
+
+        Returns:
+            tuple: (prioridad del envío o None, segundos hasta volver a mirar o None)
+        """
+        espera = None
+        for prioridad, cola in self._colas.items():
+            faltan = self._espera_cima(prioridad, cola, ahora)
+            if faltan == 0:
+                return prioridad, None
+            if faltan is not None:
+                espera = faltan if espera is None else min(espera, faltan)
+        return None, espera
+
+    def _espera_cima(self, prioridad, cola, ahora):
+        """Segundos hasta que la cima del heap pueda salir (0 si ya puede, None si está vacío)"""
+        while cola:
+            listo, secuencia, remitente, destinatario, despertar, llegada, _ = cola[0]
+            if listo > ahora:
+                return listo - ahora
+            faltan = self._cubo_numero(remitente).espera(ahora)
+            if faltan > 0:
+                return faltan
+            if self._limita_destinatario(prioridad, destinatario):
+                faltan = self._cubo_destinatario(remitente, destinatario, ahora).espera(ahora)
+                if faltan > 0:
+                    heapq.heapreplace(cola, (ahora + faltan, secuencia, remitente, destinatario,
+                                             despertar, llegada, True))
+                    continue
+            return 0
+        return None
+
+    def _bucle(self):
+        with self._condicion:
+            while True:
+                if not self._en_cola:
+                    self._condicion.wait()
+                    continue
+
+                ahora = time.monotonic()
+                prioridad, espera = self._elegir(ahora)
+                if prioridad is None:
+                    # Vuelve a mirar cuando llegue un token o entre un envío nuevo
+                    self._condicion.wait(espera)
+                    continue
+
+                _, _, remitente, destinatario, despertar, llegada, frenado = heapq.heappop(self._colas[prioridad])
+                self._en_cola -= 1
+                if frenado:
+                    self.frenados_por_destinatario += 1
+                self._conceder(prioridad, remitente, destinatario, ahora, llegada)
+                try:
+                    despertar()
+                except RuntimeError as e:
+                    # El event loop del envío asyncio ya se cerró
+                    logging.warning(f"No se pudo avisar un turno de envío: {str(e)}")
+
+    def _conceder(self, prioridad, remitente, destinatario, ahora, llegada):
+        """Consume los tokens de un envío y lo registra (requiere el lock)"""
+        self._cubo_numero(remitente).consumir(ahora)
+        if self._limita_destinatario(prioridad, destinatario):
+            self._cubo_destinatario(remitente, destinatario, ahora).consumir(ahora)
+        self._esperas[prioridad].registrar(ahora - llegada)
+        self._concedidos[prioridad] += 1
+        self._ultimo_minuto.append(ahora)
+
+    def metricas(self):
+        with self._condicion:
+            ahora = time.monotonic()
+            while self._ultimo_minuto and ahora - self._ultimo_minuto[0] >= 60:
+                self._ultimo_minuto.popleft()
+            en_cola = {NOMBRES_PRIORIDAD[p]: len(cola) for p, cola in self._colas.items()}
+            ventana = min(60.0, ahora - self._inicio)
+            return {
+                "tasa_numero": self.tasa_numero,
+                "tasa_destinatario": round(self.tasa_destinatario, 4),
+                "tasa_lograda_por_segundo": round(len(self._ultimo_minuto) / ventana, 2) if ventana > 0 else 0.0,
+                "en_cola": en_cola,
+                "concedidos": {NOMBRES_PRIORIDAD[p]: n for p, n in self._concedidos.items()},
+                "espera_en_cola": {NOMBRES_PRIORIDAD[p]: v.resumen() for p, v in self._esperas.items()},
+                "frenados_por_destinatario": self.frenados_por_destinatario,
+                "pausas": self.pausas,
+                "destinatarios": len(self._destinatarios)
+            }
+
+
+def crear_planificador_envios():
+    """
+    Crea el planificador de envíos configurado en Enviroments
+
+    Returns:
+        PlanificadorEnvios: Planificador, o None si los envíos no se limitan
+    """
+    if not env.ENVIO_LIMITADO:
+        return None
+    return PlanificadorEnvios(
+        tasa_numero=env.ENVIO_TASA_NUMERO,
+        rafaga_numero=env.ENVIO_RAFAGA_NUMERO,
+        tasa_destinatario=env.ENVIO_TASA_DESTINATARIO,
+        rafaga_destinatario=env.ENVIO_RAFAGA_DESTINATARIO
+    )
+
+
+# Planificador único: los límites son de la cuenta, no de cada sender
+planificador_envios = crear_planificador_envios()
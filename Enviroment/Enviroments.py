@@ -5,3 +5,117 @@ URL_ENVIO = f"https://graph.facebook.com/v22.0/{PHONE_NUMBER}/messages"
 URL_TEXTO_VOZ="http://127.0.0.1:5002/text-to-speech"
 URL_INFO_MEDIA="https://graph.facebook.com/v22.0"
 URL_CLOUDFLARE = "https://bios-hampshire-republic-structural.trycloudflare.com"
+
+# Procesamiento de eventos del webhook
+PROCESAMIENTO_ASINCRONO = True  # Responder 200 de inmediato y procesar en segundo plano
+NUM_WORKERS = 4  # Hilos que ejecutan ChatProcess.ProcessMessage
+TAMANO_COLA = 1000  # Eventos máximos en espera antes de rechazar con 503
+TIMEOUT_ENCOLAR = 0.5  # Segundos de espera para encolar si la cola está llena
+INTERVALO_REPORTE_METRICAS = 60  # Segundos entre cada reporte de métricas en el log (0 = desactivado)
+ORDEN_POR_REMITENTE = True  # Procesar en serie los mensajes de cada número y en paralelo entre números
+NUM_CARRILES = 64  # Carriles en serie entre los que se reparten los remitentes
+
+# Deduplicación de mensajes del webhook
+TTL_MENSAJES_PROCESADOS = 1800  # Segundos que se recuerda cada message_id (30 minutos)
+MAX_MENSAJES_PROCESADOS = 200000  # Límite duro de IDs recordados en memoria
+BACKEND_IDEMPOTENCIA = "sqlite"  # "sqlite" (compartido y persistente) o "memoria"
+RUTA_IDEMPOTENCIA = "idempotencia.db"  # Archivo SQLite compartido entre procesos
+
+# Almacenamiento de empresas
+BACKEND_EMPRESAS = "sqlite"  # "sqlite" (una fila por empresa) o "json" (archivo completo)
+RUTA_EMPRESAS_DB = "empresas.db"
+RUTA_EMPRESAS_JSON = "empresas_data.json"  # Formato original; se migra a SQLite la primera vez
+RUTA_EMBEDDINGS = "embeddings.f32"  # Matriz float32 mapeada en memoria, una fila por empresa
+EMBEDDINGS_DIMENSION = 300  # Floats por vector (es_core_news_md); los más cortos se rellenan
+PERSISTENCIA_DIFERIDA = True  # Guardar las empresas en segundo plano, fuera de la respuesta al usuario
+PERSISTENCIA_INTERVALO = 0.5  # Segundos sin cambios antes de escribir el lote pendiente
+PERSISTENCIA_MAX_ESPERA = 5.0  # Máximo de segundos que un cambio puede quedar sin escribir
+
+# Cliente HTTP compartido (pools keep-alive)
+HTTP_POOL_POR_HOST = {
+    "graph.facebook.com": 20,  # Envío de mensajes e información de medios
+    "lookaside.fbsbx.com": 10,  # Descarga de audios de WhatsApp
+}
+HTTP_POOL_POR_DEFECTO = 10  # Conexiones por host para el resto (STT/TTS locales)
+HTTP_TIMEOUT_CONEXION = 3.05  # Segundos para establecer la conexión
+HTTP_TIMEOUT_LECTURA = 30  # Segundos máximos esperando datos de la respuesta
+HTTP_ASYNC_LIMITE = 500  # Peticiones simultáneas máximas del cliente asyncio
+HTTP_ASYNC_LIMITE_POR_HOST = 200  # Peticiones simultáneas máximas por host del cliente asyncio
+INDICADOR_ESCRITURA_WORKERS = 2  # Hilos que envían el indicador de escritura en segundo plano
+VOZ_WORKERS = 4  # Notas de voz que se sintetizan y suben en paralelo al resto del turno
+
+# Caché de texto a voz
+TTS_CACHE_CARPETA = "cache_tts"  # Nivel en disco de la caché de audios
+TTS_CACHE_MAX_BYTES_MEMORIA = 32 * 1024 * 1024  # 32 MB de audios en memoria
+TTS_CACHE_MAX_BYTES_DISCO = 512 * 1024 * 1024  # 512 MB de audios en disco
+
+# Avisos de voz fijos
+CALENTAR_AVISOS_VOZ = True  # Sintetizarlos al arrancar y servirlos sin llamar al TTS
+
+# Almacén de audios publicados en WebHook/static/audio
+AUDIO_TTL = 24 * 3600  # Segundos que se conserva un audio que WhatsApp no descargó
+AUDIO_TTL_DESCARGADO = 600  # Segundos que se conserva tras la descarga (reintentos)
+AUDIO_MAX_BYTES = 1024 * 1024 * 1024  # Cuota de la carpeta: 1 GB
+AUDIO_INTERVALO_BARRIDO = 300  # Segundos entre barridos
+
+# Servidor dedicado para las descargas de audio de WhatsApp
+SERVIDOR_AUDIO_ACTIVO = True
+SERVIDOR_AUDIO_HOST = "127.0.0.1"
+SERVIDOR_AUDIO_PUERTO = 5003  # 5001 es el webhook y 5002 el servicio de texto a voz
+# Base de las URLs de audio que se envían a WhatsApp. El túnel debe dirigir
+# /static/audio/ a SERVIDOR_AUDIO_PUERTO; si no lo hace, Flask sigue sirviendo
+# esos archivos como antes
+URL_AUDIO_PUBLICA = URL_CLOUDFLARE
+
+# Descarga de audios de WhatsApp reenviada en streaming a la transcripción
+STT_TAMANO_BLOQUE = 64 * 1024  # Bytes en memoria por nota de voz en curso
+
+# Caché persistente de transcripciones
+RUTA_CACHE_STT = "transcripciones.db"
+STT_CACHE_MAX_ELEMENTOS = 50000  # Claves (ID de medio o hash de audio) antes de desalojar
+
+# Transcripción por lotes (requiere un endpoint STT que acepte varios archivos)
+STT_LOTES_ACTIVO = False
+URL_VOZ_TEXTO_LOTE = "http://localhost:5000/api/transcribe/batch"
+STT_LOTE_VENTANA = 0.05  # Segundos máximos que espera el primer audio de un lote
+STT_LOTE_MAX = 8  # Audios máximos por lote
+
+# Plazos y cortacircuitos de los servicios locales de voz
+STT_TIMEOUT_LECTURA = 60  # Segundos esperando la transcripción (los audios largos tardan)
+TTS_TIMEOUT_LECTURA = 30  # Segundos esperando el audio sintetizado
+CORTACIRCUITOS_UMBRAL_FALLOS = 5  # Fallos seguidos que abren el circuito
+CORTACIRCUITOS_TIEMPO_ABIERTO = 30  # Segundos sin llamar al servicio antes de probarlo de nuevo
+
+# Política de respuestas con voz
+POLITICA_VOZ = "adaptativa"  # "adaptativa" (según la carga del TTS) o "fija"
+PROBABILIDAD_VOZ = 0.4  # Fracción de respuestas con voz con el sistema ocioso
+VOZ_PROBABILIDAD_MINIMA = 0.02  # Fracción bajo carga máxima (mantiene muestras de latencia)
+VOZ_LATENCIA_OBJETIVO = 3.0  # Segundos de espera + síntesis a partir de los que se reduce la voz
+VOZ_LATENCIA_MAXIMA = 15.0  # Segundos en los que se llega a la probabilidad mínima
+VOZ_PENDIENTES_MAX = 16  # Notas de voz pendientes en las que se llega a la probabilidad mínima
+VOZ_PRESUPUESTO_MINUTO = 60  # Notas de voz máximas por minuto en todo el bot
+VOZ_MAX_POR_USUARIO_MINUTO = 4  # Notas de voz máximas por minuto a un mismo usuario
+
+# Síntesis por frases de los textos largos
+TTS_FRASES_WORKERS = 4  # Fragmentos de un mismo texto que se sintetizan a la vez
+TTS_FRASES_UMBRAL = 200  # Caracteres a partir de los que un texto se divide en frases
+
+# Bandeja de salida duradera para los envíos a la Graph API
+SALIDA_DURADERA = True  # Guardar cada envío y reintentarlo si la API falla
+RUTA_SALIDA = "salida.db"
+SALIDA_MAX_INTENTOS = 8  # Intentos antes de dar un envío por fallido
+SALIDA_ESPERA_BASE = 1.0  # Segundos de espera tras el primer fallo (se duplica en cada intento)
+SALIDA_ESPERA_MAX = 300  # Tope de la espera entre intentos
+SALIDA_MAX_ANTIGUEDAD = 24 * 3600  # Segundos tras los que un envío sin entregar se descarta
+SALIDA_RETENCION = 24 * 3600  # Segundos que se recuerdan los envíos terminados para deduplicar
+SALIDA_WORKERS = 4  # Reintentos en vuelo a la vez
+
+# Límites de ritmo de los envíos a la Graph API
+ENVIO_LIMITADO = True  # Repartir los envíos con cubos de tokens en lugar de enviarlos en ráfaga
+ENVIO_TASA_NUMERO = 80  # Mensajes por segundo del número de WhatsApp Business
+ENVIO_RAFAGA_NUMERO = 80  # Mensajes seguidos que admite el número sin esperar
+ENVIO_TASA_DESTINATARIO = 1 / 6  # Envíos masivos por segundo a un mismo usuario (uno cada 6 s)
+ENVIO_RAFAGA_DESTINATARIO = 45  # Envíos masivos seguidos que admite un mismo usuario
+
+# Difusión de plantillas a muchos contactos
+DIFUSION_CONCURRENCIA = 16  # Envíos de una difusión en vuelo a la vez (el ritmo lo fija el planificador)
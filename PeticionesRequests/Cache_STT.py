@@ -0,0 +1,176 @@
+import logging
+import sqlite3
+import threading
+import time
+from Enviroment import Enviroments as env
+
+
+def clave_media(media_id):
+    """Clave de caché para un ID de medio de WhatsApp"""
+    return f"media:{media_id}"
+
+
+def clave_hash(sha256):
+    """Clave de caché para el hash del contenido de un audio"""
+    return f"sha256:{sha256}"
+
+
+def es_transcripcion_valida(texto):
+    """Solo se guardan transcripciones con contenido que no sean mensajes de error"""
+    return bool(texto) and not texto.startswith("Error")
+
+
+class CacheTranscripciones:
+    """
+    Caché persistente de transcripciones en SQLite (modo WAL).
+
+    Una misma transcripción se guarda bajo varias claves: el ID del medio en
+    WhatsApp (reentregas del mismo mensaje) y el hash del audio (el mismo audio
+    reenviado con otro ID). Está acotada en número de claves y desaloja las
+    menos usadas.
+    """
+
+    def __init__(self, ruta, max_elementos=50000):
+        """
+        Args:
+            ruta (str): Archivo SQLite (":memory:" para no persistir)
+            max_elementos (int): Claves máximas antes de desalojar las menos usadas
+        """
+        self.ruta = ruta
+        self.max_elementos = max_elementos
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.aciertos = 0
+        self.fallos = 0
+        self.guardadas = 0
+        self.rechazadas = 0
+        self.evicciones = 0
+
+        self._conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS transcripciones ("
+            "clave TEXT PRIMARY KEY, texto TEXT NOT NULL, usado REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transcripciones_usado ON transcripciones (usado)"
+        )
+        self._entradas = self._conexion.execute("SELECT COUNT(*) FROM transcripciones").fetchone()[0]
+        logging.info(f"Caché de transcripciones en SQLite: {ruta} ({self._entradas} claves)")
+
+    def obtener(self, claves):
+        """
+        Busca una transcripción por cualquiera de sus claves
+
+        Args:
+            claves (list): Claves candidatas (clave_media, clave_hash)
+
+        Returns:
+            str: Transcripción en caché, o None si no está
+        """
+        claves = [clave for clave in claves if clave]
+        if not claves:
+            return None
+
+        with self._lock:
+            for clave in claves:
+                fila = self._conexion.execute(
+                    "SELECT texto FROM transcripciones WHERE clave = ?", (clave,)
+                ).fetchone()
+                if fila is not None:
+                    self._conexion.execute(
+                        "UPDATE transcripciones SET usado = ? WHERE clave = ?", (time.time(), clave)
+                    )
+                    self.aciertos += 1
+                    return fila[0]
+            self.fallos += 1
+            return None
+
+    def guardar(self, claves, texto):
+        """
+        Guarda una transcripción bajo todas sus claves; ignora errores y vacías
+
+        Args:
+            claves (list): Claves de la transcripción (clave_media, clave_hash)
+            texto (str): Texto transcrito
+
+        Returns:
+            bool: True si se guardó
+        """
+        claves = [clave for clave in claves if clave]
+        if not claves or not es_transcripcion_valida(texto):
+            with self._lock:
+                self.rechazadas += 1
+            return False
+
+        ahora = time.time()
+        with self._lock:
+            cursor = self._conexion.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                for clave in claves:
+                    existe = cursor.execute(
+                        "SELECT 1 FROM transcripciones WHERE clave = ?", (clave,)
+                    ).fetchone()
+                    cursor.execute(
+                        "INSERT INTO transcripciones (clave, texto, usado) VALUES (?, ?, ?) "
+                        "ON CONFLICT(clave) DO UPDATE SET texto = excluded.texto, usado = excluded.usado",
+                        (clave, texto, ahora)
+                    )
+                    if existe is None:
+                        self._entradas += 1
+
+                exceso = self._entradas - self.max_elementos
+                if exceso > 0:
+                    cursor.execute(
+                        "DELETE FROM transcripciones WHERE clave IN "
+                        "(SELECT clave FROM transcripciones ORDER BY usado LIMIT ?)",
+                        (exceso,)
+                    )
+                    self._entradas -= cursor.rowcount
+                    self.evicciones += cursor.rowcount
+
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            self.guardadas += 1
+        return True
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "ruta": self.ruta,
+                "claves": self._entradas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "guardadas": self.guardadas,
+                "rechazadas": self.rechazadas,
+                "evicciones": self.evicciones
+            }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+def crear_cache_stt():
+    """
+    Crea la caché de transcripciones configurada en Enviroments
+
+    Returns:
+        CacheTranscripciones: Caché en el archivo configurado, o en memoria si no se puede abrir
+    """
+    try:
+        return CacheTranscripciones(env.RUTA_CACHE_STT, max_elementos=env.STT_CACHE_MAX_ELEMENTOS)
+    except sqlite3.Error as e:
+        logging.error(f"No se pudo abrir la caché de transcripciones: {str(e)}. Se usará memoria.")
+        return CacheTranscripciones(":memory:", max_elementos=env.STT_CACHE_MAX_ELEMENTOS)
+
+
+# Caché única compartida por todas las transcripciones del proceso
+cache_stt = crear_cache_stt()
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from Enviroment import Enviroments as env
+
+
+class CacheTTS:
+    """
+    Caché de audios de texto a voz direccionada por contenido.
+
+    La clave es un hash de (texto, idioma, configuración del servicio TTS), de
+    modo que al cambiar de servicio o de voz no se reutilizan audios viejos.
+    Tiene dos niveles con desalojo LRU: uno en memoria, acotado en bytes, y uno
+    en disco, también acotado en bytes, que sobrevive a los reinicios.
+    """
+
+    def __init__(self, carpeta, max_bytes_memoria=32 * 1024 * 1024,
+                 max_bytes_disco=512 * 1024 * 1024, configuracion=""):
+        """
+        Args:
+            carpeta (str): Carpeta del nivel en disco
+            max_bytes_memoria (int): Bytes máximos del nivel en memoria
+            max_bytes_disco (int): Bytes máximos del nivel en disco
+            configuracion (str): Configuración del servicio TTS que forma parte de la clave
+        """
+        self.carpeta = carpeta
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.huella = hashlib.sha256(configuracion.encode("utf-8")).hexdigest()[:16]
+        self._lock = threading.Lock()
+
+        self._memoria = OrderedDict()  # clave -> bytes del audio
+        self._bytes_memoria = 0
+        self._disco = OrderedDict()  # clave -> tamaño del archivo
+        self._bytes_disco = 0
+
+        # Métricas
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.evicciones_memoria = 0
+        self.evicciones_disco = 0
+
+        os.makedirs(carpeta, exist_ok=True)
+        self._cargar_indice_disco()
+
+    def _cargar_indice_disco(self):
+        """Reconstruye el índice LRU del disco, del archivo menos al más usado"""
+        archivos = []
+        for nombre in os.listdir(self.carpeta):
+            if not nombre.endswith(".mp3"):
+                continue
+            try:
+                estado = os.stat(os.path.join(self.carpeta, nombre))
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, nombre[:-4], estado.st_size))
+
+        for _, clave, tamano in sorted(archivos):
+            self._disco[clave] = tamano
+            self._bytes_disco += tamano
+        if archivos:
+            logging.info(f"Caché TTS: {len(archivos)} audios en disco ({self._bytes_disco} bytes)")
+
+    def clave(self, texto, idioma):
+        """
+        Calcula la clave de un audio
+
+        Args:
+            texto (str): Texto sintetizado
+            idioma (str): Código del idioma
+
+        Returns:
+            str: Hash hexadecimal que identifica el audio
+        """
+        contenido = f"{self.huella}\0{idioma}\0{texto}".encode("utf-8")
+        return hashlib.sha256(contenido).hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, f"{clave}.mp3")
+
+    def obtener_memoria(self, texto, idioma):
+        """
+        Busca un audio solo en memoria (nunca toca el disco)
+
+        Args:
+            texto (str): Texto sintetizado
+            idioma (str): Código del idioma
+
+        Returns:
+            bytes: Audio en memoria, o None si no está
+        """
+        clave = self.clave(texto, idioma)
+        with self._lock:
+            audio = self._memoria.get(clave)
+            if audio is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+            return audio
+
+    def obtener(self, texto, idioma):
+        """
+        Busca un audio en memoria y luego en disco
+
+        Args:
+            texto (str): Texto sintetizado
+            idioma (str): Código del idioma
+
+        Returns:
+            bytes: Audio en caché, o None si no está
+        """
+        clave = self.clave(texto, idioma)
+        with self._lock:
+            audio = self._memoria.get(clave)
+            if audio is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return audio
+            en_disco = clave in self._disco
+
+        if en_disco:
+            try:
+                with open(self._ruta(clave), "rb") as f:
+                    audio = f.read()
+                os.utime(self._ruta(clave))
+            except OSError:
+                audio = None
+
+        with self._lock:
+            if audio is None:
+                if en_disco:
+                    self._quitar_disco(clave)
+                self.fallos += 1
+                return None
+
+            if clave in self._disco:
+                self._disco.move_to_end(clave)
+            self.aciertos_disco += 1
+            self._guardar_memoria(clave, audio)
+            return audio
+
+    def guardar(self, texto, idioma, audio):
+        """
+        Guarda un audio en ambos niveles
+
+        Args:
+            texto (str): Texto sintetizado
+            idioma (str): Código del idioma
+            audio (bytes): Audio generado por el servicio TTS
+        """
+        if not audio:
+            return
+        clave = self.clave(texto, idioma)
+        ruta = self._ruta(clave)
+        try:
+            # Escritura atómica para que un lector nunca vea un archivo a medias
+            temporal = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(temporal, "wb") as f:
+                f.write(audio)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logging.error(f"No se pudo guardar el audio en la caché TTS: {str(e)}")
+            ruta = None
+
+        with self._lock:
+            self._guardar_memoria(clave, audio)
+            if ruta is None:
+                return
+            if clave in self._disco:
+                self._bytes_disco -= self._disco.pop(clave)
+            self._disco[clave] = len(audio)
+            self._bytes_disco += len(audio)
+            while self._bytes_disco > self.max_bytes_disco and len(self._disco) > 1:
+                antigua = next(iter(self._disco))
+                self._quitar_disco(antigua)
+                self.evicciones_disco += 1
+
+    def _guardar_memoria(self, clave, audio):
+        """Inserta en memoria y desaloja los menos usados (requiere el lock)"""
+        if len(audio) > self.max_bytes_memoria:
+            return
+        if clave in self._memoria:
+            self._bytes_memoria -= len(self._memoria.pop(clave))
+        self._memoria[clave] = audio
+        self._bytes_memoria += len(audio)
+        while self._bytes_memoria > self.max_bytes_memoria:
+            _, antiguo = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(antiguo)
+            self.evicciones_memoria += 1
+
+    def _quitar_disco(self, clave):
+        """Elimina un audio del disco y del índice (requiere el lock)"""
+        self._bytes_disco -= self._disco.pop(clave, 0)
+        try:
+            os.remove(self._ruta(clave))
+        except OSError:
+            pass
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            aciertos = self.aciertos_memoria + self.aciertos_disco
+            return {
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(aciertos / consultas, 4) if consultas else 0.0,
+                "audios_memoria": len(self._memoria),
+                "bytes_memoria": self._bytes_memoria,
+                "audios_disco": len(self._disco),
+                "bytes_disco": self._bytes_disco,
+                "evicciones_memoria": self.evicciones_memoria,
+                "evicciones_disco": self.evicciones_disco
+            }
+
+
+# Caché única compartida por texto_a_voz y su versión asyncio
+cache_tts = CacheTTS(
+    env.TTS_CACHE_CARPETA,
+    max_bytes_memoria=env.TTS_CACHE_MAX_BYTES_MEMORIA,
+    max_bytes_disco=env.TTS_CACHE_MAX_BYTES_DISCO,
+    configuracion=env.URL_TEXTO_VOZ
+)
@@ -0,0 +1,113 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from Enviroment import Enviroments as env
+
+
+class ClienteHTTP:
+    """
+    Cliente HTTP compartido por todas las peticiones salientes (Graph API,
+    descarga de medios, voz a texto y texto a voz).
+
+    Usa una sola sesión de requests con pools de conexiones keep-alive por
+    host, de modo que las respuestas consecutivas reutilizan la conexión TCP/TLS
+    en lugar de negociar una nueva en cada llamada.
+    """
+
+    def __init__(self, pools_por_host=None, pool_por_defecto=10,
+                 timeout_conexion=3.05, timeout_lectura=30):
+        """
+        Inicializa el cliente
+
+        Args:
+            pools_por_host (dict, optional): Host -> conexiones máximas en su pool
+            pool_por_defecto (int): Conexiones máximas para cualquier otro host
+            timeout_conexion (float): Segundos máximos para establecer la conexión
+            timeout_lectura (float): Segundos máximos de espera entre bytes de respuesta
+        """
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self._sesion = requests.Session()
+        self._adaptadores = {}
+        self._lock = threading.Lock()
+
+        # Adaptador para cualquier host sin configuración propia
+        self._montar("http://", pool_por_defecto, num_pools=10)
+        self._montar("https://", pool_por_defecto, num_pools=10)
+
+        # Un pool dimensionado para cada host conocido
+        for host, tamano in (pools_por_host or {}).items():
+            self._montar(f"https://{host}/", tamano)
+            self._montar(f"http://{host}/", tamano)
+
+    def _montar(self, prefijo, tamano, num_pools=1):
+        """Registra un adaptador con su propio pool para un prefijo de URL"""
+        adaptador = HTTPAdapter(pool_connections=num_pools, pool_maxsize=tamano)
+        self._sesion.mount(prefijo, adaptador)
+        self._adaptadores[prefijo] = adaptador
+
+    def request(self, metodo, url, **kwargs):
+        """
+        Realiza una petición usando el pool compartido
+
+        Args:
+            metodo (str): Método HTTP
+            url (str): URL de destino
+            **kwargs: Argumentos de requests; si no se indica timeout se usa
+                el (conexión, lectura) configurado
+
+        Returns:
+            requests.Response: Respuesta del servidor
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self._sesion.request(metodo, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Por host, peticiones, conexiones nuevas, reutilización y
+                conexiones abiertas esperando en el pool
+        """
+        hosts = {}
+        with self._lock:
+            for adaptador in self._adaptadores.values():
+                pools = adaptador.poolmanager.pools
+                for clave in list(pools.keys()):
+                    pool = pools.get(clave)
+                    if pool is None:
+                        continue
+                    nombre = f"{clave.key_scheme}://{clave.key_host}:{clave.key_port}"
+                    peticiones = pool.num_requests
+                    nuevas = pool.num_connections
+                    reutilizadas = max(peticiones - nuevas, 0)
+                    hosts[nombre] = {
+                        "peticiones": peticiones,
+                        "conexiones_nuevas": nuevas,
+                        "conexiones_reutilizadas": reutilizadas,
+                        "tasa_reutilizacion": round(reutilizadas / peticiones, 4) if peticiones else 0.0,
+                        # El pool guarda None en los huecos sin conexión abierta
+                        "conexiones_abiertas_libres": sum(1 for c in list(pool.pool.queue) if c) if pool.pool else 0,
+                        "tamano_pool": pool.pool.maxsize if pool.pool else 0
+                    }
+
+        peticiones = sum(h["peticiones"] for h in hosts.values())
+        reutilizadas = sum(h["conexiones_reutilizadas"] for h in hosts.values())
+        return {
+            "peticiones": peticiones,
+            "tasa_reutilizacion": round(reutilizadas / peticiones, 4) if peticiones else 0.0,
+            "hosts": hosts
+        }
+
+
+# Cliente único compartido por todos los módulos
+cliente_http = ClienteHTTP(
+    pools_por_host=env.HTTP_POOL_POR_HOST,
+    pool_por_defecto=env.HTTP_POOL_POR_DEFECTO,
+    timeout_conexion=env.HTTP_TIMEOUT_CONEXION,
+    timeout_lectura=env.HTTP_TIMEOUT_LECTURA
+)
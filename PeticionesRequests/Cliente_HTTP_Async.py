@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import weakref
+from Enviroment import Enviroments as env
+
+# aiohttp es opcional: solo se necesita para los clientes asyncio
+try:
+    import aiohttp
+except ImportError:
+    logging.warning("aiohttp no está disponible. Los clientes asyncio no podrán usarse.")
+    aiohttp = None
+
+
+class ClienteHTTPAsync:
+    """
+    Cliente HTTP asyncio compartido, equivalente a ClienteHTTP.
+
+    Mantiene una sesión de aiohttp por event loop con un pool de conexiones
+    keep-alive, de modo que un solo hilo puede tener cientos de peticiones en
+    vuelo hacia la Graph API sin abrir una conexión nueva por cada una.
+    """
+
+    def __init__(self, limite=500, limite_por_host=200, timeout_conexion=3.05, timeout_lectura=30):
+        """
+        Args:
+            limite (int): Conexiones simultáneas máximas en total
+            limite_por_host (int): Conexiones simultáneas máximas por host
+            timeout_conexion (float): Segundos máximos para establecer la conexión
+            timeout_lectura (float): Segundos máximos de espera entre bytes de respuesta
+        """
+        self.limite = limite
+        self.limite_por_host = limite_por_host
+        self.timeout_conexion = timeout_conexion
+        self.timeout_lectura = timeout_lectura
+        self._sesiones = weakref.WeakKeyDictionary()
+
+        # Métricas
+        self.peticiones = 0
+        self.conexiones_nuevas = 0
+        self.conexiones_reutilizadas = 0
+
+    def timeout(self, lectura=None):
+        """
+        Construye el timeout de aiohttp para una petición
+
+        Args:
+            lectura (float, optional): Timeout de lectura distinto al configurado
+
+        Returns:
+            aiohttp.ClientTimeout: Timeout de conexión y lectura
+        """
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.timeout_conexion,
+            sock_read=lectura if lectura is not None else self.timeout_lectura
+        )
+
+    def sesion(self):
+        """
+        Devuelve la sesión del event loop actual, creándola si no existe
+
+        Returns:
+            aiohttp.ClientSession: Sesión con el pool de conexiones
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp no está instalado; instálalo para usar los clientes asyncio")
+
+        loop = asyncio.get_running_loop()
+        sesion = self._sesiones.get(loop)
+        if sesion is None or sesion.closed:
+            trazas = aiohttp.TraceConfig()
+            trazas.on_request_start.append(self._al_iniciar_peticion)
+            trazas.on_connection_create_end.append(self._al_crear_conexion)
+            trazas.on_connection_reuseconn.append(self._al_reutilizar_conexion)
+
+            sesion = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limite, limit_per_host=self.limite_por_host),
+                timeout=self.timeout(),
+                trace_configs=[trazas]
+            )
+            self._sesiones[loop] = sesion
+        return sesion
+
+    async def cerrar(self):
+        """Cierra la sesión del event loop actual"""
+        sesion = self._sesiones.pop(asyncio.get_running_loop(), None)
+        if sesion is not None and not sesion.closed:
+            await sesion.close()
+
+    async def _al_iniciar_peticion(self, sesion, contexto, parametros):
+        self.peticiones += 1
+
+    async def _al_crear_conexion(self, sesion, contexto, parametros):
+        self.conexiones_nuevas += 1
+
+    async def _al_reutilizar_conexion(self, sesion, contexto, parametros):
+        self.conexiones_reutilizadas += 1
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Peticiones, conexiones nuevas y tasa de reutilización
+        """
+        total = self.conexiones_nuevas + self.conexiones_reutilizadas
+        return {
+            "peticiones": self.peticiones,
+            "conexiones_nuevas": self.conexiones_nuevas,
+            "conexiones_reutilizadas": self.conexiones_reutilizadas,
+            "tasa_reutilizacion": round(self.conexiones_reutilizadas / total, 4) if total else 0.0
+        }
+
+
+# Cliente asyncio único compartido por todos los módulos
+cliente_http_async = ClienteHTTPAsync(
+    limite=env.HTTP_ASYNC_LIMITE,
+    limite_por_host=env.HTTP_ASYNC_LIMITE_POR_HOST,
+    timeout_conexion=env.HTTP_TIMEOUT_CONEXION,
+    timeout_lectura=env.HTTP_TIMEOUT_LECTURA
+)
@@ -1,14 +1,89 @@
 import json
-import requests
 import logging
 from Enviroment import Enviroments as env
+from PeticionesRequests.Cliente_HTTP import cliente_http
+
+def extraer_audio_id(webhook_data):
+    """
+    Obtiene el ID del audio a partir del webhook o del mensaje de audio
+    
+    Args:
+        webhook_data: Datos relevantes del webhook de WhatsApp o el mensaje de audio
+        
+    Returns:
+        str: ID del medio en WhatsApp
+    """
+    try:
+        if isinstance(webhook_data, dict) and "audio" in webhook_data:
+            # Se recibió directamente el mensaje de audio
+            return webhook_data["audio"]["id"]
+        elif isinstance(webhook_data, dict) and "changes" in webhook_data:
+            return webhook_data["changes"][0]["value"]["messages"][0]["audio"]["id"]
+        else:
+            return webhook_data["entry"][0]["changes"][0]["value"]["messages"][0]["audio"]["id"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"No se pudo extraer el ID del audio: {str(e)}")
+
+def obtener_info_audio(webhook_data):
+    """
+    Consulta la información del medio de un audio de WhatsApp
+    
+    Args:
+        webhook_data: Datos relevantes del webhook de WhatsApp o el mensaje de audio
+        
+    Returns:
+        dict: Información del medio (url temporal, mime_type, sha256, file_size)
+    """
+    audio_id = extraer_audio_id(webhook_data)
+    info_response = cliente_http.get(
+        url=f"{env.URL_INFO_MEDIA}/{audio_id}",
+        headers={"Authorization": f"Bearer {env.ACCESS_TOKEN_WHATSAPP}"}
+    )
+    
+    if info_response.status_code != 200:
+        raise RuntimeError(f"Error al obtener URL del audio: {info_response.status_code}")
+    
+    info = info_response.json()
+    if not info.get("url"):
+        raise ValueError("No se pudo obtener la URL del medio")
+    return info
+
+def abrir_audio_whatsapp(info, tamano_bloque=64 * 1024):
+    """
+    Abre la descarga de un audio de WhatsApp sin leerla entera
+    
+    Args:
+        info (dict): Información del medio devuelta por obtener_info_audio
+        tamano_bloque (int): Bytes de cada bloque
+        
+    Returns:
+        generator: Bloques de bytes a medida que llegan; la conexión vuelve
+            al pool al terminar de recorrerlo o al cerrarlo
+    """
+    audio_response = cliente_http.get(
+        info["url"],
+        headers={"Authorization": f"Bearer {env.ACCESS_TOKEN_WHATSAPP}"},
+        stream=True
+    )
+    
+    if audio_response.status_code != 200:
+        audio_response.close()
+        raise RuntimeError(f"Error al descargar el audio: {audio_response.status_code}")
+    
+    def bloques():
+        with audio_response:
+            for bloque in audio_response.iter_content(chunk_size=tamano_bloque):
+                if bloque:
+                    yield bloque
+    
+    return bloques()
 
 def obtener_audio_whatsapp(webhook_data):
     """
     Descarga un archivo de audio del webhook de WhatsApp
     
     Args:
-        webhook_data: Datos relevantes del webhook de WhatsApp
+        webhook_data: Datos relevantes del webhook de WhatsApp o el mensaje de audio
         
     Returns:
         bytes: Contenido binario del archivo de audio
@@ -18,21 +93,14 @@ def obtener_audio_whatsapp(webhook_data):
     
     try:
         # Extraer el ID del audio - acceso directo
-        audio_id = None
-        try:
-            if isinstance(webhook_data, dict) and "changes" in webhook_data:
-                audio_id = webhook_data["changes"][0]["value"]["messages"][0]["audio"]["id"]
-            else:
-                audio_id = webhook_data["entry"][0]["changes"][0]["value"]["messages"][0]["audio"]["id"]
-            print(f"ID de audio identificado: {audio_id}")
-        except (KeyError, IndexError, TypeError) as e:
-            raise ValueError(f"No se pudo extraer el ID del audio: {str(e)}")
+        audio_id = extraer_audio_id(webhook_data)
+        print(f"ID de audio identificado: {audio_id}")
         
         # Paso 1: Obtener la URL temporal del archivo
         url = f"{env.URL_INFO_MEDIA}/{audio_id}"
         print(f"Solicitando información del medio: {url}")
         
-        info_response = requests.get(
+        info_response = cliente_http.get(
             url=url,
             headers={"Authorization": f"Bearer {access_token}"}
         )
@@ -50,7 +118,7 @@ def obtener_audio_whatsapp(webhook_data):
         # Paso 2: Descargar el archivo desde esa URL
         print("Descargando contenido del audio...")
         
-        audio_response = requests.get(
+        audio_response = cliente_http.get(
             media_url,
             headers={"Authorization": f"Bearer {access_token}"}
         )
@@ -0,0 +1,191 @@
+import logging
+import requests
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from Procesamiento.Metricas import VentanaLatencias
+
+
+class AgrupadorTranscripciones:
+    """
+    Agrupa en lotes las transcripciones que llegan casi a la vez.
+
+    Cada llamada deja su audio en espera y se bloquea hasta tener su resultado.
+    Un hilo reúne los audios que llegan dentro de una ventana corta (o hasta
+    completar max_lote) y los envía en una sola petición multiarchivo al
+    endpoint por lotes. Si el lote falla, cada audio se transcribe por separado
+    con la función individual, de modo que el resultado nunca se pierde.
+
+    El endpoint por lotes recibe los archivos en el campo "audio_files" y
+    responde {"transcriptions": [...]} en el mismo orden.
+    """
+
+    def __init__(self, url_lote, transcribir_individual, ventana=0.05, max_lote=8,
+                 lotes_en_vuelo=4, timeout=None, cortacircuitos=None):
+        """
+        Args:
+            url_lote (str): Endpoint de transcripción por lotes
+            transcribir_individual (callable): Función bytes -> texto para un solo audio
+            ventana (float): Segundos máximos que espera el primer audio de un lote
+            max_lote (int): Audios máximos por lote
+            lotes_en_vuelo (int): Lotes que se envían en paralelo
+            timeout: Timeout de las peticiones por lotes (por defecto el del cliente HTTP)
+            cortacircuitos (Cortacircuitos, optional): Cortacircuitos del servicio STT
+        """
+        self.url_lote = url_lote
+        self.transcribir_individual = transcribir_individual
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self.timeout = timeout
+        self.cortacircuitos = cortacircuitos
+        self._pendientes = []  # (audio, content_type, futuro, llegada)
+        self._condicion = threading.Condition()
+        self._cerrado = False
+        self._pool = ThreadPoolExecutor(max_workers=lotes_en_vuelo, thread_name_prefix="stt-lote")
+
+        # Métricas
+        self._espera = VentanaLatencias()
+        self.lotes = 0
+        self.audios = 0
+        self.individuales = 0
+        self.lotes_fallidos = 0
+
+        self._hilo = threading.Thread(target=self._bucle, name="stt-agrupador", daemon=True)
+        self._hilo.start()
+
+    def transcribir(self, audio_bytes, content_type="audio/ogg"):
+        """
+        Transcribe un audio como parte del próximo lote
+
+        Args:
+            audio_bytes (bytes): Contenido del audio
+            content_type (str): Tipo MIME del audio
+
+        Returns:
+            str: Texto transcrito, o un texto que empieza por "Error" si falla
+        """
+        futuro = Future()
+        with self._condicion:
+            if self._cerrado:
+                futuro = None
+            else:
+                self._pendientes.append((audio_bytes, content_type, futuro, time.monotonic()))
+                self._condicion.notify()
+
+        if futuro is None:
+            return self.transcribir_individual(audio_bytes)
+        return futuro.result()
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while not self._pendientes and not self._cerrado:
+                    self._condicion.wait()
+                if not self._pendientes:
+                    return
+
+                # Esperar a que se llene el lote o venza la ventana del primer audio
+                limite = self._pendientes[0][3] + self.ventana
+                while len(self._pendientes) < self.max_lote and not self._cerrado:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicion.wait(restante)
+
+                lote = self._pendientes[:self.max_lote]
+                del self._pendientes[:self.max_lote]
+
+            ahora = time.monotonic()
+            for _, _, _, llegada in lote:
+                self._espera.registrar(ahora - llegada)
+            self._pool.submit(self._enviar_lote, lote)
+
+    def _enviar_lote(self, lote):
+        with self._condicion:
+            self.lotes += 1
+            self.audios += len(lote)
+
+        if len(lote) == 1:
+            self._individual(lote[0])
+            return
+
+        if self.cortacircuitos is not None and not self.cortacircuitos.permitir():
+            # STT caído: cada audio obtiene el error de inmediato desde la función individual
+            for elemento in lote:
+                self._individual(elemento)
+            return
+
+        try:
+            archivos = [
+                ("audio_files", (f"audio_{i}.ogg", audio, content_type))
+                for i, (audio, content_type, _, _) in enumerate(lote)
+            ]
+            opciones = {"timeout": self.timeout} if self.timeout is not None else {}
+            try:
+                response = cliente_http.post(self.url_lote, files=archivos, **opciones)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if self.cortacircuitos is not None:
+                    self.cortacircuitos.registrar_fallo()
+                raise
+            except Exception:
+                # Error local al armar la petición: no es una caída del STT
+                if self.cortacircuitos is not None:
+                    self.cortacircuitos.descartar()
+                raise
+            if self.cortacircuitos is not None:
+                if response.status_code >= 500:
+                    self.cortacircuitos.registrar_fallo()
+                else:
+                    self.cortacircuitos.registrar_exito()
+            if response.status_code != 200:
+                raise RuntimeError(f"Error {response.status_code} en la transcripción por lotes")
+
+            transcripciones = response.json().get("transcriptions")
+            if not isinstance(transcripciones, list) or len(transcripciones) != len(lote):
+                raise ValueError("La respuesta por lotes no trae una transcripción por audio")
+
+            for (_, _, futuro, _), texto in zip(lote, transcripciones):
+                futuro.set_result(texto if isinstance(texto, str) else "Error en la transcripción")
+
+        except Exception as e:
+            logging.warning(f"Fallo la transcripción por lotes ({len(lote)} audios), "
+                            f"se transcriben por separado: {str(e)}")
+            with self._condicion:
+                self.lotes_fallidos += 1
+            for elemento in lote:
+                try:
+                    self._pool.submit(self._individual, elemento)
+                except RuntimeError:
+                    # El pool ya se está cerrando: se transcribe aquí mismo
+                    self._individual(elemento)
+
+    def _individual(self, elemento):
+        audio, _, futuro, _ = elemento
+        with self._condicion:
+            self.individuales += 1
+        try:
+            futuro.set_result(self.transcribir_individual(audio))
+        except Exception as e:
+            logging.error(f"Error al transcribir audio: {str(e)}")
+            futuro.set_result("Error en la transcripción")
+
+    def cerrar(self):
+        """Envía lo que quede en espera y deja de aceptar audios"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify()
+        self._hilo.join(timeout=5)
+        self._pool.shutdown(wait=True)
+
+    def metricas(self):
+        with self._condicion:
+            return {
+                "lotes": self.lotes,
+                "audios": self.audios,
+                "tamano_medio_lote": round(self.audios / self.lotes, 2) if self.lotes else 0.0,
+                "individuales": self.individuales,
+                "lotes_fallidos": self.lotes_fallidos,
+                "en_espera": len(self._pendientes),
+                "espera_lote": self._espera.resumen()
+            }
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+from Enviroment import Enviroments as env
+from PeticionesRequests.Cliente_HTTP_Async import cliente_http_async, aiohttp
+from PeticionesRequests.Download_Audio_Wha import extraer_audio_id
+from PeticionesRequests.Cache_TTS import cache_tts
+from PeticionesRequests.Text_To_Speech import cortacircuitos_tts
+from PeticionesRequests.Pich_To_Text import cortacircuitos_stt
+
+# Versiones asyncio de obtener_audio_whatsapp, transcribir_audio y texto_a_voz.
+# Devuelven lo mismo que las funciones síncronas, incluidos los mensajes de error.
+
+
+async def obtener_audio_whatsapp_async(webhook_data):
+    """
+    Descarga un archivo de audio del webhook de WhatsApp
+
+    Args:
+        webhook_data: Datos relevantes del webhook de WhatsApp o el mensaje de audio
+
+    Returns:
+        bytes: Contenido binario del archivo de audio
+    """
+    headers = {"Authorization": f"Bearer {env.ACCESS_TOKEN_WHATSAPP}"}
+
+    try:
+        audio_id = extraer_audio_id(webhook_data)
+        sesion = cliente_http_async.sesion()
+
+        # Paso 1: Obtener la URL temporal del archivo
+        async with sesion.get(f"{env.URL_INFO_MEDIA}/{audio_id}", headers=headers) as info_response:
+            if info_response.status != 200:
+                raise RuntimeError(f"Error al obtener URL del audio: {info_response.status}")
+            media_url = (await info_response.json()).get("url")
+
+        if not media_url:
+            raise ValueError("No se pudo obtener la URL del medio")
+
+        # Paso 2: Descargar el archivo desde esa URL
+        async with sesion.get(media_url, headers=headers) as audio_response:
+            if audio_response.status != 200:
+                raise RuntimeError(f"Error al descargar el audio: {audio_response.status}")
+            return await audio_response.read()
+
+    except Exception as e:
+        logging.error(f"Error al obtener audio de WhatsApp: {str(e)}")
+        raise
+
+
+async def transcribir_audio_async(audio_bytes):
+    """
+    Envía un audio a la API de transcripción
+
+    Args:
+        audio_bytes: Contenido binario del archivo de audio
+
+    Returns:
+        str: Texto transcrito, o un texto que empieza por "Error" si falla
+    """
+    if not cortacircuitos_stt.permitir():
+        return "Error: servicio de transcripción no disponible"
+
+    try:
+        form = aiohttp.FormData()
+        form.add_field("audio_file", audio_bytes, filename="audio.ogg", content_type="audio/ogg")
+
+        sesion = cliente_http_async.sesion()
+        async with sesion.post(
+            env.URL_VOZ_TEXTO,
+            data=form,
+            timeout=cliente_http_async.timeout(env.STT_TIMEOUT_LECTURA)
+        ) as response:
+            if response.status >= 500:
+                cortacircuitos_stt.registrar_fallo()
+            else:
+                cortacircuitos_stt.registrar_exito()
+
+            if response.status == 200:
+                result = await response.json()
+                return result.get("transcription", "")
+
+            logging.error(f"Error {response.status} al transcribir: {await response.text()}")
+            return f"Error en la transcripción: {response.status}"
+
+    except TimeoutError:
+        cortacircuitos_stt.registrar_fallo()
+        logging.error("Timeout al transcribir el audio")
+        return "Error: Timeout al transcribir el audio"
+    except Exception as e:
+        cortacircuitos_stt.registrar_fallo()
+        logging.error(f"Error al transcribir audio: {str(e)}")
+        return "Error en la transcripción"
+
+
+async def texto_a_voz_async(texto, idioma='es', usar_cache=True):
+    """
+    Convierte texto a voz mediante una API externa
+
+    Args:
+        texto (str): Texto a convertir en voz
+        idioma (str): Código del idioma (por defecto 'es' para español)
+        usar_cache (bool): Reutilizar el audio si el mismo texto ya se sintetizó
+
+    Returns:
+        bytes: Contenido binario del audio generado, o None si hay error
+    """
+    if usar_cache:
+        # La memoria se consulta en el bucle; el disco, en un hilo para no bloquearlo
+        audio = cache_tts.obtener_memoria(texto, idioma)
+        if audio is None:
+            audio = await asyncio.to_thread(cache_tts.obtener, texto, idioma)
+        if audio is not None:
+            return audio
+
+    if not cortacircuitos_tts.permitir():
+        return None
+
+    payload = {
+        "text": texto,
+        "language": idioma
+    }
+
+    try:
+        sesion = cliente_http_async.sesion()
+        async with sesion.post(
+            env.URL_TEXTO_VOZ,
+            data=json.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=cliente_http_async.timeout(env.TTS_TIMEOUT_LECTURA)
+        ) as response:
+            if response.status >= 500:
+                cortacircuitos_tts.registrar_fallo()
+            else:
+                cortacircuitos_tts.registrar_exito()
+
+            if response.status == 200:
+                audio = await response.read()
+                if usar_cache:
+                    await asyncio.to_thread(cache_tts.guardar, texto, idioma, audio)
+                return audio
+
+    except (aiohttp.ClientError, TimeoutError) as e:
+        cortacircuitos_tts.registrar_fallo()
+        logging.error(f"Error al conectar con el servicio de texto a voz: {str(e)}")
+
+    return None
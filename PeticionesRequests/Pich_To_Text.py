@@ -1,17 +1,70 @@
 import requests
+import uuid
+import hashlib
 from Enviroment import Enviroments as env
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from PeticionesRequests.Download_Audio_Wha import extraer_audio_id, obtener_info_audio, abrir_audio_whatsapp
+from PeticionesRequests.Cache_STT import cache_stt, clave_media, clave_hash
+from PeticionesRequests.Lotes_STT import AgrupadorTranscripciones
+from Procesamiento.Cortacircuitos import Cortacircuitos
 import logging
 
-def transcribir_audio(audio_bytes):
+# Si el servicio STT cae, se deja de llamarlo y se pide al usuario que escriba
+cortacircuitos_stt = Cortacircuitos(
+    "stt",
+    umbral_fallos=env.CORTACIRCUITOS_UMBRAL_FALLOS,
+    tiempo_abierto=env.CORTACIRCUITOS_TIEMPO_ABIERTO
+)
+
+# Respuesta inmediata cuando el circuito del STT está abierto
+ERROR_STT_NO_DISPONIBLE = "Error: servicio de transcripción no disponible"
+
+# Respuesta cuando falla la descarga del audio (no es culpa del STT)
+ERROR_DESCARGA_AUDIO = "Error: no se pudo descargar el audio"
+
+class ErrorDescargaAudio(Exception):
+    """Fallo al leer el audio de origen mientras se subía al STT"""
+
+def transcribir_audio(audio_bytes, usar_cache=True):
     """
     Envía un audio a la API de transcripción
     
     Args:
         audio_bytes: Contenido binario del archivo de audio
+        usar_cache (bool): Reutilizar la transcripción si el mismo audio ya se transcribió
         
     Returns:
         str: Texto transcrito
     """
+    if not usar_cache:
+        return _transcribir(audio_bytes)
+    
+    claves = [clave_hash(hashlib.sha256(audio_bytes).hexdigest())]
+    transcripcion = cache_stt.obtener(claves)
+    if transcripcion is None:
+        transcripcion = _transcribir(audio_bytes)
+        cache_stt.guardar(claves, transcripcion)
+    return transcripcion
+
+def _transcribir(audio_bytes, content_type="audio/ogg"):
+    """Transcribe un audio en el próximo lote si está activo, o en su propia petición"""
+    if cortacircuitos_stt.abierto():
+        return ERROR_STT_NO_DISPONIBLE
+    if agrupador_stt is not None:
+        return agrupador_stt.transcribir(audio_bytes, content_type)
+    return _transcribir_bytes(audio_bytes)
+
+def _registrar_respuesta_stt(response):
+    """Informa al cortacircuitos del STT: los 5xx cuentan como caída del servicio"""
+    if response.status_code >= 500:
+        cortacircuitos_stt.registrar_fallo()
+    else:
+        cortacircuitos_stt.registrar_exito()
+
+def _transcribir_bytes(audio_bytes):
+    if not cortacircuitos_stt.permitir():
+        return ERROR_STT_NO_DISPONIBLE
+    
     url = env.URL_VOZ_TEXTO
     print(f"Enviando audio para transcripción a {url}")
     
@@ -20,7 +73,8 @@ def transcribir_audio(audio_bytes):
             "audio_file": ("audio.ogg", audio_bytes, "audio/ogg")
         }
         
-        response = requests.post(url, files=files, timeout=10000) # Agregado timeout para evitar esperas infinitas
+        response = cliente_http.post(url, files=files, timeout=(env.HTTP_TIMEOUT_CONEXION, env.STT_TIMEOUT_LECTURA))
+        _registrar_respuesta_stt(response)
         
         if response.status_code == 200:
             result = response.json()
@@ -33,9 +87,190 @@ def transcribir_audio(audio_bytes):
             return f"Error en la transcripción: {response.status_code}"
             
     except requests.exceptions.Timeout:
+        cortacircuitos_stt.registrar_fallo()
         logging.error("Timeout al transcribir el audio")
         return "Error: Timeout al transcribir el audio"
+    except requests.exceptions.ConnectionError as e:
+        cortacircuitos_stt.registrar_fallo()
+        logging.error(f"Error de conexión con el servicio de transcripción: {str(e)}")
+        return "Error en la transcripción"
     except Exception as e:
+        # Un error local (p. ej. una respuesta que no es JSON) no es una caída del STT
+        cortacircuitos_stt.descartar()
         error_msg = f"Error al transcribir audio: {str(e)}"
         logging.error(error_msg)
-        return "Error en la transcripción"
\ No newline at end of file
+        return "Error en la transcripción"
+
+def cuerpo_multipart(bloques, boundary, campo="audio_file", filename="audio.ogg", content_type="audio/ogg"):
+    """
+    Genera un cuerpo multipart/form-data con un único archivo, bloque a bloque
+    
+    Args:
+        bloques: Iterable de bytes con el contenido del archivo
+        boundary (str): Separador del multipart
+        campo (str): Nombre del campo del formulario
+        filename (str): Nombre del archivo
+        content_type (str): Tipo MIME del archivo
+        
+    Returns:
+        generator: Bytes del cuerpo, listo para enviarse con codificación chunked
+    """
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{campo}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8")
+    yield from bloques
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+def transcribir_audio_streaming(bloques, content_type="audio/ogg"):
+    """
+    Envía un audio a la API de transcripción a medida que se lee
+    
+    Args:
+        bloques: Iterable de bytes con el contenido del audio
+        content_type (str): Tipo MIME del audio
+        
+    Returns:
+        str: Texto transcrito, o un texto que empieza por "Error" si falla. Si
+            lo que falla es la lectura de los bloques (la descarga de WhatsApp)
+            se devuelve ERROR_DESCARGA_AUDIO y no cuenta para el cortacircuitos
+    """
+    if not cortacircuitos_stt.permitir():
+        return ERROR_STT_NO_DISPONIBLE
+    
+    # requests envuelve los errores del cuerpo en los suyos (ConnectionError):
+    # se anotan aquí para distinguirlos de un fallo del STT
+    error_descarga = []
+    
+    def leer_bloques():
+        try:
+            yield from bloques
+        except Exception as e:
+            error_descarga.append(e)
+            raise ErrorDescargaAudio(str(e)) from e
+    
+    boundary = uuid.uuid4().hex
+    try:
+        response = cliente_http.post(
+            env.URL_VOZ_TEXTO,
+            data=cuerpo_multipart(leer_bloques(), boundary, content_type=content_type),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            timeout=(env.HTTP_TIMEOUT_CONEXION, env.STT_TIMEOUT_LECTURA)
+        )
+        _registrar_respuesta_stt(response)
+        
+        if response.status_code == 200:
+            return response.json().get("transcription", "")
+        
+        logging.error(f"Error {response.status_code} al transcribir: {response.text}")
+        return f"Error en la transcripción: {response.status_code}"
+        
+    except requests.exceptions.Timeout:
+        if error_descarga:
+            return _fallo_descarga(error_descarga[0])
+        cortacircuitos_stt.registrar_fallo()
+        logging.error("Timeout al transcribir el audio")
+        return "Error: Timeout al transcribir el audio"
+    except requests.exceptions.ConnectionError as e:
+        if error_descarga:
+            return _fallo_descarga(error_descarga[0])
+        cortacircuitos_stt.registrar_fallo()
+        logging.error(f"Error de conexión con el servicio de transcripción: {str(e)}")
+        return "Error en la transcripción"
+    except Exception as e:
+        if error_descarga:
+            return _fallo_descarga(error_descarga[0])
+        # Un error local (p. ej. una respuesta que no es JSON) no es una caída del STT
+        cortacircuitos_stt.descartar()
+        logging.error(f"Error al transcribir audio: {str(e)}")
+        return "Error en la transcripción"
+
+def _fallo_descarga(error):
+    """Respuesta a un fallo de la descarga: el STT no llegó a probarse"""
+    cortacircuitos_stt.descartar()
+    logging.error(f"Error al descargar el audio mientras se transcribía: {str(error)}")
+    return ERROR_DESCARGA_AUDIO
+
+def transcribir_audio_whatsapp(webhook_data):
+    """
+    Descarga un audio de WhatsApp y lo transcribe en un solo flujo: cada
+    bloque descargado se reenvía al servicio de transcripción en cuanto llega,
+    así la transcripción empieza antes de terminar la descarga y la memoria
+    usada se limita a un bloque
+    
+    Args:
+        webhook_data: Datos relevantes del webhook de WhatsApp o el mensaje de audio
+        
+    Returns:
+        str: Texto transcrito, o un texto que empieza por "Error" si falla
+        
+    Raises:
+        Exception: Si no se puede obtener la información del medio o iniciar la descarga
+    """
+    # Una reentrega del mismo mensaje se resuelve sin tocar la red
+    claves = [clave_media(extraer_audio_id(webhook_data))]
+    transcripcion = cache_stt.obtener(claves)
+    if transcripcion is not None:
+        return transcripcion
+    
+    # Con el STT caído no tiene sentido consultar ni descargar el audio
+    if cortacircuitos_stt.abierto():
+        return ERROR_STT_NO_DISPONIBLE
+    
+    # Un audio reenviado trae otro ID pero el mismo hash, que WhatsApp ya
+    # informa junto a la URL: se resuelve sin descargarlo
+    info = obtener_info_audio(webhook_data)
+    if info.get("sha256"):
+        claves.append(clave_hash(info["sha256"]))
+        transcripcion = cache_stt.obtener(claves[1:])
+        if transcripcion is not None:
+            cache_stt.guardar(claves, transcripcion)
+            return transcripcion
+    
+    bloques = abrir_audio_whatsapp(info, tamano_bloque=env.STT_TAMANO_BLOQUE)
+    # WhatsApp envía las notas de voz como "audio/ogg; codecs=opus"
+    content_type = info.get("mime_type", "audio/ogg").split(";")[0].strip()
+    
+    if agrupador_stt is not None:
+        # Un lote necesita el audio completo: se renuncia al streaming
+        try:
+            audio_bytes = b"".join(bloques)
+        finally:
+            bloques.close()
+        transcripcion = agrupador_stt.transcribir(audio_bytes, content_type)
+        claves.append(clave_hash(hashlib.sha256(audio_bytes).hexdigest()))
+        cache_stt.guardar(list(dict.fromkeys(claves)), transcripcion)
+        return transcripcion
+    
+    hash_audio = hashlib.sha256()
+    leido = []
+    
+    def bloques_con_hash():
+        for bloque in bloques:
+            hash_audio.update(bloque)
+            yield bloque
+        leido.append(True)
+    
+    try:
+        transcripcion = transcribir_audio_streaming(bloques_con_hash(), content_type=content_type)
+    finally:
+        # Devuelve la conexión de descarga al pool aunque la subida falle a medias
+        bloques.close()
+    
+    # El hash propio enlaza también con las transcripciones de transcribir_audio
+    # (solo vale si se llegó a leer el audio completo)
+    if leido:
+        claves.append(clave_hash(hash_audio.hexdigest()))
+    cache_stt.guardar(list(dict.fromkeys(claves)), transcripcion)
+    return transcripcion
+
+# Transcripción por lotes, solo si hay un endpoint que la soporte
+agrupador_stt = AgrupadorTranscripciones(
+    env.URL_VOZ_TEXTO_LOTE,
+    _transcribir_bytes,
+    ventana=env.STT_LOTE_VENTANA,
+    max_lote=env.STT_LOTE_MAX,
+    timeout=(env.HTTP_TIMEOUT_CONEXION, env.STT_TIMEOUT_LECTURA),
+    cortacircuitos=cortacircuitos_stt
+) if env.STT_LOTES_ACTIVO else None
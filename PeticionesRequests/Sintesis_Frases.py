@@ -0,0 +1,201 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PeticionesRequests.Text_To_Speech import texto_a_voz
+from Procesamiento.Metricas import VentanaLatencias
+
+FIN_DE_FRASE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+PAUSA = re.compile(r"(?<=,)\s+")
+
+# Tablas de cabecera de tramas MP3 (Layer III)
+BITRATES_MPEG1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+BITRATES_MPEG2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+FRECUENCIAS = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def dividir_frases(texto, objetivo_caracteres=150, min_caracteres=60, max_caracteres=300):
+    """
+    Divide un texto en fragmentos para sintetizarlos por separado
+
+    Los fragmentos siguen los finales de frase. Las frases consecutivas se
+    unen mientras el fragmento no pase del objetivo (cada llamada al TTS tiene
+    un costo fijo, y fragmentos parejos terminan a la vez) y las frases muy
+    largas se cortan en las comas.
+
+    Args:
+        texto (str): Texto completo
+        objetivo_caracteres (int): Largo al que se intenta llevar cada fragmento
+        min_caracteres (int): Largo por debajo del que un fragmento siempre se une al siguiente
+        max_caracteres (int): Largo a partir del que una frase se corta en las comas
+
+    Returns:
+        list: Fragmentos en orden
+    """
+    frases = []
+    for frase in FIN_DE_FRASE.split(texto.strip()):
+        frase = frase.strip()
+        if not frase:
+            continue
+        if len(frase) <= max_caracteres:
+            frases.append(frase)
+            continue
+        parte = ""
+        for trozo in PAUSA.split(frase):
+            if parte and len(parte) + len(trozo) + 1 > max_caracteres:
+                frases.append(parte)
+                parte = trozo
+            else:
+                parte = f"{parte} {trozo}" if parte else trozo
+        if parte:
+            frases.append(parte)
+
+    fragmentos = []
+    for frase in frases:
+        if fragmentos and (len(fragmentos[-1]) < min_caracteres
+                           or len(fragmentos[-1]) + len(frase) + 1 <= objetivo_caracteres):
+            fragmentos[-1] = f"{fragmentos[-1]} {frase}"
+        else:
+            fragmentos.append(frase)
+    return fragmentos
+
+
+def _largo_trama(cabecera):
+    """
+    Largo en bytes de una trama MP3 Layer III a partir de su cabecera
+
+    Args:
+        cabecera (bytes): Los 4 bytes de la cabecera
+
+    Returns:
+        int: Largo de la trama, o 0 si la cabecera no es válida
+    """
+    if len(cabecera) < 4 or cabecera[0] != 0xFF or (cabecera[1] & 0xE0) != 0xE0:
+        return 0
+    version = (cabecera[1] >> 3) & 0x03
+    capa = (cabecera[1] >> 1) & 0x03
+    indice_bitrate = cabecera[2] >> 4
+    indice_frecuencia = (cabecera[2] >> 2) & 0x03
+    relleno = (cabecera[2] >> 1) & 0x01
+    if version == 1 or capa != 1 or indice_bitrate in (0, 15) or indice_frecuencia == 3:
+        return 0
+
+    frecuencia = FRECUENCIAS[version][indice_frecuencia]
+    if version == 3:
+        return 144000 * BITRATES_MPEG1[indice_bitrate] // frecuencia + relleno
+    return 72000 * BITRATES_MPEG2[indice_bitrate] // frecuencia + relleno
+
+
+def _tramas_de_audio(mp3):
+    """
+    Quita de un MP3 lo que no es audio: la etiqueta ID3v2 inicial, la
+    etiqueta ID3v1 final y la trama Xing/Info, cuyo conteo de tramas dejaría
+    de ser correcto al concatenar
+
+    Args:
+        mp3 (bytes): Archivo MP3 completo
+
+    Returns:
+        bytes: Solo las tramas de audio
+    """
+    inicio = 0
+    if mp3[:3] == b"ID3" and len(mp3) >= 10:
+        tamano = (mp3[6] << 21) | (mp3[7] << 14) | (mp3[8] << 7) | mp3[9]
+        inicio = 10 + tamano + (10 if mp3[5] & 0x10 else 0)
+    fin = len(mp3) - 128 if len(mp3) >= 128 and mp3[-128:-125] == b"TAG" else len(mp3)
+
+    largo = _largo_trama(mp3[inicio:inicio + 4])
+    if largo and (b"Xing" in mp3[inicio:inicio + 64] or b"Info" in mp3[inicio:inicio + 64]):
+        inicio += largo
+    return mp3[inicio:fin]
+
+
+def concatenar_mp3(partes):
+    """
+    Une varios MP3 en uno solo que se reproduce de corrido
+
+    Args:
+        partes (list): Archivos MP3 en orden
+
+    Returns:
+        bytes: MP3 con las tramas de audio de todas las partes
+    """
+    return b"".join(_tramas_de_audio(parte) for parte in partes)
+
+
+class SintetizadorFrases:
+    """
+    Sintetiza los textos largos frase a frase y en paralelo.
+
+    El texto se divide en fragmentos que se envían a la vez al servicio TTS
+    (cada uno pasa por la caché, así que las frases repetidas no se vuelven a
+    sintetizar) y los audios se concatenan en una sola nota de voz. Los textos
+    cortos van directo, en una sola llamada.
+    """
+
+    def __init__(self, sintetizar=texto_a_voz, max_workers=4, umbral_caracteres=200):
+        """
+        Args:
+            sintetizar (callable): Función (texto, idioma) -> bytes MP3 (o None)
+            max_workers (int): Fragmentos que se sintetizan a la vez
+            umbral_caracteres (int): Largo a partir del que se divide el texto
+        """
+        self._sintetizar = sintetizar
+        self.umbral_caracteres = umbral_caracteres
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-frase")
+        self._lock = threading.Lock()
+
+        # Métricas
+        self._tiempo_division = VentanaLatencias()
+        self.directos = 0
+        self.divididos = 0
+        self.fragmentos = 0
+        self.fallidos = 0
+
+    def sintetizar(self, texto, idioma='es'):
+        """
+        Convierte texto a voz, en paralelo por frases si es largo
+
+        Args:
+            texto (str): Texto a convertir en voz
+            idioma (str): Código del idioma
+
+        Returns:
+            bytes: Audio MP3, o None si alguna parte falla
+        """
+        fragmentos = [texto]
+        if len(texto) >= self.umbral_caracteres:
+            # Fragmentos parejos, aproximadamente uno por hilo (con holgura para
+            # que el reparto voraz no deje un fragmento suelto para una segunda ronda)
+            objetivo = max(int(len(texto) / self.max_workers * 1.2), 60)
+            fragmentos = dividir_frases(texto, objetivo_caracteres=objetivo, max_caracteres=objetivo)
+        if len(fragmentos) <= 1:
+            with self._lock:
+                self.directos += 1
+            return self._sintetizar(texto, idioma)
+
+        inicio = time.monotonic()
+        partes = list(self._pool.map(lambda fragmento: self._sintetizar(fragmento, idioma), fragmentos))
+        if not all(partes):
+            logging.error(f"No se pudieron sintetizar {partes.count(None)} de {len(partes)} fragmentos")
+            with self._lock:
+                self.fallidos += 1
+            return None
+
+        self._tiempo_division.registrar(time.monotonic() - inicio)
+        with self._lock:
+            self.divididos += 1
+            self.fragmentos += len(fragmentos)
+        return concatenar_mp3(partes)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "directos": self.directos,
+                "divididos": self.divididos,
+                "fragmentos": self.fragmentos,
+                "fallidos": self.fallidos,
+                "tiempo_divididos": self._tiempo_division.resumen()
+            }
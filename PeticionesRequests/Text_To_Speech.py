@@ -1,18 +1,39 @@
-import requests
 import json
+import logging
+import requests
 from Enviroment import Enviroments as env
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from PeticionesRequests.Cache_TTS import cache_tts
+from Procesamiento.Cortacircuitos import Cortacircuitos
+
+# Si el servicio TTS cae, se deja de llamarlo y el bot responde solo con texto
+cortacircuitos_tts = Cortacircuitos(
+    "tts",
+    umbral_fallos=env.CORTACIRCUITOS_UMBRAL_FALLOS,
+    tiempo_abierto=env.CORTACIRCUITOS_TIEMPO_ABIERTO
+)
 
-def texto_a_voz(texto, idioma='es'):
+def texto_a_voz(texto, idioma='es', usar_cache=True):
     """
     Convierte texto a voz mediante una API externa
     
     Args:
         texto (str): Texto a convertir en voz
         idioma (str): Código del idioma (por defecto 'es' para español)
+        usar_cache (bool): Reutilizar el audio si el mismo texto ya se sintetizó
         
     Returns:
         bytes: Contenido binario del audio generado, o None si hay error
+            o el servicio no está disponible
     """
+    if usar_cache:
+        audio = cache_tts.obtener(texto, idioma)
+        if audio is not None:
+            return audio
+    
+    if not cortacircuitos_tts.permitir():
+        return None
+    
     url = env.URL_TEXTO_VOZ
     
     payload = {
@@ -20,14 +41,26 @@ def texto_a_voz(texto, idioma='es'):
         "language": idioma
     }
     
-    response = requests.post(
-        url,
-        data=json.dumps(payload),
-        headers={"Content-Type": "application/json"},
-        timeout=10000
-    )
+    try:
+        response = cliente_http.post(
+            url,
+            data=json.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=(env.HTTP_TIMEOUT_CONEXION, env.TTS_TIMEOUT_LECTURA)
+        )
+    except requests.exceptions.RequestException as e:
+        cortacircuitos_tts.registrar_fallo()
+        logging.error(f"Error al conectar con el servicio de texto a voz: {str(e)}")
+        return None
+    
+    if response.status_code >= 500:
+        cortacircuitos_tts.registrar_fallo()
+    else:
+        cortacircuitos_tts.registrar_exito()
     
     if response.status_code == 200:
+        if usar_cache:
+            cache_tts.guardar(texto, idioma, response.content)
         return response.content
     
     return None
\ No newline at end of file
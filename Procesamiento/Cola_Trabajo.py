@@ -0,0 +1,362 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from Procesamiento.Metricas import VentanaLatencias
+
+# Marca que indica a un worker que debe terminar
+_FIN = object()
+
+
+class ColaProcesamiento:
+    """
+    Cola acotada en memoria con un pool de workers que procesan los eventos
+    del webhook fuera del hilo de la petición HTTP
+    """
+
+    def __init__(self, procesador, num_workers=4, tamano_maximo=1000, nombre="webhook"):
+        """
+        Inicializa la cola de procesamiento
+
+        Args:
+            procesador (callable): Función que recibe cada elemento encolado
+            num_workers (int): Número de hilos que procesan la cola
+            tamano_maximo (int): Capacidad máxima de la cola
+            nombre (str): Nombre usado en los logs y en los hilos
+        """
+        self.procesador = procesador
+        self.num_workers = max(1, int(num_workers))
+        self.tamano_maximo = tamano_maximo
+        self.nombre = nombre
+
+        self._cola = queue.Queue(maxsize=tamano_maximo)
+        self._hilos = []
+        self._lock = threading.Lock()
+        self._iniciada = False
+
+        # Métricas
+        self._espera = VentanaLatencias()
+        self._duracion = VentanaLatencias()
+        self._encolados = 0
+        self._rechazados = 0
+        self._procesados = 0
+        self._errores = 0
+        self._ocupados = 0
+        self._tiempo_ocupado = 0.0
+        self._inicio = time.monotonic()
+
+    def iniciar(self):
+        """Arranca los hilos del pool (solo la primera vez)"""
+        with self._lock:
+            if self._iniciada:
+                return
+            self._iniciada = True
+            self._inicio = time.monotonic()
+            for i in range(self.num_workers):
+                hilo = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.nombre}-worker-{i}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+        logging.info(f"Cola '{self.nombre}' iniciada con {self.num_workers} workers (capacidad {self.tamano_maximo})")
+
+    def encolar(self, elemento, timeout=0, clave=None):
+        """
+        Agrega un elemento a la cola sin esperar a que se procese
+
+        Args:
+            elemento: Elemento que se pasará al procesador
+            timeout (float): Segundos máximos de espera si la cola está llena
+            clave (str, optional): Ignorada, existe por compatibilidad con PlanificadorCarriles
+
+        Returns:
+            bool: True si se encoló, False si la cola está llena
+        """
+        try:
+            if timeout:
+                self._cola.put((time.monotonic(), elemento), timeout=timeout)
+            else:
+                self._cola.put_nowait((time.monotonic(), elemento))
+        except queue.Full:
+            with self._lock:
+                self._rechazados += 1
+            logging.warning(f"Cola '{self.nombre}' llena ({self.tamano_maximo}). Elemento rechazado.")
+            return False
+
+        with self._lock:
+            self._encolados += 1
+        return True
+
+    def _worker(self):
+        """Bucle de cada worker: toma elementos de la cola y los procesa"""
+        while True:
+            encolado_en, elemento = self._cola.get()
+            try:
+                if elemento is _FIN:
+                    return
+
+                inicio = time.monotonic()
+                self._espera.registrar(inicio - encolado_en)
+                with self._lock:
+                    self._ocupados += 1
+
+                try:
+                    self.procesador(elemento)
+                except Exception as e:
+                    with self._lock:
+                        self._errores += 1
+                    logging.error(f"Error en worker de la cola '{self.nombre}': {str(e)}", exc_info=True)
+                finally:
+                    duracion = time.monotonic() - inicio
+                    self._duracion.registrar(duracion)
+                    with self._lock:
+                        self._ocupados -= 1
+                        self._procesados += 1
+                        self._tiempo_ocupado += duracion
+            finally:
+                self._cola.task_done()
+
+    def detener(self, timeout=10):
+        """
+        Detiene los workers después de procesar lo que ya está en la cola
+
+        Args:
+            timeout (float): Segundos máximos de espera por cada hilo
+        """
+        with self._lock:
+            if not self._iniciada:
+                return
+            self._iniciada = False
+            hilos = list(self._hilos)
+            self._hilos = []
+
+        logging.info(f"Deteniendo cola '{self.nombre}' ({self._cola.qsize()} elementos pendientes)...")
+        for _ in hilos:
+            # Se usa put bloqueante para no perder la marca si la cola está llena
+            self._cola.put((time.monotonic(), _FIN))
+        for hilo in hilos:
+            hilo.join(timeout)
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Profundidad, tiempos de espera y utilización de los workers
+        """
+        with self._lock:
+            transcurrido = max(time.monotonic() - self._inicio, 1e-9)
+            utilizacion = self._tiempo_ocupado / (transcurrido * self.num_workers)
+            return {
+                "profundidad": self._cola.qsize(),
+                "capacidad": self.tamano_maximo,
+                "workers": self.num_workers,
+                "workers_ocupados": self._ocupados,
+                "utilizacion": round(min(utilizacion, 1.0), 4),
+                "encolados": self._encolados,
+                "rechazados": self._rechazados,
+                "procesados": self._procesados,
+                "errores": self._errores,
+                "espera": self._espera.resumen(),
+                "duracion": self._duracion.resumen()
+            }
+
+
+class PlanificadorCarriles:
+    """
+    Reparte los eventos en un número fijo de carriles según una clave (el número
+    del remitente). Cada carril se procesa en serie, así los mensajes de un mismo
+    usuario mantienen su orden, mientras que carriles distintos avanzan en paralelo.
+
+    Los workers no están atados a un carril: toman el siguiente carril con trabajo
+    pendiente y procesan un solo elemento antes de devolverlo a la fila. Un mensaje
+    lento solo retiene a su propio carril y el resto sigue avanzando.
+    """
+
+    def __init__(self, procesador, num_carriles=64, num_workers=4, tamano_maximo=1000, nombre="carriles"):
+        """
+        Inicializa el planificador
+
+        Args:
+            procesador (callable): Función que recibe cada elemento encolado
+            num_carriles (int): Número fijo de carriles en serie
+            num_workers (int): Número de hilos que procesan los carriles
+            tamano_maximo (int): Elementos pendientes máximos entre todos los carriles
+            nombre (str): Nombre usado en los logs y en los hilos
+        """
+        self.procesador = procesador
+        self.num_carriles = max(1, int(num_carriles))
+        self.num_workers = max(1, int(num_workers))
+        self.tamano_maximo = tamano_maximo
+        self.nombre = nombre
+
+        self._carriles = [deque() for _ in range(self.num_carriles)]
+        # Carriles que ya están en la fila de listos o en manos de un worker
+        self._programados = [False] * self.num_carriles
+        self._listos = queue.Queue()
+        self._pendientes = 0
+        self._siguiente_sin_clave = 0
+        self._hilos = []
+        self._lock = threading.Lock()
+        self._hay_espacio = threading.Condition(self._lock)
+        self._iniciada = False
+
+        # Métricas
+        self._espera = VentanaLatencias()
+        self._duracion = VentanaLatencias()
+        self._encolados = 0
+        self._rechazados = 0
+        self._procesados = 0
+        self._errores = 0
+        self._ocupados = 0
+        self._tiempo_ocupado = 0.0
+        self._inicio = time.monotonic()
+
+    def carril_para(self, clave):
+        """
+        Calcula el carril que corresponde a una clave
+
+        Args:
+            clave (str): Clave de ordenamiento (número del remitente)
+
+        Returns:
+            int: Índice del carril
+        """
+        if clave is None:
+            # Sin clave no hay orden que respetar: repartir en turno rotativo
+            self._siguiente_sin_clave = (self._siguiente_sin_clave + 1) % self.num_carriles
+            return self._siguiente_sin_clave
+        return zlib.crc32(str(clave).encode("utf-8")) % self.num_carriles
+
+    def iniciar(self):
+        """Arranca los hilos del pool (solo la primera vez)"""
+        with self._lock:
+            if self._iniciada:
+                return
+            self._iniciada = True
+            self._inicio = time.monotonic()
+            for i in range(self.num_workers):
+                hilo = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.nombre}-worker-{i}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+        logging.info(f"Planificador '{self.nombre}' iniciado con {self.num_carriles} carriles y {self.num_workers} workers")
+
+    def encolar(self, elemento, timeout=0, clave=None):
+        """
+        Agrega un elemento al carril de su clave sin esperar a que se procese
+
+        Args:
+            elemento: Elemento que se pasará al procesador
+            timeout (float): Segundos máximos de espera si no hay espacio
+            clave (str, optional): Clave de ordenamiento (número del remitente)
+
+        Returns:
+            bool: True si se encoló, False si no hay espacio
+        """
+        with self._hay_espacio:
+            if self._pendientes >= self.tamano_maximo and timeout:
+                self._hay_espacio.wait_for(lambda: self._pendientes < self.tamano_maximo, timeout)
+
+            if self._pendientes >= self.tamano_maximo:
+                self._rechazados += 1
+                logging.warning(f"Planificador '{self.nombre}' lleno ({self.tamano_maximo}). Elemento rechazado.")
+                return False
+
+            carril = self.carril_para(clave)
+            self._carriles[carril].append((time.monotonic(), elemento))
+            self._pendientes += 1
+            self._encolados += 1
+
+            if not self._programados[carril]:
+                self._programados[carril] = True
+                self._listos.put(carril)
+        return True
+
+    def _worker(self):
+        """Bucle de cada worker: toma un carril listo y procesa su siguiente elemento"""
+        while True:
+            carril = self._listos.get()
+            if carril is _FIN:
+                return
+
+            with self._lock:
+                encolado_en, elemento = self._carriles[carril].popleft()
+                self._ocupados += 1
+
+            inicio = time.monotonic()
+            self._espera.registrar(inicio - encolado_en)
+            try:
+                self.procesador(elemento)
+            except Exception as e:
+                with self._lock:
+                    self._errores += 1
+                logging.error(f"Error en el carril {carril} de '{self.nombre}': {str(e)}", exc_info=True)
+            finally:
+                duracion = time.monotonic() - inicio
+                self._duracion.registrar(duracion)
+                with self._hay_espacio:
+                    self._ocupados -= 1
+                    self._procesados += 1
+                    self._pendientes -= 1
+                    self._tiempo_ocupado += duracion
+                    # Devolver el carril al final de la fila para repartir el turno
+                    if self._carriles[carril]:
+                        self._listos.put(carril)
+                    else:
+                        self._programados[carril] = False
+                    self._hay_espacio.notify()
+
+    def detener(self, timeout=10):
+        """
+        Detiene los workers después de procesar lo que ya está encolado
+
+        Args:
+            timeout (float): Segundos máximos de espera para vaciar los carriles
+        """
+        with self._lock:
+            if not self._iniciada:
+                return
+            self._iniciada = False
+            hilos = list(self._hilos)
+            self._hilos = []
+            pendientes = self._pendientes
+
+        logging.info(f"Deteniendo planificador '{self.nombre}' ({pendientes} elementos pendientes)...")
+        with self._hay_espacio:
+            self._hay_espacio.wait_for(lambda: self._pendientes == 0, timeout)
+        for _ in hilos:
+            self._listos.put(_FIN)
+        for hilo in hilos:
+            hilo.join(timeout)
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Profundidad, carriles activos, tiempos de espera y utilización
+        """
+        with self._lock:
+            transcurrido = max(time.monotonic() - self._inicio, 1e-9)
+            utilizacion = self._tiempo_ocupado / (transcurrido * self.num_workers)
+            profundidades = [len(carril) for carril in self._carriles]
+            return {
+                "profundidad": self._pendientes,
+                "capacidad": self.tamano_maximo,
+                "carriles": self.num_carriles,
+                "carriles_con_trabajo": sum(1 for p in profundidades if p),
+                "profundidad_max_carril": max(profundidades),
+                "workers": self.num_workers,
+                "workers_ocupados": self._ocupados,
+                "utilizacion": round(min(utilizacion, 1.0), 4),
+                "encolados": self._encolados,
+                "rechazados": self._rechazados,
+                "procesados": self._procesados,
+                "errores": self._errores,
+                "espera": self._espera.resumen(),
+                "duracion": self._duracion.resumen()
+            }
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ConjuntoExpirable:
+    """
+    Conjunto de claves con tiempo de vida fijo y capacidad máxima.
+
+    Todas las claves tienen el mismo TTL, por lo que el orden de inserción
+    coincide con el orden de expiración: las claves vencidas siempre están al
+    principio del OrderedDict y se retiran desde ahí sin recorrer el resto.
+    Insertar, consultar y expirar cuestan O(1) amortizado.
+    """
+
+    def __init__(self, ttl=1800, max_elementos=200000):
+        """
+        Inicializa el conjunto
+
+        Args:
+            ttl (float): Segundos que permanece cada clave
+            max_elementos (int): Número máximo de claves; al superarlo se
+                descartan las más antiguas aunque no hayan vencido
+        """
+        self.ttl = ttl
+        self.max_elementos = max_elementos
+        self._claves = OrderedDict()  # clave -> instante de expiración
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.evicciones = 0
+
+    def _expirar(self, ahora):
+        """Retira las claves vencidas que están al principio del orden"""
+        claves = self._claves
+        while claves:
+            clave, expiracion = next(iter(claves.items()))
+            if expiracion > ahora:
+                break
+            del claves[clave]
+            self.expirados += 1
+
+    def agregar_si_nuevo(self, clave, ahora=None):
+        """
+        Registra una clave si no estaba presente (operación atómica)
+
+        Args:
+            clave (str): Clave a registrar
+            ahora (float, optional): Instante actual (time.monotonic por defecto)
+
+        Returns:
+            bool: True si la clave es nueva, False si ya estaba registrada
+        """
+        if ahora is None:
+            ahora = time.monotonic()
+        with self._lock:
+            self._expirar(ahora)
+            if clave in self._claves:
+                self.aciertos += 1
+                return False
+
+            self.fallos += 1
+            self._claves[clave] = ahora + self.ttl
+            while len(self._claves) > self.max_elementos:
+                self._claves.popitem(last=False)
+                self.evicciones += 1
+            return True
+
+    def contiene(self, clave, ahora=None):
+        """
+        Consulta si una clave está registrada y sin vencer
+
+        Args:
+            clave (str): Clave a consultar
+            ahora (float, optional): Instante actual (time.monotonic por defecto)
+
+        Returns:
+            bool: True si la clave está presente
+        """
+        if ahora is None:
+            ahora = time.monotonic()
+        with self._lock:
+            self._expirar(ahora)
+            return clave in self._claves
+
+    def __contains__(self, clave):
+        return self.contiene(clave)
+
+    def __len__(self):
+        return len(self._claves)
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Tamaño actual y contadores de aciertos, fallos y descartes
+        """
+        with self._lock:
+            return {
+                "elementos": len(self._claves),
+                "capacidad": self.max_elementos,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expirados": self.expirados,
+                "evicciones": self.evicciones
+            }
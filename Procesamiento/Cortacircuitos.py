@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class Cortacircuitos:
+    """
+    Cortacircuitos para una dependencia externa (STT, TTS).
+
+    Tras umbral_fallos fallos seguidos se abre y rechaza las llamadas sin
+    intentarlas durante tiempo_abierto segundos. Después pasa a semiabierto y
+    deja pasar una sola llamada de prueba: si sale bien se cierra, si falla
+    vuelve a abrirse.
+    """
+
+    def __init__(self, nombre, umbral_fallos=5, tiempo_abierto=30):
+        """
+        Args:
+            nombre (str): Nombre de la dependencia, para logs y métricas
+            umbral_fallos (int): Fallos seguidos que abren el circuito
+            tiempo_abierto (float): Segundos que se rechazan llamadas antes de probar
+        """
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_abierto = tiempo_abierto
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos_seguidos = 0
+        self._abierto_desde = None
+        self._sonda_en_curso = False
+
+        # Métricas
+        self.exitos = 0
+        self.fallos = 0
+        self.rechazadas = 0
+        self.aperturas = 0
+
+    def _estado_actual(self, ahora):
+        """Estado teniendo en cuenta si ya venció el tiempo abierto (requiere el lock)"""
+        if self._estado == ABIERTO and ahora - self._abierto_desde >= self.tiempo_abierto:
+            return SEMIABIERTO
+        return self._estado
+
+    def abierto(self):
+        """
+        Indica si las llamadas se rechazarían ahora, sin consumir la prueba
+
+        Returns:
+            bool: True si el circuito está abierto (o semiabierto con una prueba en curso)
+        """
+        with self._lock:
+            estado = self._estado_actual(time.monotonic())
+            return estado == ABIERTO or (estado == SEMIABIERTO and self._sonda_en_curso)
+
+    def permitir(self):
+        """
+        Decide si una llamada puede intentarse; quien recibe True debe
+        informar el resultado con registrar_exito o registrar_fallo
+
+        Returns:
+            bool: True si la llamada puede hacerse
+        """
+        with self._lock:
+            estado = self._estado_actual(time.monotonic())
+            if estado == CERRADO:
+                return True
+            if estado == SEMIABIERTO and not self._sonda_en_curso:
+                self._estado = SEMIABIERTO
+                self._sonda_en_curso = True
+                logging.info(f"Cortacircuitos {self.nombre}: semiabierto, probando la dependencia")
+                return True
+            self.rechazadas += 1
+            return False
+
+    def registrar_exito(self):
+        with self._lock:
+            self.exitos += 1
+            self._fallos_seguidos = 0
+            if self._estado != CERRADO:
+                logging.info(f"Cortacircuitos {self.nombre}: cerrado, la dependencia responde")
+            self._estado = CERRADO
+            self._sonda_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self.fallos += 1
+            self._fallos_seguidos += 1
+            if self._estado == SEMIABIERTO or self._fallos_seguidos >= self.umbral_fallos:
+                if self._estado != ABIERTO:
+                    self.aperturas += 1
+                    logging.warning(f"Cortacircuitos {self.nombre}: abierto tras "
+                                    f"{self._fallos_seguidos} fallos seguidos")
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+            self._sonda_en_curso = False
+
+    def descartar(self):
+        """
+        Cierra una llamada permitida que falló antes de llegar a la dependencia
+        (p. ej. al descargar su entrada): no cuenta como éxito ni como fallo,
+        solo libera la llamada de prueba si era la del estado semiabierto
+        """
+        with self._lock:
+            self._sonda_en_curso = False
+
+    def metricas(self):
+        with self._lock:
+            ahora = time.monotonic()
+            return {
+                "estado": self._estado_actual(ahora),
+                "fallos_seguidos": self._fallos_seguidos,
+                "exitos": self.exitos,
+                "fallos": self.fallos,
+                "rechazadas": self.rechazadas,
+                "aperturas": self.aperturas,
+                "segundos_abierto": round(ahora - self._abierto_desde, 1)
+                if self._estado == ABIERTO else None
+            }
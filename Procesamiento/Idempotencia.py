@@ -0,0 +1,199 @@
+import logging
+import sqlite3
+import threading
+import time
+from Procesamiento.Conjunto_Expirable import ConjuntoExpirable
+from Enviroment import Enviroments as env
+
+
+class IdempotenciaMemoria:
+    """
+    Registro de message_id procesados que vive solo en este proceso
+    """
+
+    def __init__(self, ttl=1800, max_elementos=200000):
+        """
+        Args:
+            ttl (float): Segundos que se recuerda cada ID
+            max_elementos (int): Límite duro de IDs en memoria
+        """
+        self._conjunto = ConjuntoExpirable(ttl=ttl, max_elementos=max_elementos)
+
+    def marcar_lote(self, claves):
+        """
+        Registra un lote de IDs y dice cuáles eran nuevos
+
+        Args:
+            claves (list): IDs de mensaje en el orden recibido
+
+        Returns:
+            list: Un bool por clave, True si no se había procesado antes
+        """
+        return [self._conjunto.agregar_si_nuevo(clave) for clave in claves]
+
+    def marcar_si_nuevo(self, clave):
+        """Registra un ID; devuelve True si no se había procesado antes"""
+        return self._conjunto.agregar_si_nuevo(clave)
+
+    def metricas(self):
+        return dict(self._conjunto.metricas(), backend="memoria")
+
+    def cerrar(self):
+        pass
+
+
+class IdempotenciaSQLite:
+    """
+    Registro de message_id procesados en SQLite (modo WAL), compartido entre
+    reinicios y entre varios procesos que apunten al mismo archivo.
+
+    Cada ID se reclama con un INSERT atómico, así que dos procesos nunca
+    procesan el mismo mensaje. Los IDs de un lote se reclaman en una sola
+    transacción y los vencidos se borran por tandas cada cierto intervalo.
+    Los IDs que este proceso ya reclamó se recuerdan en memoria, de modo que
+    la mayoría de los duplicados se detectan sin consultar el archivo.
+    """
+
+    def __init__(self, ruta, ttl=1800, max_elementos=200000, intervalo_purga=60):
+        """
+        Args:
+            ruta (str): Archivo SQLite compartido
+            ttl (float): Segundos que se recuerda cada ID
+            max_elementos (int): Límite de IDs en la caché local en memoria
+            intervalo_purga (float): Segundos entre borrados de IDs vencidos
+        """
+        self.ruta = ruta
+        self.ttl = ttl
+        self.intervalo_purga = intervalo_purga
+        self._local = ConjuntoExpirable(ttl=ttl, max_elementos=max_elementos)
+        self._lock = threading.Lock()
+        self._ultima_purga = 0.0
+
+        # Contadores
+        self.aciertos_locales = 0
+        self.aciertos_compartidos = 0
+        self.nuevos = 0
+        self.purgados = 0
+        self.errores_almacen = 0
+
+        self._conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no hace fsync en cada commit y sigue siendo consistente
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS mensajes_procesados ("
+            "message_id TEXT PRIMARY KEY, expira REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mensajes_expira ON mensajes_procesados (expira)"
+        )
+        logging.info(f"Registro de idempotencia en SQLite: {ruta}")
+
+    def marcar_lote(self, claves):
+        """
+        Reclama un lote de IDs y dice cuáles eran nuevos
+
+        Args:
+            claves (list): IDs de mensaje en el orden recibido
+
+        Returns:
+            list: Un bool por clave, True si ningún proceso lo había reclamado.
+                Si el archivo falla (p. ej. bloqueado más de 5 s) se decide solo
+                con la memoria de este proceso: WhatsApp ya recibió su 200 y no
+                reenviaría los mensajes perdidos.
+        """
+        resultado = [False] * len(claves)
+        pendientes = [i for i, clave in enumerate(claves) if not self._local.contiene(clave)]
+        if len(pendientes) < len(claves):
+            with self._lock:
+                self.aciertos_locales += len(claves) - len(pendientes)
+
+        if not pendientes:
+            return resultado
+
+        ahora = time.time()
+        with self._lock:
+            cursor = self._conexion.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for i in pendientes:
+                    # Inserta el ID o reemplaza uno vencido; rowcount 0 = ya reclamado
+                    cursor.execute(
+                        "INSERT INTO mensajes_procesados (message_id, expira) VALUES (?, ?) "
+                        "ON CONFLICT(message_id) DO UPDATE SET expira = excluded.expira "
+                        "WHERE mensajes_procesados.expira <= ?",
+                        (claves[i], ahora + self.ttl, ahora)
+                    )
+                    resultado[i] = cursor.rowcount == 1
+
+                if ahora - self._ultima_purga >= self.intervalo_purga:
+                    cursor.execute("DELETE FROM mensajes_procesados WHERE expira <= ?", (ahora,))
+                    self.purgados += max(cursor.rowcount, 0)
+                    self._ultima_purga = ahora
+
+                cursor.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conexion.in_transaction:
+                    self._conexion.rollback()
+                self.errores_almacen += 1
+                logging.error(f"Error en el registro de idempotencia SQLite: {str(e)}. "
+                              f"Se deduplica el lote solo en memoria.")
+                for i in pendientes:
+                    resultado[i] = self._local.agregar_si_nuevo(claves[i])
+                    self.nuevos += 1 if resultado[i] else 0
+                return resultado
+            except Exception:
+                if self._conexion.in_transaction:
+                    self._conexion.rollback()
+                raise
+
+            for i in pendientes:
+                self._local.agregar_si_nuevo(claves[i])
+                if resultado[i]:
+                    self.nuevos += 1
+                else:
+                    self.aciertos_compartidos += 1
+        return resultado
+
+    def marcar_si_nuevo(self, clave):
+        """Reclama un ID; devuelve True si ningún proceso lo había reclamado"""
+        return self.marcar_lote([clave])[0]
+
+    def metricas(self):
+        return {
+            "backend": "sqlite",
+            "ruta": self.ruta,
+            "nuevos": self.nuevos,
+            "aciertos_locales": self.aciertos_locales,
+            "aciertos_compartidos": self.aciertos_compartidos,
+            "purgados": self.purgados,
+            "errores_almacen": self.errores_almacen,
+            "cache_local": self._local.metricas()
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+def crear_idempotencia():
+    """
+    Crea el registro de idempotencia configurado en Enviroments
+
+    Returns:
+        IdempotenciaMemoria | IdempotenciaSQLite: Backend de deduplicación
+    """
+    if env.BACKEND_IDEMPOTENCIA == "sqlite":
+        try:
+            return IdempotenciaSQLite(
+                env.RUTA_IDEMPOTENCIA,
+                ttl=env.TTL_MENSAJES_PROCESADOS,
+                max_elementos=env.MAX_MENSAJES_PROCESADOS
+            )
+        except sqlite3.Error as e:
+            logging.error(f"No se pudo abrir el registro de idempotencia SQLite: {str(e)}. Se usará memoria.")
+
+    return IdempotenciaMemoria(
+        ttl=env.TTL_MENSAJES_PROCESADOS,
+        max_elementos=env.MAX_MENSAJES_PROCESADOS
+    )
@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+
+
+def percentil(valores, p):
+    """
+    Calcula el percentil p de una lista de valores ya ordenada
+
+    Args:
+        valores (list): Valores ordenados de menor a mayor
+        p (float): Percentil a calcular (0-100)
+
+    Returns:
+        float: Valor del percentil, o 0.0 si no hay valores
+    """
+    if not valores:
+        return 0.0
+    indice = int(round((p / 100.0) * (len(valores) - 1)))
+    return valores[max(0, min(indice, len(valores) - 1))]
+
+
+class VentanaLatencias:
+    """
+    Guarda las últimas N muestras de una latencia (en segundos) y las resume
+    en milisegundos para reportarlas
+    """
+
+    def __init__(self, tamano=1000):
+        """
+        Args:
+            tamano (int): Número máximo de muestras que se conservan
+        """
+        self._muestras = deque(maxlen=tamano)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        """Agrega una muestra de latencia en segundos"""
+        with self._lock:
+            self._muestras.append(segundos)
+            self.total += 1
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Conteo, media, p50, p95 y máximo en milisegundos
+        """
+        with self._lock:
+            muestras = sorted(self._muestras)
+            total = self.total
+            maximo = self.maximo
+        media = (sum(muestras) / len(muestras)) if muestras else 0.0
+        return {
+            "muestras": total,
+            "media_ms": round(media * 1000, 2),
+            "p50_ms": round(percentil(muestras, 50) * 1000, 2),
+            "p95_ms": round(percentil(muestras, 95) * 1000, 2),
+            "max_ms": round(maximo * 1000, 2)
+        }
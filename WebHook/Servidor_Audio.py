@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from EnvioMensajes.Almacen_Audio import almacen_audio
+
+PREFIJO_RUTA = "/static/audio/"
+
+# Los nombres de los audios derivan de su contenido, así que un archivo nunca cambia
+CACHE_CONTROL = "public, max-age=86400, immutable"
+
+RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def interpretar_rango(cabecera, tamano):
+    """
+    Interpreta una cabecera Range de un solo rango
+
+    Args:
+        cabecera (str): Valor de la cabecera Range
+        tamano (int): Tamaño del archivo
+
+    Returns:
+        tuple: (inicio, fin) inclusivos; None si la cabecera no aplica (se sirve
+            el archivo completo); o "invalido" si el rango no es satisfacible
+    """
+    coincidencia = RANGO.match(cabecera.strip())
+    if not coincidencia:
+        # Varios rangos o unidades desconocidas: se permite ignorar la cabecera
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+
+    if not inicio:
+        # Sufijo: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0:
+            return "invalido"
+        return max(tamano - sufijo, 0), tamano - 1
+
+    inicio = int(inicio)
+    fin = int(fin) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return "invalido"
+    return inicio, min(fin, tamano - 1)
+
+
+class ManejadorAudio(BaseHTTPRequestHandler):
+    """Sirve los archivos de static/audio con sendfile, ETag y rangos"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ServidorAudio"
+    carpeta = None
+
+    def log_message(self, format, *args):
+        logging.debug(f"Servidor de audio: {self.address_string()} {format % args}")
+
+    def do_HEAD(self):
+        self._servir(cuerpo=False)
+
+    def do_GET(self):
+        self._servir(cuerpo=True)
+
+    def _error(self, codigo):
+        self.send_response(codigo)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _servir(self, cuerpo):
+        ruta = self.path.split("?", 1)[0]
+        nombre = ruta[len(PREFIJO_RUTA):] if ruta.startswith(PREFIJO_RUTA) else ""
+        if not nombre or "/" in nombre or "\\" in nombre or nombre.startswith("."):
+            self._error(404)
+            return
+
+        try:
+            archivo = open(os.path.join(self.carpeta, nombre), "rb")
+        except OSError:
+            self._error(404)
+            return
+
+        with archivo:
+            estado = os.fstat(archivo.fileno())
+            tamano = estado.st_size
+            etag = f'"{estado.st_mtime_ns:x}-{tamano:x}"'
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            rango = None
+            cabecera_rango = self.headers.get("Range")
+            if cabecera_rango and self.headers.get("If-Range", etag) == etag:
+                rango = interpretar_rango(cabecera_rango, tamano)
+            if rango == "invalido":
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{tamano}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if rango is None:
+                inicio, longitud = 0, tamano
+                self.send_response(200)
+            else:
+                inicio, longitud = rango[0], rango[1] - rango[0] + 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {rango[0]}-{rango[1]}/{tamano}")
+
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(longitud))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("Last-Modified", formatdate(estado.st_mtime, usegmt=True))
+            self.end_headers()
+
+            if not cuerpo:
+                return
+            # Copia de cero: el núcleo envía el archivo directamente al socket
+            self.wfile.flush()
+            self.connection.sendfile(archivo, inicio, longitud)
+
+        almacen_audio.marcar_descargado(nombre)
+
+
+class ServidorAudio:
+    """
+    Servidor HTTP ligero, en su propio hilo, para las descargas de audio de
+    WhatsApp, de modo que no ocupan los hilos que atienden el webhook
+    """
+
+    def __init__(self, carpeta, puerto, host="127.0.0.1"):
+        """
+        Args:
+            carpeta (str): Carpeta que se publica bajo /static/audio/
+            puerto (int): Puerto en el que escucha (0 para uno libre cualquiera)
+            host (str): Interfaz en la que escucha
+        """
+        manejador = type("ManejadorAudioCarpeta", (ManejadorAudio,), {"carpeta": carpeta})
+        self._servidor = ThreadingHTTPServer((host, puerto), manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def puerto(self):
+        return self._servidor.server_address[1]
+
+    def iniciar(self):
+        """Empieza a servir en un hilo en segundo plano"""
+        if self._hilo is not None:
+            return self
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="servidor-audio", daemon=True)
+        self._hilo.start()
+        logging.info(f"Servidor de audio escuchando en el puerto {self.puerto}")
+        return self
+
+    def detener(self):
+        """Deja de aceptar conexiones y cierra el socket"""
+        if self._hilo is None:
+            return
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        self._hilo.join(timeout=5)
+        self._hilo = None
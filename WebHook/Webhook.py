@@ -1,8 +1,22 @@
 # WebHook.py
 from flask import Flask, request, jsonify
 import os
+import json
+import atexit
 import logging
-from chat.chat import ChatProcess
+import threading
+from chat.chat import ChatProcess, dividir_por_remitente
+from Procesamiento.Cola_Trabajo import ColaProcesamiento, PlanificadorCarriles
+from PeticionesRequests.Cliente_HTTP import cliente_http
+from PeticionesRequests.Cache_TTS import cache_tts
+from PeticionesRequests.Cache_STT import cache_stt
+from PeticionesRequests.Pich_To_Text import agrupador_stt, cortacircuitos_stt
+from PeticionesRequests.Text_To_Speech import cortacircuitos_tts
+from EnvioMensajes.Almacen_Audio import almacen_audio
+from EnvioMensajes.Bandeja_Salida import bandeja_salida
+from EnvioMensajes.Planificador_Envios import planificador_envios
+from WebHook.Servidor_Audio import ServidorAudio
+from Enviroment import Enviroments as env
 
 # Configurar logging
 logging.basicConfig(
@@ -28,9 +42,70 @@ os.makedirs(os.path.join(base_dir, 'static', 'audio'), exist_ok=True)
 # Inicializar el procesador de chat
 chatObj = ChatProcess()
 
+# Cola para procesar los eventos fuera del hilo de la petición
+if env.ORDEN_POR_REMITENTE:
+    # Un carril en serie por grupo de remitentes para no mezclar sus conversaciones
+    colaObj = PlanificadorCarriles(
+        chatObj.ProcessMessage,
+        num_carriles=env.NUM_CARRILES,
+        num_workers=env.NUM_WORKERS,
+        tamano_maximo=env.TAMANO_COLA
+    )
+else:
+    colaObj = ColaProcesamiento(
+        chatObj.ProcessMessage,
+        num_workers=env.NUM_WORKERS,
+        tamano_maximo=env.TAMANO_COLA
+    )
+
 # Token de verificación para el webhook de WhatsApp
 VERIFY_TOKEN = "hola"
 
+def payload_valido(data):
+    """
+    Verifica que el cuerpo recibido tenga la forma de un evento de WhatsApp
+    
+    Args:
+        data: Cuerpo JSON de la petición
+        
+    Returns:
+        bool: True si el payload puede procesarse
+    """
+    return isinstance(data, dict) and isinstance(data.get("entry"), list)
+
+def obtener_metricas():
+    """Reúne las métricas de los componentes del servidor"""
+    return {
+        "cola": colaObj.metricas(),
+        "deduplicacion": chatObj.processed_messages.metricas(),
+        "indicador_escritura": chatObj.indicador_escritura.metricas(),
+        "respuestas": chatObj.despachador.metricas(),
+        "avisos_voz": chatObj.avisos_voz.metricas(),
+        "politica_voz": chatObj.politica_voz.metricas(),
+        "empresas": chatObj.repositorio_empresas.metricas(),
+        "persistencia": chatObj.persistencia.metricas() if chatObj.persistencia is not None else None,
+        "embeddings": chatObj.almacen_embeddings.metricas() if chatObj.almacen_embeddings is not None else None,
+        "tts_cache": cache_tts.metricas(),
+        "tts_frases": chatObj.sintetizador.metricas(),
+        "stt_cache": cache_stt.metricas(),
+        "stt_lotes": agrupador_stt.metricas() if agrupador_stt is not None else None,
+        "almacen_audio": almacen_audio.metricas(),
+        "bandeja_salida": bandeja_salida.metricas() if bandeja_salida is not None else None,
+        "planificador_envios": planificador_envios.metricas() if planificador_envios is not None else None,
+        "cortacircuitos": {
+            "stt": cortacircuitos_stt.metricas(),
+            "tts": cortacircuitos_tts.metricas()
+        },
+        "http": cliente_http.metricas()
+    }
+
+@app.after_request
+def registrar_descarga_audio(response):
+    """Marca como descargados los audios que WhatsApp obtiene de static/audio"""
+    if request.method == 'GET' and response.status_code in (200, 206) and request.path.startswith('/static/audio/'):
+        almacen_audio.marcar_descargado(request.path.rsplit('/', 1)[-1])
+    return response
+
 @app.route('/webhook', methods=['GET', 'POST'])
 def webhook():
     if request.method == 'GET':
@@ -46,18 +121,108 @@ def webhook():
             
     elif request.method == 'POST':
         # Procesar eventos entrantes del webhook
-        data = request.json
+        data = request.get_json(silent=True)
         logging.info(f"Evento de webhook recibido: {data}")
         
-        # Procesar el mensaje a través de nuestro sistema
-        chatObj.ProcessMessage(data)
+        if not payload_valido(data):
+            logging.warning("Payload de webhook inválido, se descarta")
+            return jsonify({"error": "Payload inválido"}), 400
+        
+        if not env.PROCESAMIENTO_ASINCRONO:
+            # Procesar el mensaje a través de nuestro sistema antes de responder
+            chatObj.ProcessMessage(data)
+            return jsonify({"message": "Evento recibido"}), 200
+        
+        # Un evento por remitente para que cada uno vaya a su carril
+        eventos = [(None, data)]
+        if env.ORDEN_POR_REMITENTE:
+            eventos = list(dividir_por_remitente(data).items()) or eventos
+        
+        # Encolar y responder de inmediato para que WhatsApp no reintente
+        for numero, evento in eventos:
+            if not colaObj.encolar(evento, timeout=env.TIMEOUT_ENCOLAR, clave=numero):
+                # Cola llena: pedir a WhatsApp que reintente más tarde; lo ya
+                # encolado se descarta como duplicado cuando llegue el reintento
+                return jsonify({"error": "Servidor ocupado"}), 503
         
         return jsonify({"message": "Evento recibido"}), 200
 
-def run_webHook():
+@app.route('/metricas', methods=['GET'])
+def metricas():
+    return jsonify(obtener_metricas()), 200
+
+def _reportar_metricas(intervalo):
+    """Escribe periódicamente las métricas en el log"""
+    evento = threading.Event()
+    while not evento.wait(intervalo):
+        logging.info(f"Métricas: {json.dumps(obtener_metricas(), ensure_ascii=False)}")
+
+def es_proceso_servidor(depurar):
+    """
+    True en el proceso que atiende peticiones
+    
+    Con debug=True Flask arranca además un proceso que solo vigila los cambios
+    del código y relanza al que atiende (marcado con WERKZEUG_RUN_MAIN).
+    """
+    return not depurar or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+def iniciar_servicios():
+    """Arranca los servicios de fondo del webhook y registra su cierre"""
+    if chatObj.persistencia is not None:
+        # atexit corre en orden inverso: se registra primero para que escriba
+        # también las empresas que registre la cola al vaciarse
+        atexit.register(chatObj.persistencia.detener)
+    
+    if env.CALENTAR_AVISOS_VOZ:
+        # Publicar los avisos de voz fijos antes de aceptar mensajes
+        chatObj.calentar_avisos_voz()
+    
+    if env.PROCESAMIENTO_ASINCRONO:
+        colaObj.iniciar()
+        # Procesar lo que quede en la cola antes de salir
+        atexit.register(colaObj.detener)
+    
+    if bandeja_salida is not None:
+        # Retomar los envíos que quedaron pendientes de una ejecución anterior
+        bandeja_salida.iniciar()
+        atexit.register(bandeja_salida.detener)
+    
+    # Borrar en segundo plano los audios ya descargados, caducados o fuera de cuota
+    almacen_audio.iniciar()
+    atexit.register(almacen_audio.detener)
+    
+    if env.SERVIDOR_AUDIO_ACTIVO:
+        try:
+            servidor_audio = ServidorAudio(
+                almacen_audio.carpeta,
+                env.SERVIDOR_AUDIO_PUERTO,
+                host=env.SERVIDOR_AUDIO_HOST
+            ).iniciar()
+            atexit.register(servidor_audio.detener)
+        except OSError as e:
+            # Flask sigue sirviendo /static/audio/ como antes
+            logging.error(f"No se pudo abrir el servidor de audio en el puerto {env.SERVIDOR_AUDIO_PUERTO}: "
+                          f"{str(e)}. Flask servirá los audios.")
+    
+    if env.INTERVALO_REPORTE_METRICAS:
+        threading.Thread(
+            target=_reportar_metricas,
+            args=(env.INTERVALO_REPORTE_METRICAS,),
+            name="reporte-metricas",
+            daemon=True
+        ).start()
+
+def run_webHook(depurar=True):
+    # Con debug=True el proceso que vigila los cambios también pasa por aquí:
+    # los servicios de fondo solo arrancan en el que atiende peticiones, o
+    # habría dos hilos vaciando la bandeja de salida, cada uno con su propio
+    # planificador, y dos barridos de la carpeta de audio
+    if es_proceso_servidor(depurar):
+        iniciar_servicios()
+    
     # Iniciar el servidor
     logging.info("Iniciando servidor Flask...")
-    app.run(port=5001, debug=True)
+    app.run(port=5001, debug=depurar)
 
 if __name__ == "__main__":
     run_webHook()
\ No newline at end of file
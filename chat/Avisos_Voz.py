@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from Enviroment import Enviroments as env
+from PeticionesRequests.Text_To_Speech import texto_a_voz
+
+# Notas de voz fijas del chat. Se sintetizan una sola vez al arrancar y se
+# sirven después por URL, sin llamar al servicio TTS.
+AVISOS_VOZ = {
+    "ayuda": "Estos son los comandos disponibles: ayuda para mostrar información, nueva empresa para registrar, listar para ver empresas, analizar nombre para ver análisis y buscar término para encontrar empresas. También puedes hacer preguntas naturales sobre empresas.",
+    "sin_empresas": "No hay empresas registradas en el sistema."
+}
+
+MANIFIESTO = "avisos_voz.json"
+
+
+class AvisosVoz:
+    """
+    Avisos de voz pre-renderizados y publicados en static/audio.
+
+    Un manifiesto guarda la huella (texto, idioma y configuración del servicio
+    TTS) de cada aviso publicado; al arrancar solo se vuelven a sintetizar los
+    avisos cuya huella cambió.
+    """
+
+    def __init__(self, sender, avisos=AVISOS_VOZ, idioma="es", sintetizar=texto_a_voz,
+                 configuracion=env.URL_TEXTO_VOZ):
+        """
+        Args:
+            sender (WhatsAppSender): Sender que conoce la carpeta y la URL pública de los audios
+            avisos (dict): Nombre del aviso -> texto que se convierte en voz
+            idioma (str): Código del idioma de los avisos
+            sintetizar (callable): Función (texto, idioma) -> bytes de audio (o None)
+            configuracion (str): Configuración del servicio TTS que forma parte de la huella
+        """
+        self.sender = sender
+        self.avisos = dict(avisos)
+        self.idioma = idioma
+        self.sintetizar = sintetizar
+        self.configuracion = configuracion
+        self._publicados = {}  # nombre -> URL pública
+        self._lock = threading.Lock()
+
+        # Métricas del último calentamiento
+        self.generados = 0
+        self.reutilizados = 0
+        self.fallidos = 0
+        self.duracion_calentamiento = None
+
+    def texto(self, nombre):
+        """Texto del aviso, o None si no existe"""
+        return self.avisos.get(nombre)
+
+    def url(self, nombre):
+        """URL pública del aviso, o None si no está publicado"""
+        with self._lock:
+            return self._publicados.get(nombre)
+
+    def _huella(self, texto):
+        contenido = f"{self.configuracion}\0{self.idioma}\0{texto}".encode("utf-8")
+        return hashlib.sha256(contenido).hexdigest()[:16]
+
+    def _leer_manifiesto(self, ruta):
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Manifiesto de avisos de voz ilegible, se regeneran todos: {str(e)}")
+            return {}
+
+    def _escribir_atomico(self, ruta, contenido, modo="wb"):
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, modo) as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+    def calentar(self):
+        """
+        Publica todos los avisos, sintetizando solo los nuevos o modificados
+
+        Returns:
+            float: Segundos que tardó el calentamiento
+        """
+        inicio = time.monotonic()
+        carpeta = self.sender.carpeta_audio()
+        ruta_manifiesto = os.path.join(carpeta, MANIFIESTO)
+        anterior = self._leer_manifiesto(ruta_manifiesto)
+        manifiesto = {}
+        publicados = {}
+        generados = reutilizados = fallidos = 0
+
+        for nombre, texto in self.avisos.items():
+            huella = self._huella(texto)
+            archivo = f"aviso_{nombre}_{huella}.mp3"
+            ruta = os.path.join(carpeta, archivo)
+
+            previo = anterior.get(nombre, {})
+            if previo.get("huella") == huella and os.path.exists(ruta):
+                reutilizados += 1
+            else:
+                try:
+                    audio = self.sintetizar(texto, self.idioma)
+                except Exception as e:
+                    logging.error(f"Error al sintetizar el aviso '{nombre}': {str(e)}")
+                    audio = None
+                if not audio:
+                    # Sin publicar: en tiempo de ejecución se sintetiza como cualquier voz
+                    fallidos += 1
+                    continue
+                self._escribir_atomico(ruta, audio)
+                generados += 1
+
+            manifiesto[nombre] = {"huella": huella, "archivo": archivo}
+            publicados[nombre] = self.sender.url_audio(archivo)
+
+        # Borrar los archivos de versiones anteriores de los avisos
+        for nombre, previo in anterior.items():
+            archivo = previo.get("archivo")
+            if archivo and manifiesto.get(nombre, {}).get("archivo") != archivo:
+                try:
+                    os.remove(os.path.join(carpeta, archivo))
+                except OSError:
+                    pass
+
+        self._escribir_atomico(ruta_manifiesto, json.dumps(manifiesto, indent=2), modo="w")
+
+        duracion = time.monotonic() - inicio
+        with self._lock:
+            self._publicados = publicados
+            self.generados = generados
+            self.reutilizados = reutilizados
+            self.fallidos = fallidos
+            self.duracion_calentamiento = duracion
+        logging.info(f"Avisos de voz listos en {duracion * 1000:.0f} ms: {generados} generados, "
+                     f"{reutilizados} reutilizados, {fallidos} fallidos")
+        return duracion
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "publicados": len(self._publicados),
+                "generados": self.generados,
+                "reutilizados": self.reutilizados,
+                "fallidos": self.fallidos,
+                "duracion_calentamiento_ms": round(self.duracion_calentamiento * 1000, 1)
+                if self.duracion_calentamiento is not None else None
+            }
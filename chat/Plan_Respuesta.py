@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PeticionesRequests.Text_To_Speech import texto_a_voz, cortacircuitos_tts
+from Procesamiento.Metricas import VentanaLatencias
+
+
+class PlanRespuesta:
+    """
+    Salidas que declara un turno de conversación (la respuesta a un mensaje
+    entrante): los textos que se envían y las notas de voz que se sintetizan
+    """
+
+    def __init__(self, numero, message_id=None):
+        """
+        Args:
+            numero (str): Número de teléfono del usuario
+            message_id (str, optional): ID del mensaje que originó el turno
+        """
+        self.numero = numero
+        self.message_id = message_id
+        self.inicio = time.monotonic()
+        self.primer_mensaje = None  # Segundos desde el inicio hasta el primer envío
+        self.textos = 0
+        self.voces = 0
+
+
+class DespachadorRespuestas:
+    """
+    Ejecuta las salidas que declaran los manejadores del chat.
+
+    Los textos se envían de inmediato y en orden; las notas de voz se
+    sintetizan y se suben en un pool de hilos, en paralelo con el resto del
+    turno, de modo que la latencia de un turno ya no es la suma de texto, TTS
+    y subida del audio.
+    """
+
+    def __init__(self, sender, sintetizar=texto_a_voz, max_workers=4, avisos=None,
+                 cortacircuitos=cortacircuitos_tts):
+        """
+        Args:
+            sender (WhatsAppSender): Sender usado para los envíos
+            sintetizar (callable): Función texto -> bytes de audio (o None)
+            max_workers (int): Notas de voz que se preparan en paralelo
+            avisos (AvisosVoz, optional): Avisos de voz pre-renderizados
+            cortacircuitos (Cortacircuitos, optional): Cortacircuitos del servicio TTS;
+                mientras está abierto las respuestas son solo de texto
+        """
+        self.sender = sender
+        self.sintetizar = sintetizar
+        self.avisos = avisos
+        self.cortacircuitos = cortacircuitos
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="voz")
+        self._turno = threading.local()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self._primer_mensaje = VentanaLatencias()
+        self._tiempo_voz = VentanaLatencias()
+        self.turnos = 0
+        self.voces_pendientes = 0
+        self.voces_enviadas = 0
+        self.voces_fallidas = 0
+        self.voces_omitidas = 0
+        self.avisos_servidos = 0
+        self.latencia_voz_reciente = None
+
+    def iniciar_turno(self, numero, message_id=None):
+        """
+        Abre el plan del turno que procesa el hilo actual
+
+        Args:
+            numero (str): Número de teléfono del usuario
+            message_id (str, optional): ID del mensaje que originó el turno
+
+        Returns:
+            PlanRespuesta: Plan del turno
+        """
+        plan = PlanRespuesta(numero, message_id)
+        self._turno.plan = plan
+        return plan
+
+    def finalizar_turno(self):
+        """
+        Cierra el plan del hilo actual y registra su tiempo al primer mensaje
+
+        Returns:
+            PlanRespuesta: Plan cerrado, o None si no había turno abierto
+        """
+        plan = getattr(self._turno, "plan", None)
+        self._turno.plan = None
+        if plan is None:
+            return None
+
+        with self._lock:
+            self.turnos += 1
+        if plan.primer_mensaje is not None:
+            self._primer_mensaje.registrar(plan.primer_mensaje)
+            logging.debug(f"Turno de {plan.numero}: primer mensaje en {plan.primer_mensaje * 1000:.0f} ms, "
+                          f"{plan.textos} textos, {plan.voces} voces")
+        return plan
+
+    def _registrar_envio(self, plan):
+        if plan is not None and plan.primer_mensaje is None:
+            plan.primer_mensaje = time.monotonic() - plan.inicio
+
+    def texto(self, numero, cuerpo, message_id=None):
+        """
+        Envía un texto de inmediato
+
+        Args:
+            numero (str): Número de teléfono del destinatario
+            cuerpo (str): Texto del mensaje
+            message_id (str, optional): ID del mensaje al que se responde
+
+        Returns:
+            dict: Respuesta de la API de WhatsApp
+        """
+        plan = getattr(self._turno, "plan", None)
+        respuesta = self.sender.SendText(numero, cuerpo, message_id)
+        self._registrar_envio(plan)
+        if plan is not None:
+            plan.textos += 1
+        return respuesta
+
+    def voz(self, numero, texto):
+        """
+        Programa una nota de voz: se sintetiza y se envía sin bloquear el turno
+
+        Args:
+            numero (str): Número de teléfono del destinatario
+            texto (str): Texto que se convertirá en voz
+        """
+        if self.cortacircuitos is not None and self.cortacircuitos.abierto():
+            # TTS caído: la respuesta se queda en el texto ya enviado
+            with self._lock:
+                self.voces_omitidas += 1
+            return
+
+        plan = getattr(self._turno, "plan", None)
+        if plan is not None:
+            plan.voces += 1
+        with self._lock:
+            self.voces_pendientes += 1
+        self._pool.submit(self._enviar_voz, numero, texto, plan, time.monotonic())
+
+    def aviso(self, numero, nombre):
+        """
+        Programa un aviso de voz fijo: se envía por URL sin llamar al TTS si
+        está pre-renderizado, o se sintetiza como cualquier otra voz si no
+
+        Args:
+            numero (str): Número de teléfono del destinatario
+            nombre (str): Nombre del aviso en AVISOS_VOZ
+        """
+        url = self.avisos.url(nombre) if self.avisos else None
+        if url is None:
+            texto = self.avisos.texto(nombre) if self.avisos else None
+            if texto is None:
+                logging.error(f"Aviso de voz desconocido: {nombre}")
+                return
+            self.voz(numero, texto)
+            return
+
+        plan = getattr(self._turno, "plan", None)
+        if plan is not None:
+            plan.voces += 1
+        with self._lock:
+            self.voces_pendientes += 1
+        self._pool.submit(self._enviar_voz, numero, None, plan, time.monotonic(), url)
+
+    def _enviar_voz(self, numero, texto, plan, programada, url=None):
+        enviada = False
+        try:
+            if url is not None:
+                respuesta = self.sender.SendVoiceNoteUrl(numero, url)
+                enviada = isinstance(respuesta, dict) and "error" not in respuesta
+                self._registrar_envio(plan)
+                with self._lock:
+                    self.avisos_servidos += 1
+                return
+
+            audio_bytes = self.sintetizar(texto)
+            self._actualizar_latencia_reciente(time.monotonic() - programada)
+            if audio_bytes:
+                respuesta = self.sender.SendVoiceNote(numero, audio_bytes)
+                enviada = isinstance(respuesta, dict) and "error" not in respuesta
+                self._registrar_envio(plan)
+        except Exception as e:
+            logging.error(f"Error al preparar nota de voz: {str(e)}", exc_info=True)
+        finally:
+            self._tiempo_voz.registrar(time.monotonic() - programada)
+            with self._lock:
+                self.voces_pendientes -= 1
+                if enviada:
+                    self.voces_enviadas += 1
+                else:
+                    self.voces_fallidas += 1
+
+    def _actualizar_latencia_reciente(self, segundos):
+        """Media móvil exponencial de espera + síntesis, que sigue rápido los cambios de carga"""
+        with self._lock:
+            if self.latencia_voz_reciente is None:
+                self.latencia_voz_reciente = segundos
+            else:
+                self.latencia_voz_reciente += 0.2 * (segundos - self.latencia_voz_reciente)
+
+    def carga_voz(self):
+        """
+        Estado actual de la síntesis de voz, para las políticas de respuesta
+
+        Returns:
+            dict: pendientes, latencia reciente (segundos, o None sin datos) y
+                si el servicio TTS está disponible
+        """
+        with self._lock:
+            pendientes = self.voces_pendientes
+            latencia = self.latencia_voz_reciente
+        disponible = self.cortacircuitos is None or not self.cortacircuitos.abierto()
+        return {"pendientes": pendientes, "latencia": latencia, "disponible": disponible}
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "turnos": self.turnos,
+                "primer_mensaje": self._primer_mensaje.resumen(),
+                "tiempo_voz": self._tiempo_voz.resumen(),
+                "voces_pendientes": self.voces_pendientes,
+                "voces_enviadas": self.voces_enviadas,
+                "voces_fallidas": self.voces_fallidas,
+                "voces_omitidas": self.voces_omitidas,
+                "avisos_servidos": self.avisos_servidos
+            }
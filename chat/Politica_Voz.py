@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+from collections import deque
+from Enviroment import Enviroments as env
+
+
+class PoliticaVozFija:
+    """
+    Responde con voz con una probabilidad fija, sin mirar la carga
+    (el comportamiento original del bot)
+    """
+
+    def __init__(self, probabilidad=0.4):
+        """
+        Args:
+            probabilidad (float): Fracción de respuestas que llevan nota de voz
+        """
+        self.probabilidad = probabilidad
+        self._lock = threading.Lock()
+        self.con_voz = 0
+        self.sin_voz = 0
+
+    def decidir(self, numero):
+        """
+        Decide si una respuesta lleva nota de voz
+
+        Args:
+            numero (str): Número de teléfono del usuario
+
+        Returns:
+            bool: True si se debe responder también con audio
+        """
+        con_voz = random.random() < self.probabilidad
+        with self._lock:
+            if con_voz:
+                self.con_voz += 1
+            else:
+                self.sin_voz += 1
+        return con_voz
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "politica": "fija",
+                "probabilidad": self.probabilidad,
+                "con_voz": self.con_voz,
+                "sin_voz": self.sin_voz
+            }
+
+
+class PoliticaVozAdaptativa:
+    """
+    Ajusta la probabilidad de responder con voz a la carga del servicio TTS.
+
+    Con el sistema ocioso se usa la probabilidad base. La probabilidad baja
+    linealmente cuando la latencia reciente de las notas de voz pasa del
+    objetivo (llega al mínimo en la latencia máxima) y cuando crecen las notas
+    de voz pendientes. Por encima de eso hay dos topes duros: un presupuesto de
+    síntesis por minuto para todo el bot y un máximo de notas de voz por
+    usuario y minuto. La probabilidad mínima mantiene algunas muestras de
+    latencia para detectar cuándo el servicio se recupera.
+    """
+
+    def __init__(self, medir_carga, probabilidad_base=0.4, probabilidad_minima=0.02,
+                 latencia_objetivo=3.0, latencia_maxima=15.0, pendientes_max=16,
+                 presupuesto_por_minuto=60, max_por_usuario_minuto=4):
+        """
+        Args:
+            medir_carga (callable): Devuelve {"pendientes", "latencia", "disponible"}
+                (por ejemplo DespachadorRespuestas.carga_voz)
+            probabilidad_base (float): Probabilidad con el sistema ocioso
+            probabilidad_minima (float): Probabilidad bajo carga máxima
+            latencia_objetivo (float): Segundos de latencia a partir de los que se reduce la voz
+            latencia_maxima (float): Segundos de latencia en los que se llega al mínimo
+            pendientes_max (int): Notas de voz pendientes en las que se llega al mínimo
+            presupuesto_por_minuto (int): Notas de voz máximas por minuto en todo el bot
+            max_por_usuario_minuto (int): Notas de voz máximas por minuto a un mismo usuario
+        """
+        self.medir_carga = medir_carga
+        self.probabilidad_base = probabilidad_base
+        self.probabilidad_minima = probabilidad_minima
+        self.latencia_objetivo = latencia_objetivo
+        self.latencia_maxima = latencia_maxima
+        self.pendientes_max = pendientes_max
+        self.presupuesto_por_minuto = presupuesto_por_minuto
+        self.max_por_usuario_minuto = max_por_usuario_minuto
+        self._lock = threading.Lock()
+        self._globales = deque()  # Instantes de las notas de voz del último minuto
+        self._por_usuario = {}  # numero -> deque de instantes del último minuto
+
+        # Métricas
+        self.con_voz = 0
+        self.sin_voz = 0
+        self.por_presupuesto = 0
+        self.por_usuario = 0
+        self.por_servicio_caido = 0
+        self.ultima_probabilidad = probabilidad_base
+
+    def probabilidad(self, carga):
+        """
+        Probabilidad de responder con voz para una carga dada
+
+        Args:
+            carga (dict): Resultado de medir_carga
+
+        Returns:
+            float: Probabilidad entre probabilidad_minima y probabilidad_base
+        """
+        factor = 1.0
+        latencia = carga.get("latencia")
+        if latencia is not None and latencia > self.latencia_objetivo:
+            rango = max(self.latencia_maxima - self.latencia_objetivo, 1e-9)
+            factor = min(factor, max(0.0, 1.0 - (latencia - self.latencia_objetivo) / rango))
+        if self.pendientes_max:
+            factor = min(factor, max(0.0, 1.0 - carga.get("pendientes", 0) / self.pendientes_max))
+        return self.probabilidad_minima + (self.probabilidad_base - self.probabilidad_minima) * factor
+
+    def _purgar(self, instantes, ahora):
+        while instantes and ahora - instantes[0] >= 60:
+            instantes.popleft()
+
+    def decidir(self, numero):
+        """
+        Decide si una respuesta lleva nota de voz
+
+        Args:
+            numero (str): Número de teléfono del usuario
+
+        Returns:
+            bool: True si se debe responder también con audio
+        """
+        carga = self.medir_carga()
+        if not carga.get("disponible", True):
+            with self._lock:
+                self.por_servicio_caido += 1
+                self.sin_voz += 1
+            return False
+
+        probabilidad = self.probabilidad(carga)
+        ahora = time.monotonic()
+        with self._lock:
+            self.ultima_probabilidad = probabilidad
+            if random.random() >= probabilidad:
+                self.sin_voz += 1
+                return False
+
+            self._purgar(self._globales, ahora)
+            if len(self._globales) >= self.presupuesto_por_minuto:
+                self.por_presupuesto += 1
+                self.sin_voz += 1
+                return False
+
+            instantes = self._por_usuario.get(numero)
+            if instantes is None:
+                if len(self._por_usuario) > 10000:
+                    # Olvidar a los usuarios sin notas de voz en el último minuto
+                    for clave in [c for c, v in self._por_usuario.items() if not v or ahora - v[-1] >= 60]:
+                        del self._por_usuario[clave]
+                instantes = self._por_usuario[numero] = deque()
+            self._purgar(instantes, ahora)
+            if len(instantes) >= self.max_por_usuario_minuto:
+                self.por_usuario += 1
+                self.sin_voz += 1
+                return False
+
+            self._globales.append(ahora)
+            instantes.append(ahora)
+            self.con_voz += 1
+            return True
+
+    def metricas(self):
+        with self._lock:
+            self._purgar(self._globales, time.monotonic())
+            return {
+                "politica": "adaptativa",
+                "probabilidad_actual": round(self.ultima_probabilidad, 3),
+                "con_voz": self.con_voz,
+                "sin_voz": self.sin_voz,
+                "limitadas_por_presupuesto": self.por_presupuesto,
+                "limitadas_por_usuario": self.por_usuario,
+                "omitidas_servicio_caido": self.por_servicio_caido,
+                "voces_ultimo_minuto": len(self._globales)
+            }
+
+
+def crear_politica_voz(despachador):
+    """
+    Crea la política de respuestas con voz configurada en Enviroments
+
+    Args:
+        despachador (DespachadorRespuestas): Despachador del que se mide la carga de voz
+
+    Returns:
+        PoliticaVozFija | PoliticaVozAdaptativa: Política configurada
+    """
+    if env.POLITICA_VOZ == "fija":
+        return PoliticaVozFija(env.PROBABILIDAD_VOZ)
+
+    return PoliticaVozAdaptativa(
+        despachador.carga_voz,
+        probabilidad_base=env.PROBABILIDAD_VOZ,
+        probabilidad_minima=env.VOZ_PROBABILIDAD_MINIMA,
+        latencia_objetivo=env.VOZ_LATENCIA_OBJETIVO,
+        latencia_maxima=env.VOZ_LATENCIA_MAXIMA,
+        pendientes_max=env.VOZ_PENDIENTES_MAX,
+        presupuesto_por_minuto=env.VOZ_PRESUPUESTO_MINUTO,
+        max_por_usuario_minuto=env.VOZ_MAX_POR_USUARIO_MINUTO
+    )
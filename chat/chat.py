@@ -1,15 +1,22 @@
 from EnvioMensajes.Envio import WhatsAppSender
-from PeticionesRequests.Download_Audio_Wha import obtener_audio_whatsapp 
-from PeticionesRequests.Pich_To_Text import transcribir_audio
-from PeticionesRequests.Text_To_Speech import texto_a_voz
-import json
+from EnvioMensajes.Indicador_Escritura import IndicadorEscritura
+from EnvioMensajes.Difusion import DifusionPlantillas, parametros_cuerpo
+from chat.Plan_Respuesta import DespachadorRespuestas
+from chat.Avisos_Voz import AvisosVoz
+from chat.Politica_Voz import crear_politica_voz
+from PeticionesRequests.Sintesis_Frases import SintetizadorFrases
+from PeticionesRequests.Pich_To_Text import transcribir_audio_whatsapp, ERROR_STT_NO_DISPONIBLE
+from Procesamiento.Idempotencia import crear_idempotencia
+from Almacenamiento.Repositorio_Empresas import crear_repositorio_empresas
+from Almacenamiento.Almacen_Embeddings import crear_almacen_embeddings, es_referencia
+from Almacenamiento.Escritura_Diferida import crear_escritura_diferida
+from Enviroment import Enviroments as env
 import logging
-import os
 import time
 from datetime import datetime
 import re
 import string
-import random
+import threading
 
 
 # Intentamos importar NLTK y otras bibliotecas
@@ -60,12 +67,97 @@ def pos_tag_simple(tokens):
     # Simplemente asumimos que todas las palabras son sustantivos (NN)
     return [(token, "NN") for token in tokens]
 
+def extraer_mensajes(data):
+    """
+    Recorre todas las entradas, cambios y mensajes de un evento del webhook
+    
+    Args:
+        data (dict): Datos del webhook de WhatsApp
+        
+    Returns:
+        list: Mensajes en el orden en que llegaron
+    """
+    mensajes = []
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for message in value.get("messages") or []:
+                if "id" in message and "from" in message:
+                    mensajes.append(message)
+    return mensajes
+
+def dividir_por_remitente(data):
+    """
+    Separa un evento del webhook en un evento por remitente, conservando
+    la forma original (entry/changes/value) y el orden de los mensajes
+    
+    Args:
+        data (dict): Datos del webhook de WhatsApp
+        
+    Returns:
+        dict: Número del remitente -> evento con solo sus mensajes
+    """
+    eventos = {}
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            por_remitente = {}
+            for message in value.get("messages") or []:
+                por_remitente.setdefault(message.get("from"), []).append(message)
+            
+            for numero, mensajes in por_remitente.items():
+                evento = eventos.setdefault(numero, {"object": data.get("object"), "entry": []})
+                evento["entry"].append({
+                    "id": entry.get("id"),
+                    "changes": [{
+                        "field": change.get("field"),
+                        "value": dict(value, messages=mensajes)
+                    }]
+                })
+    return eventos
+
 class ChatProcess:
     def __init__(self):
         # Inicializar el sender de WhatsApp
         self.whatsapp_sender = WhatsAppSender()
         
-        # Diccionario para almacenar datos de empresas
+        # Avisos de voz fijos, pre-renderizados con calentar_avisos_voz()
+        self.avisos_voz = AvisosVoz(self.whatsapp_sender)
+        
+        # Los textos largos se sintetizan por frases en paralelo
+        self.sintetizador = SintetizadorFrases(
+            max_workers=env.TTS_FRASES_WORKERS,
+            umbral_caracteres=env.TTS_FRASES_UMBRAL
+        )
+        
+        # Textos al instante y notas de voz en paralelo
+        self.despachador = DespachadorRespuestas(
+            self.whatsapp_sender,
+            sintetizar=self.sintetizador.sintetizar,
+            max_workers=env.VOZ_WORKERS,
+            avisos=self.avisos_voz
+        )
+        
+        # Envío de plantillas a muchos contactos (avisos a las empresas registradas)
+        self.difusion = DifusionPlantillas(
+            self.whatsapp_sender,
+            max_concurrencia=env.DIFUSION_CONCURRENCIA
+        )
+        
+        # Decide qué respuestas llevan nota de voz según la carga del TTS
+        self.politica_voz = crear_politica_voz(self.despachador)
+        
+        # Indicador de escritura en segundo plano para no retrasar la respuesta
+        self.indicador_escritura = IndicadorEscritura(
+            self.whatsapp_sender,
+            max_workers=env.INDICADOR_ESCRITURA_WORKERS
+        )
+        
+        # Diccionario para almacenar datos de empresas, persistido empresa a empresa;
+        # los embeddings van aparte, en una matriz binaria mapeada en memoria
+        self.repositorio_empresas = crear_repositorio_empresas()
+        self.almacen_embeddings = crear_almacen_embeddings()
+        self.persistencia = crear_escritura_diferida(self.repositorio_empresas)
         self.empresas = {}
         self.cargar_datos()
         logging.info("Sistema de Análisis Empresarial por WhatsApp iniciado.")
@@ -73,9 +165,11 @@ class ChatProcess:
         # Diccionario para almacenar el estado de las conversaciones por usuario
         self.conversaciones = {}
         
-        # Añadir estructuras para controlar mensajes duplicados
-        self.processed_messages = {}  # Almacena los IDs de mensaje ya procesados
-        self.processed_messages_ttl = {}  # Almacena tiempos de expiración para cada mensaje
+        # Registro de IDs de mensaje ya procesados (en memoria o compartido en SQLite)
+        self.processed_messages = crear_idempotencia()
+        
+        # Lock para cuando varios workers guardan datos a la vez
+        self._lock_datos = threading.Lock()
         
         # Verificar si tenemos acceso a las funciones de NLTK
         self.use_nltk = nltk_available
@@ -105,162 +199,265 @@ class ChatProcess:
                 except:
                     logging.warning("No se pudo cargar ningún modelo de spaCy.")
     
-    def debe_responder_con_audio(self):
+    def calentar_avisos_voz(self):
+        """
+        Sintetiza y publica los avisos de voz fijos que hayan cambiado
+        
+        Returns:
+            float: Segundos que tardó el calentamiento
+        """
+        return self.avisos_voz.calentar()
+    
+    def debe_responder_con_audio(self, numero=None):
         """
-        Determina si se debe responder con audio basado en la probabilidad configurada (40%)
+        Determina si se debe responder con audio según la política de voz
+        (40% con el sistema ocioso, menos si el servicio TTS está cargado)
+        
+        Args:
+            numero (str, optional): Número del usuario, para los límites por usuario
         
         Returns:
             bool: True si se debe responder con audio, False si solo texto
         """
-        # 40% de probabilidad de responder con audio
-        return random.random() < 0.4
+        return self.politica_voz.decidir(numero)
+    
+    def notificar_empresas(self, plantilla, parametros=None, idioma="es", archivo_progreso=None):
+        """
+        Envía una plantilla al contacto de cada empresa registrada
+        
+        Args:
+            plantilla (str): Nombre de la plantilla aprobada en WhatsApp
+            parametros (callable, optional): Función empresa -> lista de valores
+                para los parámetros del cuerpo (por ejemplo nombre y puntuación)
+            idioma (str): Código del idioma de la plantilla
+            archivo_progreso (str, optional): Archivo de progreso para reanudar el envío
+        
+        Returns:
+            dict: Informe de la difusión con un resultado por contacto
+        """
+        destinatarios = []
+        for empresa in list(self.empresas.values()):
+            # Las empresas registradas antes de guardar el contacto no tienen número
+            numero = empresa.get("numero_contacto")
+            if not numero:
+                continue
+            destinatario = {"numero": numero}
+            if parametros is not None:
+                destinatario["componentes"] = parametros_cuerpo(*parametros(empresa))
+            destinatarios.append(destinatario)
+        
+        return self.difusion.difundir(plantilla, destinatarios, idioma, archivo_progreso=archivo_progreso)
     
     def cargar_datos(self):
         try:
-            if os.path.exists("empresas_data.json"):
-                with open("empresas_data.json", "r", encoding="utf-8") as file:
-                    self.empresas = json.load(file)
+            self.empresas = self.repositorio_empresas.cargar()
+            self.separar_embeddings()
+            if self.empresas:
                 logging.info(f"Se cargaron datos de {len(self.empresas)} empresas.")
             else:
-                logging.info("No se encontró archivo de datos. Se iniciará con una base de datos vacía.")
+                logging.info("No hay empresas guardadas. Se iniciará con una base de datos vacía.")
         except Exception as e:
             logging.error(f"Error al cargar datos: {str(e)}")
             self.empresas = {}
     
-    def guardar_datos(self):
+    def guardar_embeddings(self, nombre, embeddings):
+        """
+        Guarda los vectores de una empresa en el almacén de embeddings
+        
+        Args:
+            nombre (str): Nombre de la empresa
+            embeddings (dict): Campo -> lista de floats
+            
+        Returns:
+            dict: Referencia al almacén para el registro de la empresa, o los
+                mismos vectores si no hay almacén o no se pudieron escribir
+        """
+        if self.almacen_embeddings is None or es_referencia(embeddings):
+            return embeddings
+        
+        # Una empresa que se vuelve a registrar reutiliza su fila
+        anterior = self.empresas.get(nombre, {}).get("analisis_nlp", {}).get("embeddings")
         try:
-            with open("empresas_data.json", "w", encoding="utf-8") as file:
-                json.dump(self.empresas, file, ensure_ascii=False, indent=4)
-            logging.info("Datos guardados correctamente.")
-        except Exception as e:
-            logging.error(f"Error al guardar datos: {str(e)}")
+            return self.almacen_embeddings.guardar(embeddings, anterior if es_referencia(anterior) else None)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error al guardar embeddings de {nombre}: {str(e)}")
+            return embeddings
+    
+    def separar_embeddings(self):
+        """Pasa al almacén los embeddings que aún están dentro de los registros cargados"""
+        if self.almacen_embeddings is None:
+            return
+        
+        migradas = {}
+        for nombre, datos in self.empresas.items():
+            analisis = datos.get("analisis_nlp") or {}
+            if "embeddings" not in analisis or es_referencia(analisis["embeddings"]):
+                continue
+            analisis["embeddings"] = self.guardar_embeddings(nombre, analisis["embeddings"])
+            if es_referencia(analisis["embeddings"]):
+                migradas[nombre] = datos
+        if migradas:
+            self.repositorio_empresas.guardar_varias(migradas)
+            logging.info(f"Se pasaron al almacén los embeddings de {len(migradas)} empresas.")
     
-    def _cleanup_processed_messages(self):
-        """Limpia mensajes antiguos para evitar que la memoria crezca indefinidamente"""
+    def guardar_datos(self, nombre=None):
+        """
+        Guarda en el repositorio una empresa, o todas si no se indica cuál
+        
+        Con la escritura diferida activa solo se marcan como pendientes y el
+        hilo de fondo las escribe en el próximo lote.
+        
+        Args:
+            nombre (str, optional): Nombre de la empresa que cambió
+        """
         try:
-            current_time = time.time()
-            expired_messages = []
-            
-            # Identificar mensajes expirados
-            for message_id, expiry_time in list(self.processed_messages_ttl.items()):
-                if current_time > expiry_time:
-                    expired_messages.append(message_id)
-            
-            # Eliminar mensajes expirados
-            for message_id in expired_messages:
-                if message_id in self.processed_messages:
-                    del self.processed_messages[message_id]
-                if message_id in self.processed_messages_ttl:
-                    del self.processed_messages_ttl[message_id]
-                    
-            if expired_messages:
-                logging.debug(f"Limpieza de mensajes: {len(expired_messages)} mensajes eliminados. {len(self.processed_messages)} mensajes activos.")
+            with self._lock_datos:
+                nombres = [nombre] if nombre is not None else list(self.empresas.keys())
+                if self.persistencia is not None:
+                    for nombre_empresa in nombres:
+                        self.persistencia.marcar(nombre_empresa, self.empresas[nombre_empresa])
+                    return
+                self.repositorio_empresas.guardar_varias({n: self.empresas[n] for n in nombres})
+            logging.info("Datos guardados correctamente.")
         except Exception as e:
-            logging.error(f"Error al limpiar mensajes antiguos: {str(e)}")
+            logging.error(f"Error al guardar datos: {str(e)}")
     
     def ProcessMessage(self, data):
         """
         Procesa los mensajes entrantes del webhook de WhatsApp
         
+        Un mismo evento puede traer varias entradas, cambios y mensajes cuando
+        WhatsApp agrupa la entrega; todos se procesan como un lote.
+        
         Args:
             data (dict): Datos del webhook de WhatsApp
         """
         try:
-            logging.info("Procesando mensaje de WhatsApp...")
+            logging.info("Procesando evento de WhatsApp...")
             
             # Extraer información relevante del webhook
             if "entry" not in data or not data["entry"]:
                 logging.warning("Formato de webhook inválido, no contiene 'entry'")
                 return
-                
-            # Obtener datos del mensaje
-            changes = data["entry"][0]["changes"]
-            if not changes:
-                logging.warning("No hay cambios en el webhook")
-                return
-                
-            value = changes[0]["value"]
-            if "messages" not in value or not value["messages"]:
+            
+            mensajes = extraer_mensajes(data)
+            if not mensajes:
                 logging.info("No hay mensajes en el webhook, posiblemente status update")
                 return
-                
-            message = value["messages"][0]
-            message_id = message["id"]
-            from_number = message["from"]
             
-            # Verificar si ya procesamos este message_id para evitar duplicados
-            if message_id in self.processed_messages:
-                logging.info(f"Mensaje {message_id} ya procesado anteriormente. Ignorando para evitar duplicados.")
+            # Descartar duplicados de todo el lote
+            nuevos = self._filtrar_duplicados(mensajes)
+            if not nuevos:
                 return
+            logging.info(f"Lote con {len(mensajes)} mensajes, {len(nuevos)} nuevos")
             
-            # Agregar este mensaje a los procesados
-            self.processed_messages[message_id] = True
-            
-            # Establecer un TTL (30 minutos) para este mensaje
-            current_time = time.time()
-            self.processed_messages_ttl[message_id] = current_time + 1800  # 1800 segundos = 30 minutos
+            # Mostrar el indicador de escritura en cada mensaje, en paralelo al procesamiento
+            for message in nuevos:
+                self.indicador_escritura.enviar(message["from"], message["id"])
             
-            # Limpiar mensajes antiguos para que la memoria no crezca indefinidamente
-            self._cleanup_processed_messages()
+            for message in nuevos:
+                self.despachador.iniciar_turno(message["from"], message["id"])
+                try:
+                    self._procesar_mensaje(message)
+                except Exception as e:
+                    # Un mensaje con error no debe impedir procesar el resto del lote
+                    logging.error(f"Error al procesar mensaje {message.get('id')}: {str(e)}", exc_info=True)
+                finally:
+                    self.despachador.finalizar_turno()
+                
+        except Exception as e:
+            logging.error(f"Error al procesar mensaje: {str(e)}", exc_info=True)
+    
+    def _filtrar_duplicados(self, mensajes):
+        """
+        Registra los IDs de un lote de mensajes y devuelve solo los no procesados
+        
+        Args:
+            mensajes (list): Mensajes extraídos del webhook
             
-            # Primero mostrar el indicador de escritura
-            self.whatsapp_sender.SendWriting(from_number, message_id)
+        Returns:
+            list: Mensajes que no se habían procesado antes
+        """
+        # Reclamar todos los IDs del lote de una vez
+        es_nuevo = self.processed_messages.marcar_lote([message["id"] for message in mensajes])
+        
+        nuevos = []
+        for message, nuevo in zip(mensajes, es_nuevo):
+            if not nuevo:
+                logging.info(f"Mensaje {message['id']} ya procesado anteriormente. Ignorando para evitar duplicados.")
+                continue
+            nuevos.append(message)
+        return nuevos
+    
+    def _procesar_mensaje(self, message):
+        """
+        Procesa un único mensaje ya deduplicado
+        
+        Args:
+            message (dict): Mensaje individual del webhook de WhatsApp
+        """
+        message_id = message["id"]
+        from_number = message["from"]
+        
+        # Verificar tipo de mensaje
+        if "text" in message:
+            # Mensaje de texto
+            text = message["text"]["body"]
+            logging.info(f"Mensaje de texto recibido: {text}")
+            self.procesar_mensaje_texto(from_number, text, message_id)
             
-            # Verificar tipo de mensaje
-            if "text" in message:
-                # Mensaje de texto
-                text = message["text"]["body"]
-                logging.info(f"Mensaje de texto recibido: {text}")
-                self.procesar_mensaje_texto(from_number, text, message_id)
+        elif "audio" in message:
+            # Mensaje de audio
+            logging.info("Mensaje de audio recibido, procesando...")
+            try:
+                # Descargar el audio y transcribirlo en streaming, sin esperar
+                # a tener el archivo completo en memoria
+                texto_transcrito = transcribir_audio_whatsapp(message)
+                logging.info(f"Transcripción: {texto_transcrito}")
                 
-            elif "audio" in message:
-                # Mensaje de audio
-                logging.info("Mensaje de audio recibido, procesando...")
-                try:
-                    # Descargar el audio
-                    audio_bytes = obtener_audio_whatsapp(data)
-                    
-                    # Transcribir el audio a texto
-                    texto_transcrito = transcribir_audio(audio_bytes)
-                    logging.info(f"Transcripción: {texto_transcrito}")
-                    
-                    # Verificar si la transcripción falló o está vacía
-                    if not texto_transcrito or texto_transcrito.startswith("Error"):
-                        self.whatsapp_sender.SendText(
-                            from_number, 
-                            "Lo siento, no pude entender tu mensaje de voz. ¿Podrías intentar de nuevo o enviar un mensaje de texto?",
-                            message_id
-                        )
-                        return
-                    
-                    # Enviar confirmación al usuario
-                    self.whatsapp_sender.SendText(
-                        from_number, 
-                        f"He recibido tu mensaje de voz. Te escuché decir:\n\n\"{texto_transcrito}\"\n\nProcesando tu solicitud...",
+                # Servicio de transcripción caído: pedir texto sin esperar
+                if texto_transcrito == ERROR_STT_NO_DISPONIBLE:
+                    self.despachador.texto(
+                        from_number,
+                        "Ahora mismo no puedo escuchar mensajes de voz. Por favor, escríbeme tu mensaje.",
                         message_id
                     )
-                    
-                    # Procesar el texto transcrito
-                    self.procesar_mensaje_texto(from_number, texto_transcrito, message_id)
-                    
-                except Exception as e:
-                    logging.error(f"Error al procesar audio: {str(e)}", exc_info=True)
-                    self.whatsapp_sender.SendText(
-                        from_number,
-                        "Lo siento, tuve problemas para procesar tu mensaje de voz. ¿Podrías intentar de nuevo o enviar un mensaje de texto?",
+                    return
+                
+                # Verificar si la transcripción falló o está vacía
+                if not texto_transcrito or texto_transcrito.startswith("Error"):
+                    self.despachador.texto(
+                        from_number, 
+                        "Lo siento, no pude entender tu mensaje de voz. ¿Podrías intentar de nuevo o enviar un mensaje de texto?",
                         message_id
                     )
-            else:
-                # Otros tipos de mensajes (imágenes, documentos, etc.)
-                logging.info(f"Mensaje no soportado recibido: {message.keys()}")
-                self.whatsapp_sender.SendText(
-                    from_number,
-                    "Por ahora solo puedo procesar mensajes de texto y de voz. ¿En qué puedo ayudarte?",
+                    return
+                
+                # Enviar confirmación al usuario
+                self.despachador.texto(
+                    from_number, 
+                    f"He recibido tu mensaje de voz. Te escuché decir:\n\n\"{texto_transcrito}\"\n\nProcesando tu solicitud...",
                     message_id
                 )
                 
-        except Exception as e:
-            logging.error(f"Error al procesar mensaje: {str(e)}", exc_info=True)
+                # Procesar el texto transcrito
+                self.procesar_mensaje_texto(from_number, texto_transcrito, message_id)
+                
+            except Exception as e:
+                logging.error(f"Error al procesar audio: {str(e)}", exc_info=True)
+                self.despachador.texto(
+                    from_number,
+                    "Lo siento, tuve problemas para procesar tu mensaje de voz. ¿Podrías intentar de nuevo o enviar un mensaje de texto?",
+                    message_id
+                )
+        else:
+            # Otros tipos de mensajes (imágenes, documentos, etc.)
+            logging.info(f"Mensaje no soportado recibido: {message.keys()}")
+            self.despachador.texto(
+                from_number,
+                "Por ahora solo puedo procesar mensajes de texto y de voz. ¿En qué puedo ayudarte?",
+                message_id
+            )
     
     def procesar_mensaje_texto(self, numero, texto, message_id=None):
         """
@@ -314,7 +511,7 @@ class ChatProcess:
             elif comando_detectado == "nueva_empresa":
                 # Iniciar el flujo de registro de empresa
                 self.conversaciones[numero]["estado"] = "registro_nombre"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "📋 *REGISTRO DE NUEVA EMPRESA* 📋\n\nPor favor, escribe el nombre de la empresa:",
                     message_id
@@ -323,7 +520,7 @@ class ChatProcess:
                 self.enviar_lista_empresas(numero, message_id)
             elif comando_detectado == "buscar":
                 if texto_lower == "buscar" or texto_lower == "busca":
-                    self.whatsapp_sender.SendText(
+                    self.despachador.texto(
                         numero,
                         "Por favor, especifica qué término quieres buscar.\nEjemplo: 'buscar tecnología'",
                         message_id
@@ -333,7 +530,7 @@ class ChatProcess:
                     self.buscar_empresas(numero, termino, message_id)
             elif comando_detectado == "analizar":
                 if texto_lower == "analizar" or texto_lower == "analiza":
-                    self.whatsapp_sender.SendText(
+                    self.despachador.texto(
                         numero,
                         "Por favor, especifica qué empresa quieres analizar.\nEjemplo: 'analizar Empresa ABC'",
                         message_id
@@ -344,7 +541,7 @@ class ChatProcess:
             else:
                 # Intentar interpretar como pregunta en lenguaje natural
                 if not self.analizar_texto_whatsapp(numero, texto_original, message_id):
-                    self.whatsapp_sender.SendText(
+                    self.despachador.texto(
                         numero,
                         "No entiendo esa petición. Escribe *ayuda* para ver los comandos disponibles.",
                         message_id
@@ -358,14 +555,14 @@ class ChatProcess:
             # Verificar si ya existe
             if texto in self.empresas:
                 self.conversaciones[numero]["estado"] = "confirmar_actualizar"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     f"⚠️ La empresa *{texto}* ya existe. ¿Deseas actualizarla?\n\nResponde *sí* o *no*",
                     message_id
                 )
             else:
                 self.conversaciones[numero]["estado"] = "registro_valor_anual"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuál es el valor anual de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
@@ -375,14 +572,14 @@ class ChatProcess:
             respuestas_positivas = ["si", "sí", "s", "yes", "y", "claro", "por supuesto", "vale"]
             if texto_lower in respuestas_positivas:
                 self.conversaciones[numero]["estado"] = "registro_valor_anual"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuál es el valor anual de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
                 )
             else:
                 self.conversaciones[numero]["estado"] = "inicio"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "Operación cancelada. ¿En qué más puedo ayudarte?",
                     message_id
@@ -398,13 +595,13 @@ class ChatProcess:
                 valor = float(valor_texto)
                 datos_temp["valor_anual"] = valor
                 self.conversaciones[numero]["estado"] = "registro_ganancias"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuáles son las ganancias de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
                 )
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un valor numérico válido (solo números, sin puntos ni comas).",
                     message_id
@@ -420,13 +617,13 @@ class ChatProcess:
                 valor = float(valor_texto)
                 datos_temp["ganancias"] = valor
                 self.conversaciones[numero]["estado"] = "registro_sector"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿A qué sector pertenece la empresa?",
                     message_id
                 )
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un valor numérico válido (solo números, sin puntos ni comas).",
                     message_id
@@ -435,7 +632,7 @@ class ChatProcess:
         elif estado == "registro_sector":
             datos_temp["sector"] = texto
             self.conversaciones[numero]["estado"] = "registro_empleados"
-            self.whatsapp_sender.SendText(
+            self.despachador.texto(
                 numero,
                 "¿Cuántos empleados tiene la empresa? (ingresa solo el número)",
                 message_id
@@ -451,13 +648,13 @@ class ChatProcess:
                 empleados = int(valor_texto)
                 datos_temp["empleados"] = empleados
                 self.conversaciones[numero]["estado"] = "registro_activos"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuál es el valor en activos de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
                 )
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un número entero válido.",
                     message_id
@@ -473,13 +670,13 @@ class ChatProcess:
                 valor = float(valor_texto)
                 datos_temp["activos"] = valor
                 self.conversaciones[numero]["estado"] = "registro_cartera"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuál es el valor de la cartera de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
                 )
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un valor numérico válido (solo números, sin puntos ni comas).",
                     message_id
@@ -495,13 +692,13 @@ class ChatProcess:
                 valor = float(valor_texto)
                 datos_temp["cartera"] = valor
                 self.conversaciones[numero]["estado"] = "registro_deudas"
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "¿Cuál es el valor de las deudas de la empresa en COP? (ingresa solo números, sin puntos ni comas)",
                     message_id
                 )
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un valor numérico válido (solo números, sin puntos ni comas).",
                     message_id
@@ -521,7 +718,7 @@ class ChatProcess:
                 self.finalizar_registro_empresa(numero, message_id)
                 
             except ValueError:
-                self.whatsapp_sender.SendText(
+                self.despachador.texto(
                     numero,
                     "⚠️ Por favor ingresa un valor numérico válido (solo números, sin puntos ni comas).",
                     message_id
@@ -534,7 +731,7 @@ class ChatProcess:
             datos = self.conversaciones[numero]["datos_temp"]
             
             # Enviar mensaje de procesamiento
-            self.whatsapp_sender.SendText(
+            self.despachador.texto(
                 numero,
                 "⏳ Estoy generando el análisis de la empresa...",
                 message_id
@@ -548,12 +745,14 @@ class ChatProcess:
             )
             
             # Guardar datos completos
+            datos["numero_contacto"] = numero
             datos["fecha_registro"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            analisis["embeddings"] = self.guardar_embeddings(datos["nombre"], analisis["embeddings"])
             datos["analisis_nlp"] = analisis
             
             # Almacenar en el diccionario y guardar
             self.empresas[datos["nombre"]] = datos
-            self.guardar_datos()
+            self.guardar_datos(datos["nombre"])
             
             # Crear mensaje de texto con el análisis
             resultado = self.crear_mensaje_analisis(
@@ -563,19 +762,16 @@ class ChatProcess:
             )
             
             # Enviar el análisis como texto siempre
-            self.whatsapp_sender.SendText(
+            self.despachador.texto(
                 numero,
                 resultado,
                 message_id
             )
             
             # Decidir si enviar también como audio (40% probabilidad)
-            if self.debe_responder_con_audio():
+            if self.debe_responder_con_audio(numero):
                 resumen = f"El análisis de la empresa {datos['nombre']} ha sido completado. La salud financiera se clasifica como {analisis['evaluacion']['categoria']} con una puntuación de {analisis['evaluacion']['puntuacion']} sobre 100."
-                audio_bytes = texto_a_voz(resumen)
-                
-                if audio_bytes:
-                    self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+                self.despachador.voz(numero, resumen)
             
             # Restablecer el estado
             self.conversaciones[numero]["estado"] = "inicio"
@@ -583,7 +779,7 @@ class ChatProcess:
             
         except Exception as e:
             logging.error(f"Error al finalizar registro: {str(e)}", exc_info=True)
-            self.whatsapp_sender.SendText(
+            self.despachador.texto(
                 numero,
                 "❌ Ocurrió un error al procesar los datos. Por favor intenta nuevamente.",
                 message_id
@@ -679,75 +875,66 @@ También puedes hacer preguntas naturales como:
 Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
 """
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio (40% de las veces)
-        if self.debe_responder_con_audio():
-            # Simplificar el mensaje para audio
-            audio_mensaje = "Estos son los comandos disponibles: ayuda para mostrar información, nueva empresa para registrar, listar para ver empresas, analizar nombre para ver análisis y buscar término para encontrar empresas. También puedes hacer preguntas naturales sobre empresas."
-            audio_bytes = texto_a_voz(audio_mensaje)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+        if self.debe_responder_con_audio(numero):
+            # Versión simplificada para audio, pre-renderizada al arrancar
+            self.despachador.aviso(numero, "ayuda")
     
     def enviar_lista_empresas(self, numero, message_id=None):
         """Envía la lista de empresas registradas"""
         if not self.empresas:
             mensaje = "📭 No hay empresas registradas en el sistema."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             
             # Decidir si enviar también como audio
-            if self.debe_responder_con_audio():
-                audio_bytes = texto_a_voz("No hay empresas registradas en el sistema.")
-                if audio_bytes:
-                    self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            if self.debe_responder_con_audio(numero):
+                self.despachador.aviso(numero, "sin_empresas")
             return
         
         mensaje = "📋 *EMPRESAS REGISTRADAS* 📋\n\n"
         mensaje += "*NOMBRE* | *SECTOR* | *SALUD FINANCIERA*\n"
         mensaje += "—————————————————————\n"
         
-        for nombre, datos in self.empresas.items():
+        for nombre, datos in list(self.empresas.items()):
             mensaje += f"• *{datos['nombre']}* | {datos['sector']} | {datos['analisis_nlp']['evaluacion']['categoria']}\n"
         
         mensaje += "\nPara ver detalles de una empresa específica, escribe:\n*analizar [nombre de la empresa]*"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             # Crear un mensaje simplificado para audio
-            empresas_list = [f"{datos['nombre']} en el sector {datos['sector']}" for datos in self.empresas.values()]
+            empresas_list = [f"{datos['nombre']} en el sector {datos['sector']}" for datos in list(self.empresas.values())]
             audio_mensaje = f"Empresas registradas: {', '.join(empresas_list[:5])}"
             if len(empresas_list) > 5:
                 audio_mensaje += " y otras más"
-            audio_bytes = texto_a_voz(audio_mensaje)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, audio_mensaje)
     
     def buscar_empresas(self, numero, termino, message_id=None):
         """Busca empresas por nombre o sector"""
         if not self.empresas:
             mensaje = "📭 No hay empresas registradas en el sistema."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             return
         
         termino = termino.lower()
         resultados = []
         
-        for nombre, datos in self.empresas.items():
+        for nombre, datos in list(self.empresas.items()):
             if termino in nombre.lower() or termino in datos['sector'].lower():
                 resultados.append(datos)
         
         if not resultados:
             mensaje = f"🔍 No se encontraron empresas con el término *{termino}*."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             
             # Decidir si enviar también como audio
-            if self.debe_responder_con_audio():
-                audio_bytes = texto_a_voz(f"No se encontraron empresas con el término {termino}.")
-                if audio_bytes:
-                    self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            if self.debe_responder_con_audio(numero):
+                self.despachador.voz(numero, f"No se encontraron empresas con el término {termino}.")
             return
         
         mensaje = f"🔍 *RESULTADOS DE BÚSQUEDA PARA '{termino}'* 🔍\n\n"
@@ -760,23 +947,21 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
         mensaje += "\nPara ver detalles de una empresa específica, escribe:\n*analizar [nombre de la empresa]*"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             # Crear un mensaje simplificado para audio
             resultados_list = [f"{datos['nombre']} en el sector {datos['sector']}" for datos in resultados[:3]]
             audio_mensaje = f"Encontré {len(resultados)} empresas que coinciden con {termino}: {', '.join(resultados_list)}"
             if len(resultados) > 3:
                 audio_mensaje += " y otras más"
-            audio_bytes = texto_a_voz(audio_mensaje)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, audio_mensaje)
     
     def analizar_empresa_whatsapp(self, numero, nombre, message_id=None):
         """Analiza una empresa y envía los resultados por WhatsApp"""
         if not nombre:
-            self.whatsapp_sender.SendText(
+            self.despachador.texto(
                 numero,
                 "⚠️ Por favor especifica el nombre de la empresa.",
                 message_id
@@ -785,7 +970,7 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
             
         if nombre not in self.empresas:
             # Buscar sugerencias similares
-            sugerencias = [n for n in self.empresas.keys() if nombre.lower() in n.lower()]
+            sugerencias = [n for n in list(self.empresas.keys()) if nombre.lower() in n.lower()]
             
             mensaje = f"❌ No se encontró la empresa *{nombre}*."
             
@@ -794,16 +979,14 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
                 for sugerencia in sugerencias:
                     mensaje += f"• *{sugerencia}*\n"
             
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             
             # Decidir si enviar también como audio
-            if self.debe_responder_con_audio():
+            if self.debe_responder_con_audio(numero):
                 audio_mensaje = f"No se encontró la empresa {nombre}."
                 if sugerencias:
                     audio_mensaje += f" ¿Quizás quisiste decir {', '.join(sugerencias[:2])}?"
-                audio_bytes = texto_a_voz(audio_mensaje)
-                if audio_bytes:
-                    self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+                self.despachador.voz(numero, audio_mensaje)
             return
         
         # Obtener datos de la empresa
@@ -817,22 +1000,19 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
         )
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, resultado, message_id)
+        self.despachador.texto(numero, resultado, message_id)
         
         # Decidir si enviar también como audio (40% probabilidad)
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             resumen = f"Aquí está el análisis de {datos['nombre']}. La salud financiera se clasifica como {datos['analisis_nlp']['evaluacion']['categoria']} con una puntuación de {datos['analisis_nlp']['evaluacion']['puntuacion']} sobre 100."
-            audio_bytes = texto_a_voz(resumen)
-            
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, resumen)
     
     def analizar_texto_whatsapp(self, numero, pregunta, message_id=None):
         """Analiza preguntas en lenguaje natural y responde vía WhatsApp"""
         pregunta = pregunta.lower()
         
         # Verificar si es una pregunta sobre empresas específicas
-        for nombre in self.empresas.keys():
+        for nombre in list(self.empresas.keys()):
             if nombre.lower() in pregunta:
                 if "indicadores" in pregunta or "financi" in pregunta:
                     datos = self.empresas[nombre]
@@ -846,14 +1026,12 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
                     mensaje += f"• Ratio de endeudamiento: {endeudamiento:.2f}%\n"
                     
                     # Enviar mensaje de texto siempre
-                    self.whatsapp_sender.SendText(numero, mensaje, message_id)
+                    self.despachador.texto(numero, mensaje, message_id)
                     
                     # Decidir si enviar también como audio
-                    if self.debe_responder_con_audio():
+                    if self.debe_responder_con_audio(numero):
                         audio_mensaje = f"Indicadores financieros de {nombre}: Liquidez {liquidez:.2f}, Margen de ganancia {margen:.2f} por ciento, y Ratio de endeudamiento {endeudamiento:.2f} por ciento."
-                        audio_bytes = texto_a_voz(audio_mensaje)
-                        if audio_bytes:
-                            self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+                        self.despachador.voz(numero, audio_mensaje)
                     
                     return True
                     
@@ -875,14 +1053,12 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
             mensaje = f"📊 Hay *{len(self.empresas)}* empresas registradas en el sistema."
             
             # Enviar mensaje de texto siempre
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             
             # Decidir si enviar también como audio
-            if self.debe_responder_con_audio():
+            if self.debe_responder_con_audio(numero):
                 audio_mensaje = f"Hay {len(self.empresas)} empresas registradas en el sistema."
-                audio_bytes = texto_a_voz(audio_mensaje)
-                if audio_bytes:
-                    self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+                self.despachador.voz(numero, audio_mensaje)
             
             return True
         elif "sectores" in pregunta:
@@ -896,7 +1072,7 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
         """Envía recomendaciones para una empresa específica por WhatsApp"""
         if nombre not in self.empresas:
             mensaje = f"❌ No se encontró la empresa *{nombre}*."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             return
             
         datos = self.empresas[nombre]
@@ -927,26 +1103,24 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
             mensaje += f"{recomendacion}\n"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio (40% probabilidad)
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             texto_recomendaciones = f"Recomendaciones para {nombre}: " + ", ".join([r.replace("•", "") for r in recomendaciones])
-            audio_bytes = texto_a_voz(texto_recomendaciones)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, texto_recomendaciones)
     
     def enviar_mejor_empresa_whatsapp(self, numero, message_id=None):
         """Envía información sobre la empresa con mejor salud financiera"""
         if not self.empresas:
             mensaje = "📭 No hay empresas registradas en el sistema."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             return
             
         mejor_empresa = None
         mejor_puntuacion = -1
         
-        for nombre, datos in self.empresas.items():
+        for nombre, datos in list(self.empresas.items()):
             puntuacion = datos["analisis_nlp"]["evaluacion"]["puntuacion"]
             if puntuacion > mejor_puntuacion:
                 mejor_puntuacion = puntuacion
@@ -960,26 +1134,24 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
         mensaje += f"Para ver el análisis completo, escribe:\n*analizar {mejor_empresa['nombre']}*"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio (40% probabilidad)
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             texto_voz = f"La empresa con mejor salud financiera es {mejor_empresa['nombre']} del sector {mejor_empresa['sector']} con una puntuación de {mejor_empresa['analisis_nlp']['evaluacion']['puntuacion']} sobre 100."
-            audio_bytes = texto_a_voz(texto_voz)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, texto_voz)
     
     def enviar_peor_empresa_whatsapp(self, numero, message_id=None):
         """Envía información sobre la empresa con peor salud financiera"""
         if not self.empresas:
             mensaje = "📭 No hay empresas registradas en el sistema."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             return
             
         peor_empresa = None
         peor_puntuacion = float('inf')
         
-        for nombre, datos in self.empresas.items():
+        for nombre, datos in list(self.empresas.items()):
             puntuacion = datos["analisis_nlp"]["evaluacion"]["puntuacion"]
             if puntuacion < peor_puntuacion:
                 peor_puntuacion = puntuacion
@@ -993,24 +1165,22 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
         mensaje += f"Para ver el análisis completo, escribe:\n*analizar {peor_empresa['nombre']}*"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio (40% probabilidad)
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             texto_voz = f"La empresa con peor salud financiera es {peor_empresa['nombre']} del sector {peor_empresa['sector']} con una puntuación de {peor_empresa['analisis_nlp']['evaluacion']['puntuacion']} sobre 100."
-            audio_bytes = texto_a_voz(texto_voz)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, texto_voz)
     
     def enviar_sectores_whatsapp(self, numero, message_id=None):
         """Envía información sobre los sectores registrados"""
         if not self.empresas:
             mensaje = "📭 No hay empresas registradas en el sistema."
-            self.whatsapp_sender.SendText(numero, mensaje, message_id)
+            self.despachador.texto(numero, mensaje, message_id)
             return
             
         sectores = {}
-        for nombre, datos in self.empresas.items():
+        for nombre, datos in list(self.empresas.items()):
             sector = datos["sector"]
             if sector in sectores:
                 sectores[sector] += 1
@@ -1026,17 +1196,15 @@ Puedes enviar mensajes de texto o de voz para interactuar con el sistema.
             mensaje += "\n"
         
         # Enviar mensaje de texto siempre
-        self.whatsapp_sender.SendText(numero, mensaje, message_id)
+        self.despachador.texto(numero, mensaje, message_id)
         
         # Decidir si enviar también como audio (40% probabilidad)
-        if self.debe_responder_con_audio():
+        if self.debe_responder_con_audio(numero):
             sectores_list = [f"{sector} con {cantidad} empresas" for sector, cantidad in list(sectores.items())[:5]]
             audio_mensaje = f"Los sectores registrados son: {', '.join(sectores_list)}"
             if len(sectores) > 5:
                 audio_mensaje += " y otros más"
-            audio_bytes = texto_a_voz(audio_mensaje)
-            if audio_bytes:
-                self.whatsapp_sender.SendVoiceNote(numero, audio_bytes)
+            self.despachador.voz(numero, audio_mensaje)
     
     def generar_analisis_nlp(self, nombre, sector, valor_anual, ganancias, 
                            empleados, activos, cartera, deudas):
@@ -0,0 +1,94 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+from Enviroment import Enviroments as env
+from PeticionesRequests import Pich_To_Text
+from Procesamiento.Cortacircuitos import Cortacircuitos, CERRADO, ABIERTO
+
+
+class ManejadorSTT(BaseHTTPRequestHandler):
+    """STT local: lee el cuerpo chunked y responde con el código configurado"""
+    codigo = 200
+    cuerpo = json.dumps({"transcription": "hola"}).encode("utf-8")
+
+    def do_POST(self):
+        try:
+            while True:
+                largo = int(self.rfile.readline().strip() or b"0", 16)
+                self.rfile.read(largo + 2)
+                if largo == 0:
+                    break
+        except (OSError, ValueError):
+            return
+        self.send_response(self.codigo)
+        self.send_header("Content-Length", str(len(self.cuerpo)))
+        self.end_headers()
+        self.wfile.write(self.cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTranscripcionStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), ManejadorSTT)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.cortacircuitos = Cortacircuitos("stt", umbral_fallos=1, tiempo_abierto=60)
+        parches = [
+            mock.patch.object(env, "URL_VOZ_TEXTO", f"http://127.0.0.1:{self.servidor.server_port}/stt"),
+            mock.patch.object(Pich_To_Text, "cortacircuitos_stt", self.cortacircuitos),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def test_fallo_de_descarga_no_abre_el_cortacircuitos(self):
+        def bloques():
+            yield b"OggS" + b"\x00" * 1024
+            raise requests.exceptions.ReadTimeout("CDN de WhatsApp sin respuesta")
+
+        resultado = Pich_To_Text.transcribir_audio_streaming(bloques())
+
+        self.assertEqual(resultado, Pich_To_Text.ERROR_DESCARGA_AUDIO)
+        self.assertEqual(self.cortacircuitos.metricas()["estado"], CERRADO)
+        self.assertEqual(self.cortacircuitos.metricas()["fallos"], 0)
+
+    def test_error_del_stt_abre_el_cortacircuitos(self):
+        ManejadorSTT.codigo = 503
+        self.addCleanup(setattr, ManejadorSTT, "codigo", 200)
+
+        resultado = Pich_To_Text.transcribir_audio_streaming(iter([b"OggS"]))
+
+        self.assertTrue(resultado.startswith("Error"))
+        self.assertEqual(self.cortacircuitos.metricas()["estado"], ABIERTO)
+
+    def test_error_local_no_abre_el_cortacircuitos(self):
+        parche = mock.patch.object(ManejadorSTT, "cuerpo", b"<html>no es JSON</html>")
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        resultado = Pich_To_Text.transcribir_audio_streaming(iter([b"OggS"]))
+
+        self.assertTrue(resultado.startswith("Error"))
+        self.assertEqual(self.cortacircuitos.metricas()["estado"], CERRADO)
+        self.assertEqual(self.cortacircuitos.metricas()["fallos"], 0)
+
+    def test_transcripcion_correcta(self):
+        resultado = Pich_To_Text.transcribir_audio_streaming(iter([b"OggS", b"\x00" * 2048]))
+
+        self.assertEqual(resultado, "hola")
+        self.assertEqual(self.cortacircuitos.metricas()["exitos"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()